@@ -1,16 +1,31 @@
+import os
 import dash
 from dash import dcc, html
 from dash.dependencies import Output, Input, State
-import plotly.express as px
 import dash_bootstrap_components as dbc
-import pandas as pd
-import pandas_datareader.data as web
-import datetime
-import plotly.graph_objects as go
+from flask import jsonify
+import engine.templates  # noqa: F401  makes the slim 'airbnb' Plotly template the default
+from engine.compression import install_compression
+from engine.lazy import load_pending, readiness, start_background_loading
+from engine.metrics import install_metrics
+from engine.profiler import install_profiler
 
-app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SPACELAB])
+# Page layouts are functions that load their data on first use, so Dash must
+# not call them all up front to validate callbacks.
+app = dash.Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.SPACELAB],
+                suppress_callback_exceptions=True)
 
 server = app.server
+install_compression(server)
+install_metrics(app)
+install_profiler(server)
+
+
+@server.route('/ready')
+def ready():
+    all_ready, pages = readiness()
+    return jsonify(ready=all_ready, pages=pages), 200 if all_ready else 503
+
 
 toggle_button = dbc.Button(
     "☰",
@@ -100,5 +115,19 @@ def toggle_sidebar(n_clicks, sidebar_width):
 
     return sidebar_width, 10, {}
 
+# Dash moves the registered callbacks into its callback map on the first
+# request, and a concurrent request in another gunicorn thread can be
+# dispatched before that finishes ("Callback function not found"), so make
+# that first request here, before the server takes any.
+server.test_client().get('/_dash-dependencies')
+
+if os.environ.get('DASH_WARMUP') == '1':
+    from engine.warmup import warm_up
+    warm_up(int(os.environ.get('DASH_WARMUP_WORKERS', 0)) or None)
+    # Pages with no figures to pre-render (pg4, pg6) still have to load for /ready
+    load_pending()
+elif os.environ.get('DASH_BACKGROUND_LOAD', '1') == '1':
+    start_background_loading()
+
 if __name__ == '__main__':
     app.run(debug=False, host="0.0.0.0", port=8050)
@@ -0,0 +1,50 @@
+// Clientside figure updates used when DASH_RENDER_MODE=clientside (see engine/clientside.py).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    airbnb: {
+        // pg1: swap the per-country bar values into the template figure.
+        ageGenderFigure: function (country, store) {
+            if (!store || !store.countries[country]) {
+                return window.dash_clientside.no_update;
+            }
+            const fig = JSON.parse(JSON.stringify(store.template));
+            store.countries[country].forEach(function (arrays, i) {
+                Object.assign(fig.data[i], arrays);
+            });
+            return fig;
+        },
+
+        // pg3: slice the full-length template figure of the selected slice down to the top N bars.
+        topActionsFigure: function (chart, topN, store) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            if (topN === null || topN === undefined || topN < 1) {
+                topN = 10;
+            }
+            const first = chart === 'first';
+            const fig = JSON.parse(JSON.stringify(first ? store.first : store.second));
+            fig.data.forEach(function (trace) {
+                ['x', 'y', 'text', 'customdata'].forEach(function (key) {
+                    if (Array.isArray(trace[key])) {
+                        trace[key] = trace[key].slice(0, topN);
+                    }
+                });
+                if (trace.error_y) {
+                    ['array', 'arrayminus'].forEach(function (key) {
+                        if (Array.isArray(trace.error_y[key])) {
+                            trace.error_y[key] = trace.error_y[key].slice(0, topN);
+                        }
+                    });
+                }
+            });
+            if (Array.isArray(fig.layout.annotations)) {
+                fig.layout.annotations = fig.layout.annotations.slice(0, topN);
+            }
+            topN = Math.min(topN, fig.data.length ? fig.data[0].x.length : topN);
+            const title = (first
+                ? 'Top ' + topN + ' Most Common User Actions'
+                : 'Top ' + topN + ' Actions by Average Time Spent (hh:mm)') + (store.label || '');
+            return [fig, title];
+        }
+    }
+});
@@ -0,0 +1,113 @@
+"""Cold start and per-callback latency through Dash's Flask test client.
+
+Run from the Dash directory, in a fresh interpreter (the app import is timed):
+
+    python -m benchmarks.bench_callbacks
+    python -m benchmarks.bench_callbacks --users 5M --sessions 50M --output callbacks.json
+
+With ``--users``/``--sessions`` the app runs in a scratch directory against
+synthetic data of that size (``benchmarks.synthetic``); otherwise against
+``Dash/assets``. Background loading and warm-up are off, so the first request
+of every page pays its data load. Each callback request from
+``benchmarks.scenarios`` is timed once cold and ``--repeat`` times warm.
+"""
+import argparse
+import functools
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.report import latency_summary, run_metadata, write_report
+from benchmarks.scenarios import POLL_SECONDS, background_poll, callback_requests
+from benchmarks.synthetic import parse_rows, prepare_workdir
+
+STARTUP_REQUESTS = ('/', '/_dash-layout', '/_dash-dependencies')
+
+
+def timed_request(send):
+    start = time.perf_counter()
+    response = send()
+    return time.perf_counter() - start, response
+
+
+def post_callback(client, body):
+    """POST a callback request, polling background jobs until they answer."""
+    response = client.post('/_dash-update-component', json=body)
+    query = background_poll(response.get_json(silent=True))
+    while query is not None and response.status_code == 200:
+        time.sleep(POLL_SECONDS)
+        response = client.post(f'/_dash-update-component?{query}', json=body)
+        query = background_poll(response.get_json(silent=True), query)
+    return response
+
+
+def run(repeat):
+    os.environ.setdefault('DASH_BACKGROUND_LOAD', '0')
+    os.environ.setdefault('DASH_WARMUP', '0')
+    start = time.perf_counter()
+    import app
+    startup = {'import_seconds': time.perf_counter() - start}
+
+    client = app.server.test_client()
+    for path in STARTUP_REQUESTS:
+        elapsed, response = timed_request(functools.partial(client.get, path))
+        startup[f'get {path}'] = {'seconds': elapsed, 'status': response.status_code, 'bytes': len(response.data)}
+    dependencies = client.get('/_dash-dependencies').get_json()
+
+    callbacks = []
+    for name, body in callback_requests(dependencies):
+        send = functools.partial(post_callback, client, body)
+        cold, response = timed_request(send)
+        warm = [timed_request(send)[0] for _ in range(repeat)]
+        callbacks.append({
+            'callback': name,
+            'changed': body['changedPropIds'],
+            'status': response.status_code,
+            'bytes': len(response.data),
+            'cold_ms': round(cold * 1000, 3),
+            'warm': latency_summary(warm),
+        })
+    return startup, callbacks
+
+
+def print_callbacks(callbacks):
+    print(f"{'cold ms':>9} {'warm p50':>9} {'bytes':>10} {'status':>6}  callback (changed input)")
+    for row in callbacks:
+        print(f"{row['cold_ms']:>9.1f} {row['warm'].get('p50_ms', float('nan')):>9.1f} {row['bytes']:>10,} "
+              f"{row['status']:>6}  {row['callback']} ({', '.join(row['changed'])})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time app startup and every page callback.')
+    parser.add_argument('--users', type=parse_rows, default=0, help='synthetic users, e.g. 100k, 5M')
+    parser.add_argument('--sessions', type=parse_rows, default=0, help='synthetic session rows, e.g. 10M')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON report path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    dash_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {'benchmark': 'callbacks', 'meta': run_metadata(dash_dir),
+              'config': {'users': args.users, 'sessions': args.sessions, 'repeat': args.repeat}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.users or args.sessions:
+            report['pipeline'] = prepare_workdir(tmp, args.users, args.sessions, args.seed,
+                                                 assets_dir=os.path.join(dash_dir, 'assets'),
+                                                 workers=os.cpu_count() or 1)
+            os.chdir(tmp)
+        else:
+            os.chdir(dash_dir)
+        sys.path.insert(0, dash_dir)
+        report['startup'], report['callbacks'] = run(args.repeat)
+        os.chdir(dash_dir)
+
+    print(f"app import {report['startup']['import_seconds']:.2f}s")
+    print_callbacks(report['callbacks'])
+    if args.output:
+        write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
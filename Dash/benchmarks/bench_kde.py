@@ -0,0 +1,70 @@
+"""Binned FFT KDE against scipy.stats.gaussian_kde.
+
+Run from the Dash directory:
+
+    python -m benchmarks.bench_kde --sizes 10000 125000 1000000
+
+Samples ages from a skewed mixture like the users table (plus a few
+outliers), evaluates both estimators on 1000 points with bw_method=0.3, and
+checks that the binned result stays within the tolerance documented in
+engine.kde. The weighted column feeds binned_kde each distinct age with its
+count as weight, as pipeline.users_summary does, and compares it with scipy
+fitted to the raw (expanded) ages, under both the scalar and Scott's rule.
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.stats import gaussian_kde
+
+from engine.kde import binned_kde
+
+TOLERANCE = 1e-3
+
+
+def sample_ages(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ages = np.where(rng.random(n) < 0.8, rng.gamma(9, 3.8, n), rng.normal(55, 10, n))
+    outliers = rng.random(n) < 0.01
+    ages[outliers] = rng.uniform(90, 119, outliers.sum())
+    return np.clip(np.round(ages), 1, 119)
+
+
+def weighted_error_against_raw(ages, x, bw_method):
+    """Error of binned_kde on (distinct age, count) pairs against scipy on the raw ages."""
+    values, counts = np.unique(ages, return_counts=True)
+    expected = gaussian_kde(ages, bw_method=bw_method)(x)
+    actual = binned_kde(values, x, bw_method=bw_method, weights=counts)
+    return np.abs(actual - expected).max() / expected.max()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark binned KDE against scipy.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 125_000, 500_000])
+    parser.add_argument('--points', type=int, default=1000)
+    parser.add_argument('--bw', type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    print(f"{'n':>10} {'scipy s':>9} {'binned s':>9} {'speedup':>8} {'max err / peak':>15} {'weighted err':>13}")
+    for n in args.sizes:
+        ages = sample_ages(n)
+        x = np.linspace(ages.min(), ages.max(), args.points)
+
+        start = time.perf_counter()
+        expected = gaussian_kde(ages, bw_method=args.bw)(x)
+        scipy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = binned_kde(ages, x, bw_method=args.bw)
+        binned_time = time.perf_counter() - start
+
+        error = np.abs(actual - expected).max() / expected.max()
+        weighted_error = max(weighted_error_against_raw(ages, x, bw) for bw in (args.bw, 'scott'))
+        print(f'{n:>10,} {scipy_time:>9.3f} {binned_time:>9.4f} {scipy_time / binned_time:>8.0f} {error:>15.2e} '
+              f'{weighted_error:>13.2e}')
+        assert error <= TOLERANCE, f'binned KDE error {error:.2e} exceeds {TOLERANCE:.0e}'
+        assert weighted_error <= TOLERANCE, f'weighted KDE error {weighted_error:.2e} exceeds {TOLERANCE:.0e}'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Speedup of the process-pool aggregation over the serial path.
+
+Run from the Dash directory:
+
+    python -m benchmarks.bench_parallel --rows 5000000 --workers 1 2 4 8 16 32
+    python -m benchmarks.bench_parallel --source assets/sessions.csv
+
+Without ``--source`` a synthetic sessions log (``benchmarks.synthetic``) is
+written to a temporary file. Every parallel run is checked against the
+serial result before it is reported.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import write_sessions
+from pipeline import sessions
+from pipeline.parallel import aggregate_sessions_parallel
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark parallel sessions aggregation.')
+    parser.add_argument('--source', help='existing sessions CSV; a synthetic one is generated otherwise')
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=sessions.CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.source
+        if source is None:
+            source = os.path.join(tmp, 'sessions.csv')
+            write_sessions(source, args.rows)
+        print(f'{source}: {os.path.getsize(source) / 1e6:,.1f} MB, {os.cpu_count()} CPUs')
+
+        serial_time, expected = timed(sessions.aggregate_sessions, source, args.chunk_size)
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+        print(f"{'serial':>8} {serial_time:>9.2f} {1:>8.2f}")
+
+        for workers in args.workers:
+            elapsed, result = timed(aggregate_sessions_parallel, source, workers, args.chunk_size)
+            pd.testing.assert_frame_equal(result, expected)
+            print(f'{workers:>8} {elapsed:>9.2f} {serial_time / elapsed:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Response payload sizes per page.
+
+Run from the Dash directory:
+
+    python -m benchmarks.bench_payloads
+    python -m benchmarks.bench_payloads --compare <git-rev>
+
+Imports the app in a fresh interpreter (DASH_BACKGROUND_LOAD=0), renders each
+page's layout and a representative set of its callback figures, and reports
+the JSON bytes Dash would send, raw and after gzip/brotli at the levels
+``engine.compression`` uses. ``--compare`` measures another revision the same
+way (raw only, as a baseline without the compression layer would send it);
+it needs a revision whose pages load their data lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.worktree import revision_dash_dir
+
+# Runs inside the measured tree, so it only uses page functions that exist
+# in both revisions.
+MEASURE = r'''
+import gzip, json, sys
+import app  # noqa: F401  registers the pages
+from plotly.io.json import to_json_plotly
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def sizes(payload):
+    data = (payload if isinstance(payload, str) else to_json_plotly(payload)).encode()
+    row = {'raw': len(data), 'gzip': len(gzip.compress(data, compresslevel=6))}
+    if brotli is not None:
+        row['br'] = len(brotli.compress(data, quality=5))
+    return row
+
+def figures(name, page):
+    if name == 'pg1':
+        return [page.make_figure(c) for c in page.page_data.get().countries]
+    if name == 'pg2':
+        plots = [*page.count_plots, 'age', *getattr(page, 'density_plots', {})]
+        return [page.make_plot_figure(plot) for plot in plots]
+    if name == 'pg3':
+        return [page.make_top_actions_figure(chart, n) for chart in ('first', 'second') for n in (10, 50)]
+    if name == 'pg4':
+        return list(page.update_trends(None, 'auto', None)[:2])
+    if name == 'pg6':
+        store = page.load_store()
+        first, last = store.time_range()
+        return [page.make_lines_figure(store, store.tickers, True, first, last),
+                page.make_candles_figure(store, store.tickers[0], first, last)]
+    if name == 'pg7':
+        return [page.make_map_figure('booking_share', style) for style in page.MAP_STYLES] + [
+            page.make_ranking_figure('booking_share')]
+    return []
+
+report = {}
+for name in ('pg1', 'pg2', 'pg3', 'pg4', 'pg6', 'pg7'):
+    page = sys.modules.get('pages.' + name)
+    if page is None:
+        continue
+    report[name] = {
+        'layout': sizes(page.layout()),
+        'figures': [sizes(fig.to_json()) for fig in figures(name, page)],
+    }
+print(json.dumps(report))
+'''
+
+
+def measure(dash_dir):
+    env = dict(os.environ, DASH_BACKGROUND_LOAD='0', DASH_WARMUP='0')
+    result = subprocess.run([sys.executable, '-c', MEASURE], cwd=dash_dir, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'measuring payloads failed in {dash_dir}:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def page_totals(page):
+    rows = [page['layout']] + page['figures']
+    return {key: sum(row.get(key, 0) for row in rows) for key in rows[0]}, len(page['figures'])
+
+
+def print_report(current, baseline=None, baseline_label=None):
+    encodings = [key for key in ('raw', 'gzip', 'br') if any(key in page['layout'] for page in current.values())]
+    header = f"{'page':<6} {'figures':>7}"
+    if baseline is not None:
+        header += f" {baseline_label[:12] + ' raw':>16}"
+    header += ''.join(f' {encoding:>10}' for encoding in encodings)
+    print(header)
+    for name, page in current.items():
+        totals, n_figures = page_totals(page)
+        line = f'{name:<6} {n_figures:>7}'
+        if baseline is not None:
+            before = page_totals(baseline[name])[0]['raw'] if name in baseline else None
+            line += f" {before if before is not None else '-':>16}"
+        line += ''.join(f' {totals.get(encoding, 0):>10,}' for encoding in encodings)
+        print(line)
+    print('bytes summed over the layout and the figures listed; brotli only if installed')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure per-page response payload sizes.')
+    parser.add_argument('--compare', metavar='REV', help='git revision to measure as the baseline')
+    parser.add_argument('--json', action='store_true', help='print the raw measurements as JSON')
+    args = parser.parse_args(argv)
+
+    dash_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    current = measure(dash_dir)
+    baseline = None
+    if args.compare:
+        with revision_dash_dir(dash_dir, args.compare) as baseline_dir:
+            baseline = measure(baseline_dir)
+
+    if args.json:
+        print(json.dumps({'current': current, 'baseline': baseline}, indent=2))
+        return
+    print_report(current, baseline, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Import-time profile of the Dash app.
+
+Run from the Dash directory:
+
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --compare <git-rev>
+
+Imports ``app`` in a fresh interpreter with ``-X importtime`` and
+DASH_BACKGROUND_LOAD=0, so the time reported is what a worker spends before it
+can serve the landing page. ``--compare`` runs the same measurement on another
+revision (checked out into a temporary git worktree) for a before/after table.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.worktree import revision_dash_dir
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def profile(dash_dir, top=15):
+    env = dict(os.environ, DASH_BACKGROUND_LOAD='0', DASH_WARMUP='0')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=dash_dir, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f'importing app failed in {dash_dir}:\n{result.stderr[-2000:]}')
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((int(cumulative_us), int(self_us), len(indent), name))
+
+    top_level = [m for m in modules if m[2] <= 1]
+    return {
+        'wall_seconds': wall,
+        'import_seconds': sum(m[0] for m in top_level) / 1e6,
+        'slowest': sorted(modules, key=lambda m: m[1], reverse=True)[:top],
+    }
+
+
+def print_profile(label, result):
+    print(f"{label}: {result['wall_seconds']:.2f}s wall, {result['import_seconds']:.2f}s in imports")
+    print(f"  {'self ms':>8} {'cum ms':>8}  module")
+    for cumulative_us, self_us, _, name in result['slowest']:
+        print(f'  {self_us / 1000:>8.1f} {cumulative_us / 1000:>8.1f}  {name}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Profile app import time.')
+    parser.add_argument('--compare', metavar='REV', help='git revision to measure as the baseline')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args(argv)
+
+    dash_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    current = profile(dash_dir, args.top)
+    print_profile('current', current)
+
+    if args.compare:
+        with revision_dash_dir(dash_dir, args.compare) as baseline_dir:
+            baseline = profile(baseline_dir, args.top)
+
+        print()
+        print_profile(args.compare, baseline)
+        print()
+        print(f"saved {baseline['wall_seconds'] - current['wall_seconds']:.2f}s wall "
+              f"({baseline['wall_seconds'] / current['wall_seconds']:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
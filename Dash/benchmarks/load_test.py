@@ -0,0 +1,232 @@
+"""Concurrent simulated users against a local gunicorn instance.
+
+Run from the Dash directory (needs gunicorn, which is in requirements.txt):
+
+    python -m benchmarks.load_test --clients 32 --duration 60 --workers 4
+    python -m benchmarks.load_test --users 5M --clients 64 --output load.json
+    python -m benchmarks.load_test --url http://127.0.0.1:8050
+
+Starts ``gunicorn app:server`` on a free local port (or targets ``--url``),
+waits for ``/ready``, then runs ``--clients`` threads that each replay the
+callback requests of ``benchmarks.scenarios`` in a shuffled loop over a
+keep-alive connection, as a browser would, with gzip accepted. Reports
+p50/p90/p99 latency and throughput overall and per callback.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from benchmarks.report import latency_summary, run_metadata, write_report
+from benchmarks.scenarios import POLL_SECONDS, background_poll, callback_requests
+from benchmarks.synthetic import parse_rows, prepare_workdir
+
+OK_STATUSES = (200, 204)  # 204 is PreventUpdate
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(dash_dir, workdir, port, workers, threads, preload):
+    command = [
+        sys.executable, '-m', 'gunicorn', 'app:server',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--chdir', workdir,
+        '--pythonpath', dash_dir,
+        '--log-level', 'warning',
+    ]
+    if preload:
+        command.append('--preload')
+    return subprocess.Popen(command, start_new_session=True)
+
+
+def stop(process):
+    if process.poll() is not None:
+        return
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def wait_ready(url, timeout, process=None):
+    """Seconds until ``/ready`` answers 200."""
+    start = time.perf_counter()
+    parsed = urllib.parse.urlsplit(url)
+    while time.perf_counter() - start < timeout:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with status {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=5)
+            connection.request('GET', '/ready')
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f'{url} was not ready after {timeout}s')
+
+
+def fetch_dependencies(url):
+    parsed = urllib.parse.urlsplit(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    connection.request('GET', '/_dash-dependencies')
+    dependencies = json.loads(connection.getresponse().read())
+    connection.close()
+    return dependencies
+
+
+def post_callback(connection, body, headers):
+    """Status and total bytes of a callback request, polling background jobs
+    until they answer."""
+    path, size = '/_dash-update-component', 0
+    while True:
+        connection.request('POST', path, body, headers)
+        response = connection.getresponse()
+        data = response.read()
+        size += len(data)
+        if response.status != 200:
+            return response.status, size
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        query = background_poll(json.loads(data), path.partition('?')[2] or None)
+        if query is None:
+            return response.status, size
+        path = f'/_dash-update-component?{query}'
+        time.sleep(POLL_SECONDS)
+
+
+def simulate_client(url, requests, deadline, think, seed, samples):
+    parsed = urllib.parse.urlsplit(url)
+    rng = random.Random(seed)
+    headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+    bodies = [(name, json.dumps(body)) for name, body in requests]
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+    try:
+        while time.perf_counter() < deadline:
+            rng.shuffle(bodies)
+            for name, body in bodies:
+                if time.perf_counter() >= deadline:
+                    break
+                start = time.perf_counter()
+                try:
+                    status, size = post_callback(connection, body, headers)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+                    size, status = 0, 0
+                samples.append((name, time.perf_counter() - start, status, size))
+                if think:
+                    time.sleep(rng.expovariate(1 / think))
+    finally:
+        connection.close()
+
+
+def run_load(url, clients, duration, think, seed):
+    requests = callback_requests(fetch_dependencies(url))
+    samples = []  # list.append is atomic, so threads share it
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=simulate_client, args=(url, requests, deadline, think, seed + i, samples))
+        for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ok = [s for s in samples if s[2] in OK_STATUSES]
+    per_callback = {}
+    for name, seconds, _, size in ok:
+        entry = per_callback.setdefault(name, {'seconds': [], 'bytes': 0})
+        entry['seconds'].append(seconds)
+        entry['bytes'] += size
+    return {
+        'seconds': elapsed,
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'throughput_rps': round(len(ok) / elapsed, 2),
+        'wire_bytes': sum(s[3] for s in ok),
+        'latency': latency_summary([s[1] for s in ok]),
+        'callbacks': {
+            name: dict(latency_summary(entry['seconds']), mean_bytes=entry['bytes'] // len(entry['seconds']))
+            for name, entry in sorted(per_callback.items())
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the app with concurrent simulated users.')
+    parser.add_argument('--url', help='target a running server instead of starting gunicorn')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--think', type=float, default=0, help='mean seconds between a client\'s requests')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--preload', action='store_true', help='start gunicorn with --preload')
+    parser.add_argument('--users', type=parse_rows, default=0, help='synthetic users, e.g. 100k, 5M')
+    parser.add_argument('--sessions', type=parse_rows, default=0, help='synthetic session rows, e.g. 10M')
+    parser.add_argument('--ready-timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON report path ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    dash_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {'benchmark': 'load', 'meta': run_metadata(dash_dir), 'config': {
+        key: getattr(args, key) for key in ('url', 'clients', 'duration', 'think', 'workers', 'threads',
+                                            'preload', 'users', 'sessions', 'seed')
+    }}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        url = args.url
+        if url is None:
+            workdir = dash_dir
+            if args.users or args.sessions:
+                report['pipeline'] = prepare_workdir(tmp, args.users, args.sessions, args.seed,
+                                                     assets_dir=os.path.join(dash_dir, 'assets'),
+                                                     workers=os.cpu_count() or 1)
+                workdir = tmp
+            port = free_port()
+            url = f'http://127.0.0.1:{port}'
+            process = start_gunicorn(dash_dir, workdir, port, args.workers, args.threads, args.preload)
+        try:
+            report['startup_seconds'] = wait_ready(url, args.ready_timeout, process)
+            report['load'] = run_load(url, args.clients, args.duration, args.think, args.seed)
+        finally:
+            if process is not None:
+                stop(process)
+
+    load = report['load']
+    print(f"{load['requests']:,} requests in {load['seconds']:.1f}s, {load['throughput_rps']:,.1f} req/s, "
+          f"{load['errors']:,} errors; p50 {load['latency'].get('p50_ms', 0):.1f} ms, "
+          f"p99 {load['latency'].get('p99_ms', 0):.1f} ms")
+    for name, stats in load['callbacks'].items():
+        print(f"  {stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f} ms  {name}")
+    if args.output:
+        write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Machine-readable benchmark results, so runs can be diffed over time."""
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+import numpy as np
+
+
+def run_metadata(dash_dir):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=dash_dir,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def latency_summary(seconds):
+    """Milliseconds percentiles of a list of latencies in seconds."""
+    if not len(seconds):
+        return {'count': 0}
+    ms = np.asarray(seconds) * 1000
+    return {
+        'count': int(len(ms)),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def write_report(report, path):
+    if path in (None, '-'):
+        print(json.dumps(report, indent=2))
+        return
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {path}')
@@ -0,0 +1,396 @@
+"""Synthetic users and sessions data for benchmarks and scale tests.
+
+Run from the Dash directory:
+
+    python -m benchmarks.synthetic --users 2M --sessions 50M --workers 8 --output /tmp/airbnb
+
+Writes ``train_users_2.csv`` and ``sessions.csv`` with the real schemas. The
+marginals follow the original 213k-user / 10.5M-row data explored in the
+notebook: the gender mix with '-unknown-', 41% missing ages plus the
+birth-year, 105 and 110 outliers, growing and seasonal signups, bookings for
+every non-NDF destination, device and browser shares, heavy-tailed sessions
+per user, and the action frequencies and mean durations of the action tables
+in ``assets``. Columns are drawn independently apart from destination and
+booking date.
+
+Every chunk is generated with vectorised NumPy from its own seed, so chunks
+can be rendered to CSV in a process pool and streamed to disk in order: memory
+stays at a few chunks however large the file, and a given seed always gives
+the same file. ``prepare_workdir`` builds a scratch app directory around the
+synthetic files, so the app can run at any scale without touching
+``Dash/assets``.
+"""
+import argparse
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pipeline import action_sketch, sequences, sessions, users_summary
+
+USERS_FILE = 'train_users_2.csv'
+SESSIONS_FILE = 'sessions.csv'
+SIZE_SUFFIXES = {'': 1, 'k': 1_000, 'm': 1_000_000, 'g': 1_000_000_000}
+CHUNK_ROWS = 250_000
+
+USERS_COLUMNS = ['id', 'date_account_created', 'timestamp_first_active', 'date_first_booking', 'gender', 'age',
+                 'signup_method', 'signup_flow', 'language', 'affiliate_channel', 'affiliate_provider',
+                 'first_affiliate_tracked', 'signup_app', 'first_device_type', 'first_browser',
+                 'country_destination']
+SESSIONS_COLUMNS = ['user_id', 'action', 'action_type', 'action_detail', 'device_type', 'secs_elapsed']
+
+# Value counts of the original users table; None stands for a missing value
+GENDER = {'-unknown-': 95688, 'FEMALE': 63041, 'MALE': 54440, 'OTHER': 282}
+SIGNUP_METHOD = {'basic': 152897, 'facebook': 60008, 'google': 546}
+SIGNUP_FLOW = {0: 164739, 25: 14659, 12: 9329, 3: 8822, 2: 6881, 24: 4328, 23: 2835, 1: 1047, 6: 301,
+               8: 240, 21: 196, 5: 36, 16: 11, 20: 14, 15: 10, 10: 2, 4: 1}
+LANGUAGE = {'en': 206314, 'zh': 1632, 'fr': 1172, 'es': 915, 'ko': 747, 'de': 732, 'it': 514, 'ru': 389,
+            'pt': 240, 'ja': 225, 'sv': 122, 'nl': 97, 'tr': 64, 'da': 58, 'pl': 54, 'cs': 32, 'no': 30,
+            'el': 24, 'th': 24, 'id': 22, 'hu': 18, 'fi': 14, 'is': 5, 'ca': 5, 'hr': 2}
+AFFILIATE_CHANNEL = {'direct': 137727, 'sem-brand': 26045, 'sem-non-brand': 18844, 'other': 8961, 'seo': 8663,
+                     'api': 8167, 'content': 3948, 'remarketing': 1096}
+AFFILIATE_PROVIDER = {'direct': 137426, 'google': 51693, 'other': 12549, 'craigslist': 3471, 'bing': 2328,
+                      'facebook': 2273, 'vast': 829, 'padmapper': 768, 'facebook-open-graph': 545,
+                      'yahoo': 496, 'gsp': 453, 'meetup': 347, 'email-marketing': 166, 'naver': 52,
+                      'baidu': 29, 'yandex': 17, 'wayn': 8, 'daum': 1}
+FIRST_AFFILIATE_TRACKED = {'untracked': 109232, 'linked': 46287, 'omg': 43982, 'tracked-other': 6156,
+                           None: 6065, 'product': 1556, 'marketing': 139, 'local ops': 34}
+SIGNUP_APP = {'Web': 182717, 'iOS': 19019, 'Moweb': 6261, 'Android': 5454}
+FIRST_DEVICE_TYPE = {'Mac Desktop': 89600, 'Windows Desktop': 72716, 'iPhone': 20759, 'iPad': 14339,
+                     'Other/Unknown': 10667, 'Android Phone': 2803, 'Android Tablet': 1292,
+                     'Desktop (Other)': 1199, 'SmartPhone (Other)': 76}
+FIRST_BROWSER = {'Chrome': 63845, 'Safari': 45169, 'Firefox': 33655, '-unknown-': 27266, 'IE': 21068,
+                 'Mobile Safari': 19274, 'Chrome Mobile': 1270, 'Android Browser': 851, 'AOL Explorer': 245,
+                 'Opera': 188, 'Silk': 124, 'Chromium': 73, 'BlackBerry Browser': 53, 'Maxthon': 46,
+                 'IE Mobile': 36, 'Apple Mail': 36, 'Sogou Explorer': 33, 'Mobile Firefox': 30}
+COUNTRY_DESTINATION = {'NDF': 124543, 'US': 62376, 'other': 10094, 'FR': 5023, 'IT': 2835, 'GB': 2324,
+                       'ES': 2249, 'CA': 1428, 'DE': 1061, 'NL': 762, 'AU': 539, 'PT': 217}
+
+# Ages: share missing, a log-normal core (median 34, IQR about 28-43) and the
+# data-entry outliers: birth years, the 105 and 110 spikes, 95-104, under 15
+AGE_MISSING = 0.412
+AGE_MEDIAN, AGE_SIGMA = 34, 0.3
+AGE_OUTLIERS = {'birth_year': 0.0062, '105': 0.009, '110': 0.0016, 'old': 0.003, 'young': 0.0005}
+
+FIRST_ACCOUNT_DAY = np.datetime64('2010-01-01')
+LAST_ACCOUNT_DAY = np.datetime64('2014-06-30')
+LAST_BOOKING_DAY = np.datetime64('2015-06-29')
+SIGNUP_DOUBLING_DAYS = 365
+SIGNUP_SEASONALITY = 0.2  # peak-to-mean amplitude, peaking in late summer
+
+# Sessions: rows per user are heavy-tailed with a mean of about 78
+SESSION_DEVICE_TYPE = {'Mac Desktop': 3594286, 'Windows Desktop': 2658539, 'iPhone': 2105031,
+                       'Android Phone': 839637, 'iPad Tablet': 683414,
+                       'Android App Unknown Phone/Tablet': 273652, '-unknown-': 211279, 'Tablet': 139886,
+                       'Linux Desktop': 28373, 'Chromebook': 22348, 'iPodtouch': 8198, 'Windows Phone': 2047,
+                       'Opera Phone': 1061, 'Blackberry': 979}
+ROWS_PER_USER_MEAN, ROWS_PER_USER_SIGMA = 78, 1.2
+ACTION_MISSING = 0.0075
+SECS_MISSING = 0.0129
+SECS_SIGMA = 2.4  # log-normal spread; mean/median of about 17 as in the log
+SECS_MAX = 1_799_977
+DEFAULT_SECS_MEAN = 19405
+# (action_type, action_detail) of the most frequent actions; others get '-unknown-'
+ACTION_DETAILS = {
+    'show': ('view', 'p3'),
+    'index': ('view', 'view_search_results'),
+    'search_results': ('click', 'view_search_results'),
+    'personalize': ('data', 'wishlist_content_update'),
+    'search': ('click', 'view_search_results'),
+    'ajax_refresh_subtotal': ('click', 'change_trip_characteristics'),
+    'update': ('submit', 'update_listing'),
+    'similar_listings': ('data', 'similar_listings'),
+    'social_connections': ('data', 'user_social_connections'),
+    'reviews': ('data', 'listing_reviews'),
+    'lookup': (None, None),
+    'active': ('-unknown-', '-unknown-'),
+    'dashboard': ('view', 'dashboard'),
+    'create': ('submit', 'create_user'),
+    'header_userpic': ('data', 'header_userpic'),
+    'edit': ('view', 'edit_profile'),
+    'confirm_email': ('click', 'confirm_email_link'),
+    'ask_question': ('submit', 'contact_host'),
+    'requested': ('view', 'post_checkout_action'),
+    'message_post': ('message_post', 'message_post'),
+}
+
+BASE36 = np.array(list('0123456789abcdefghijklmnopqrstuvwxyz'))
+ID_LENGTH = 10
+ID_MULTIPLIER = 2_654_435_761  # coprime to 36, so index -> id is a bijection mod 36**10
+
+
+def parse_rows(value):
+    """Row count such as ``100000``, ``100k`` or ``50M``."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)\s*', str(value))
+    if match is None:
+        raise argparse.ArgumentTypeError(f'not a row count: {value!r}')
+    number, suffix = match.groups()
+    return int(float(number) * SIZE_SUFFIXES[suffix.lower()])
+
+
+def user_ids(index):
+    """Deterministic 10-character base36 ids, so sessions can refer to users by index."""
+    scrambled = (np.asarray(index, dtype=np.uint64) * np.uint64(ID_MULTIPLIER)) % np.uint64(36 ** ID_LENGTH)
+    digits = np.empty((len(scrambled), ID_LENGTH), dtype='<U1')
+    for position in range(ID_LENGTH - 1, -1, -1):
+        digits[:, position] = BASE36[(scrambled % np.uint64(36)).astype(np.intp)]
+        scrambled //= np.uint64(36)
+    return digits.view(f'<U{ID_LENGTH}').ravel()
+
+
+def _choice(rng, counts, n):
+    values = np.array(list(counts), dtype=object)
+    weights = np.fromiter(counts.values(), dtype=float)
+    return values[rng.choice(len(values), n, p=weights / weights.sum())]
+
+
+def _signup_day_weights():
+    days = np.arange(FIRST_ACCOUNT_DAY, LAST_ACCOUNT_DAY + 1)
+    offset = (days - FIRST_ACCOUNT_DAY).astype(np.int64)
+    day_of_year = (days - days.astype('datetime64[Y]').astype('datetime64[D]')).astype(np.int64)
+    weights = 2.0 ** (offset / SIGNUP_DOUBLING_DAYS) * (1 + SIGNUP_SEASONALITY * np.sin(2 * np.pi * (day_of_year - 130) / 365))
+    return days, weights / weights.sum()
+
+
+def _ages(rng, n):
+    ages = np.round(AGE_MEDIAN * np.exp(rng.normal(0, AGE_SIGMA, n)))
+    kind = rng.random(n)
+    edges = np.cumsum(list(AGE_OUTLIERS.values()))
+    ages = np.where(kind < edges[0], rng.integers(1924, 2015, n), ages)
+    ages = np.where((kind >= edges[0]) & (kind < edges[1]), 105, ages)
+    ages = np.where((kind >= edges[1]) & (kind < edges[2]), 110, ages)
+    ages = np.where((kind >= edges[2]) & (kind < edges[3]), rng.integers(95, 105, n), ages)
+    ages = np.where((kind >= edges[3]) & (kind < edges[4]), rng.integers(1, 15, n), ages)
+    ages = ages.astype(float)
+    ages[rng.random(n) < AGE_MISSING] = np.nan
+    return ages
+
+
+def _timestamp_digits(moments):
+    """``yyyymmddHHMMSS`` integers, the format of timestamp_first_active."""
+    days = moments.astype('datetime64[D]')
+    months = moments.astype('datetime64[M]')
+    years = moments.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (days - months.astype('datetime64[D]')).astype(np.int64) + 1
+    seconds = (moments - days.astype('datetime64[s]')).astype(np.int64)
+    return (((years * 100 + month) * 100 + day) * 100 + seconds // 3600) * 10000 + (seconds // 60 % 60) * 100 + seconds % 60
+
+
+def users_frame(rng, start, n):
+    days, day_weights = _signup_day_weights()
+    created = days[rng.choice(len(days), n, p=day_weights)]
+    # Most users sign up on their first visit; some browse for a while first
+    active_lag = np.where(rng.random(n) < 0.9, 0, rng.geometric(0.01, n)).astype('timedelta64[D]')
+    active = (created - active_lag).astype('datetime64[s]') + rng.integers(0, 86400, n).astype('timedelta64[s]')
+
+    country = _choice(rng, COUNTRY_DESTINATION, n)
+    booking_lag = np.floor(np.exp(rng.normal(1.2, 1.8, n))).clip(0, 365).astype(np.int64).astype('timedelta64[D]')
+    booking = np.minimum(created + booking_lag, LAST_BOOKING_DAY).astype(str).astype(object)
+    booking[country == 'NDF'] = None
+
+    return pd.DataFrame({
+        'id': user_ids(np.arange(start, start + n)),
+        'date_account_created': created.astype(str),
+        'timestamp_first_active': _timestamp_digits(active),
+        'date_first_booking': booking,
+        'gender': _choice(rng, GENDER, n),
+        'age': _ages(rng, n),
+        'signup_method': _choice(rng, SIGNUP_METHOD, n),
+        'signup_flow': _choice(rng, SIGNUP_FLOW, n),
+        'language': _choice(rng, LANGUAGE, n),
+        'affiliate_channel': _choice(rng, AFFILIATE_CHANNEL, n),
+        'affiliate_provider': _choice(rng, AFFILIATE_PROVIDER, n),
+        'first_affiliate_tracked': _choice(rng, FIRST_AFFILIATE_TRACKED, n),
+        'signup_app': _choice(rng, SIGNUP_APP, n),
+        'first_device_type': _choice(rng, FIRST_DEVICE_TYPE, n),
+        'first_browser': _choice(rng, FIRST_BROWSER, n),
+        'country_destination': country,
+    }, columns=USERS_COLUMNS)
+
+
+def load_actions(action_counts=sessions.ACTION_COUNTS_CSV, action_time=sessions.ACTION_TIME_CSV):
+    """(actions, frequencies, mean seconds) from the published action tables."""
+    counts = pd.read_csv(action_counts, keep_default_na=False)
+    times = pd.read_csv(action_time, keep_default_na=False).set_index('action')['secs_elapsed']
+    names = counts['action'].astype(str).to_numpy()
+    mean_secs = times.reindex(names).fillna(DEFAULT_SECS_MEAN).to_numpy(dtype=float)
+    return names, counts['count'].to_numpy(dtype=float), mean_secs
+
+
+def sessions_frame(rng, n, first_user, users, actions):
+    names, frequencies, mean_secs = actions
+
+    # Rows come in per-user runs, like the real log
+    mu = np.log(ROWS_PER_USER_MEAN) - ROWS_PER_USER_SIGMA ** 2 / 2
+    per_user = np.maximum(np.round(np.exp(rng.normal(mu, ROWS_PER_USER_SIGMA, n // 8 + 16))), 1).astype(np.int64)
+    while per_user.sum() < n:
+        per_user = np.concatenate([per_user, per_user])
+    n_users = np.searchsorted(np.cumsum(per_user), n) + 1
+    per_user = per_user[:n_users]
+    per_user[-1] -= per_user.sum() - n
+    user_index = (first_user + np.arange(n_users)) % users
+    device = _choice(rng, SESSION_DEVICE_TYPE, n_users)
+
+    codes = rng.choice(len(names), n, p=frequencies / frequencies.sum())
+    mean = mean_secs[codes]
+    secs = np.minimum(np.round(mean * np.exp(rng.normal(-SECS_SIGMA ** 2 / 2, SECS_SIGMA, n))), SECS_MAX)
+    secs[rng.random(n) < SECS_MISSING] = np.nan
+
+    action_type = np.array([ACTION_DETAILS.get(name, ('-unknown-', '-unknown-'))[0] for name in names], dtype=object)
+    action_detail = np.array([ACTION_DETAILS.get(name, ('-unknown-', '-unknown-'))[1] for name in names], dtype=object)
+    action = names.astype(object)[codes]
+    types, details = action_type[codes], action_detail[codes]
+    missing = rng.random(n) < ACTION_MISSING
+    action[missing] = types[missing] = details[missing] = None
+
+    return pd.DataFrame({
+        'user_id': np.repeat(user_ids(user_index), per_user),
+        'action': action,
+        'action_type': types,
+        'action_detail': details,
+        'device_type': np.repeat(device, per_user),
+        'secs_elapsed': secs,
+    }, columns=SESSIONS_COLUMNS)
+
+
+def _rng(seed, stream, index):
+    return np.random.default_rng(np.random.SeedSequence([seed, stream, index]))
+
+
+def _users_csv(seed, index, start, n):
+    return users_frame(_rng(seed, 0, index), start, n).to_csv(index=False, header=False).encode()
+
+
+def _sessions_csv(seed, index, n, chunk_rows, users, actions):
+    # Consecutive chunks continue through the users in order
+    first_user = index * (chunk_rows // ROWS_PER_USER_MEAN)
+    return sessions_frame(_rng(seed, 1, index), n, first_user, users, actions).to_csv(
+        index=False, header=False).encode()
+
+
+def _stream(path, columns, tasks, workers):
+    """Write the CSV chunks returned by ``tasks`` (``(fn, args)``) to ``path`` in order."""
+    with open(path, 'wb') as out:
+        out.write((','.join(columns) + '\n').encode())
+        if workers <= 1:
+            for fn, args in tasks:
+                out.write(fn(*args))
+            return
+        # At most 2 chunks per worker in flight, so memory does not grow with the file
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for fn, args in tasks:
+                pending.append(pool.submit(fn, *args))
+                if len(pending) >= 2 * workers:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
+
+
+def _chunks(rows, chunk_rows):
+    return enumerate((start, min(chunk_rows, rows - start)) for start in range(0, rows, chunk_rows))
+
+
+def write_users(path, rows, seed=0, chunk_rows=CHUNK_ROWS, workers=1):
+    tasks = ((_users_csv, (seed, index, start, n)) for index, (start, n) in _chunks(rows, chunk_rows))
+    _stream(path, USERS_COLUMNS, tasks, workers)
+
+
+def write_sessions(path, rows, users=None, seed=0, chunk_rows=CHUNK_ROWS, workers=1,
+                   action_counts=sessions.ACTION_COUNTS_CSV, action_time=sessions.ACTION_TIME_CSV):
+    """Sessions log whose user ids refer to the first ``users`` rows of a
+    ``write_users`` file (about one user per 78 rows if not given)."""
+    actions = load_actions(action_counts, action_time)
+    users = users or max(rows // ROWS_PER_USER_MEAN, 1)
+    tasks = ((_sessions_csv, (seed, index, n, chunk_rows, users, actions))
+             for index, (_, n) in _chunks(rows, chunk_rows))
+    _stream(path, SESSIONS_COLUMNS, tasks, workers)
+
+
+def prepare_workdir(workdir, users=0, sessions_rows=0, seed=0, build=True, assets_dir='assets', workers=1):
+    """Scratch app directory with synthetic data; returns generation and build timings.
+
+    The real assets are symlinked in, except the users and sessions data and
+    the artifacts derived from them. With ``build`` the users summary, the
+    action tables, the action sketch and the session sequences are rebuilt
+    from the synthetic files, as a deploy would.
+    """
+    assets = os.path.join(workdir, 'assets')
+    os.makedirs(assets, exist_ok=True)
+    derived = {USERS_FILE, SESSIONS_FILE, os.path.basename(users_summary.SUMMARY_PATH)}
+    if sessions_rows:
+        derived |= {os.path.basename(sessions.ACTION_COUNTS_CSV), os.path.basename(sessions.ACTION_TIME_CSV),
+                    os.path.basename(action_sketch.SKETCH_PATH), os.path.basename(sequences.SEQUENCES_DIR)}
+    for name in os.listdir(assets_dir):
+        target = os.path.join(assets, name)
+        if name.startswith('.') or name in derived or os.path.lexists(target):
+            continue
+        os.symlink(os.path.abspath(os.path.join(assets_dir, name)), target)
+
+    timings = {}
+    users_path = os.path.join(assets, USERS_FILE)
+    sessions_path = os.path.join(assets, SESSIONS_FILE)
+    if users:
+        start = time.perf_counter()
+        write_users(users_path, users, seed, workers=workers)
+        timings['generate_users_seconds'] = time.perf_counter() - start
+    if sessions_rows:
+        start = time.perf_counter()
+        write_sessions(sessions_path, sessions_rows, users or None, seed, workers=workers,
+                       action_counts=os.path.join(assets_dir, os.path.basename(sessions.ACTION_COUNTS_CSV)),
+                       action_time=os.path.join(assets_dir, os.path.basename(sessions.ACTION_TIME_CSV)))
+        timings['generate_sessions_seconds'] = time.perf_counter() - start
+
+    if build and users:
+        start = time.perf_counter()
+        users_summary.build_summary(users_path, os.path.join(workdir, users_summary.SUMMARY_PATH), workers)
+        timings['build_summary_seconds'] = time.perf_counter() - start
+    if build and sessions_rows:
+        start = time.perf_counter()
+        partials, sketches = action_sketch.aggregate_and_sketch(sessions_path, workers=workers)
+        sessions.write_action_tables(
+            partials,
+            os.path.join(workdir, sessions.ACTION_COUNTS_CSV),
+            os.path.join(workdir, sessions.ACTION_TIME_CSV),
+        )
+        action_sketch.write_sketches(sketches, os.path.join(workdir, action_sketch.SKETCH_PATH))
+        timings['build_action_tables_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        sequences.build_sequences(sessions_path, os.path.join(workdir, sequences.SEQUENCES_DIR))
+        timings['build_sequences_seconds'] = time.perf_counter() - start
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write synthetic users and sessions CSVs.')
+    parser.add_argument('--users', type=parse_rows, default=parse_rows('100k'), help='e.g. 100k, 5M')
+    parser.add_argument('--sessions', type=parse_rows, default=0, help='e.g. 10M, 50M')
+    parser.add_argument('--output', default='.', help='directory for the CSVs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='processes rendering chunks')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    outputs = [
+        (args.users, USERS_FILE, lambda path: write_users(path, args.users, args.seed, workers=args.workers)),
+        (args.sessions, SESSIONS_FILE, lambda path: write_sessions(path, args.sessions, args.users or None,
+                                                                   args.seed, workers=args.workers)),
+    ]
+    for rows, name, write in outputs:
+        if not rows:
+            continue
+        path = os.path.join(args.output, name)
+        start = time.perf_counter()
+        write(path)
+        elapsed = time.perf_counter() - start
+        print(f'Wrote {path} ({rows:,} rows, {os.path.getsize(path) / 1e6:,.1f} MB, '
+              f'{rows / elapsed:,.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
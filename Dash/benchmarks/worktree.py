@@ -0,0 +1,28 @@
+"""Check out another revision of the app for before/after benchmarks."""
+import os
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def revision_dash_dir(dash_dir, rev):
+    """Yield the Dash directory of ``rev``, checked out into a temporary git worktree.
+
+    Data assets that are not tracked in git are symlinked in from ``dash_dir``.
+    """
+    repo = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=dash_dir,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    with tempfile.TemporaryDirectory() as tmp:
+        worktree = os.path.join(tmp, 'baseline')
+        subprocess.run(['git', 'worktree', 'add', '--detach', worktree, rev],
+                       cwd=repo, check=True, capture_output=True)
+        try:
+            baseline_dir = os.path.join(worktree, os.path.relpath(dash_dir, repo))
+            for name in os.listdir(os.path.join(dash_dir, 'assets')):
+                target = os.path.join(baseline_dir, 'assets', name)
+                if not os.path.exists(target) and not name.startswith('.'):
+                    os.symlink(os.path.join(dash_dir, 'assets', name), target)
+            yield baseline_dir
+        finally:
+            subprocess.run(['git', 'worktree', 'remove', '--force', worktree], cwd=repo, capture_output=True)
@@ -0,0 +1,48 @@
+"""Dense (country x gender x age bucket) view of age_gender_bkts.csv.
+
+The long table is pivoted once at load time so that a country's male and
+female series are a single array slice, and several countries can be compared
+with vectorised operations instead of filtering and merging per request.
+Missing (country, gender, bucket) cells are zero.
+"""
+import numpy as np
+import pandas as pd
+
+
+class AgeGenderCube:
+
+    def __init__(self, age_gender, genders=('male', 'female')):
+        # Buckets appear youngest-last in the CSV; plot them youngest-first.
+        self.age_buckets = pd.unique(age_gender['age_bucket'].astype(object))[::-1].tolist()
+        self.countries = pd.unique(age_gender['country_destination'].astype(object)).tolist()
+        self.genders = list(genders)
+        self.country_index = {c: i for i, c in enumerate(self.countries)}
+        self.gender_index = {g: i for i, g in enumerate(self.genders)}
+
+        country_codes = pd.Categorical(age_gender['country_destination'], categories=self.countries).codes
+        gender_codes = pd.Categorical(age_gender['gender'], categories=self.genders).codes
+        bucket_codes = pd.Categorical(age_gender['age_bucket'], categories=self.age_buckets).codes
+        known = (country_codes >= 0) & (gender_codes >= 0) & (bucket_codes >= 0)
+
+        self.values = np.zeros((len(self.countries), len(self.genders), len(self.age_buckets)))
+        np.add.at(
+            self.values,
+            (country_codes[known], gender_codes[known], bucket_codes[known]),
+            age_gender['population_in_thousands'].to_numpy(dtype=float)[known],
+        )
+
+    def country(self, country):
+        """(gender x age bucket) populations for one country."""
+        return self.values[self.country_index[country]]
+
+    def series(self, country, gender):
+        return self.values[self.country_index[country], self.gender_index[gender]]
+
+    def age_profiles(self, countries, normalize=True):
+        """(len(countries) x age bucket) populations over both genders,
+        as a percentage of each country's total when ``normalize``."""
+        totals = self.values[[self.country_index[c] for c in countries]].sum(axis=1)
+        if normalize:
+            country_totals = totals.sum(axis=1, keepdims=True)
+            totals = np.divide(totals * 100, country_totals, out=np.zeros_like(totals), where=country_totals > 0)
+        return totals
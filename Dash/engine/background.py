@@ -0,0 +1,179 @@
+"""Background callbacks on local processes with an on-disk result store.
+
+``background_callback`` registers a Dash background callback with
+``background_manager``, a ``DiskcacheManager`` whose jobs run in forked
+processes (so they inherit the loaded page data) and write their results to
+a diskcache directory that every gunicorn worker on the host shares; no
+broker is needed. Request threads only start jobs and poll for results.
+
+``SharedDiskcacheManager`` adds what Dash leaves out:
+
+- a result already on disk for the same inputs and data versions is returned
+  without forking, to any client and from any worker;
+- a job already running for the same inputs is joined instead of started
+  again, and it is only killed once every client waiting on it has gone;
+- progress is read without being consumed, so every waiting client sees it.
+
+It overrides ``DiskcacheManager`` internals that Dash does not document, so
+``requirements.txt`` pins dash and ``MANAGER_API`` records the signatures it
+was written against. If an upgrade changes any of them, a warning is issued
+at import and the stock ``DiskcacheManager`` is used instead: jobs are no
+longer shared, but nothing breaks.
+
+Pages add the versions of the data their callbacks read with
+``register_cache_by``; they are part of every result key, so republished
+data is never served from a stale result.
+
+``DASH_BACKGROUND=0``, or a missing ``diskcache``/``multiprocess``/``psutil``,
+runs the same callbacks inline, as before.
+"""
+import functools
+import inspect
+import os
+import warnings
+
+import dash
+
+try:
+    import diskcache
+    import psutil
+    import multiprocess  # noqa: F401  required by DiskcacheManager
+except ImportError:
+    diskcache = None
+
+ENABLED = os.environ.get('DASH_BACKGROUND', '1') == '1' and diskcache is not None
+CACHE_DIR = os.environ.get('DASH_BACKGROUND_CACHE', '.cache/background')
+# Seconds a finished result is kept after it was last read
+EXPIRE = int(os.environ.get('DASH_BACKGROUND_EXPIRE', 3600))
+POLL_INTERVAL_MS = 250
+# Job id of a result served from disk; ``job_running`` treats it as finished
+REUSED = 0
+
+# DiskcacheManager members SharedDiskcacheManager overrides or calls, as in dash 2.16
+MANAGER_API = {
+    'call_job_fn': '(self, key, job_fn, args, context)',
+    'terminate_job': '(self, job)',
+    'job_running': '(self, job)',
+    'get_progress': '(self, key)',
+    'get_result': '(self, key, job)',
+    'result_ready': '(self, key)',
+    '_make_progress_key': '(key)',
+}
+
+_cache_by = []
+
+
+def register_cache_by(version):
+    """Make ``version()`` part of every background result key."""
+    _cache_by.append(version)
+
+
+def _data_versions():
+    return tuple(version() for version in _cache_by)
+
+
+def manager_api_changes(manager_class):
+    """Members of ``MANAGER_API`` that ``manager_class`` lacks or has with
+    another signature."""
+    changes = []
+    for name, expected in MANAGER_API.items():
+        member = getattr(manager_class, name, None)
+        if member is None or str(inspect.signature(member)) != expected:
+            changes.append(name)
+    if not hasattr(manager_class, 'UNDEFINED'):
+        changes.append('UNDEFINED')
+    return changes
+
+
+if ENABLED:
+
+    class SharedDiskcacheManager(dash.DiskcacheManager):
+
+        @staticmethod
+        def _job_key(key):
+            return f'{key}-job'
+
+        @staticmethod
+        def _waiters_key(job):
+            return f'job-{int(job)}-waiters'
+
+        def call_job_fn(self, key, job_fn, args, context):
+            with self.handle.transact():
+                if self.result_ready(key):
+                    return REUSED
+                job = self.handle.get(self._job_key(key))
+                if job is not None and self.job_running(job):
+                    self.handle.incr(self._waiters_key(job))
+                    return job
+            # Fork outside the transaction so the job does not inherit the
+            # lock; two identical requests racing here both run, harmlessly.
+            job = super().call_job_fn(key, job_fn, args, context)
+            self.handle.set(self._waiters_key(job), 1, expire=EXPIRE)
+            self.handle.set(self._job_key(key), job, expire=EXPIRE)
+            return job
+
+        def terminate_job(self, job):
+            if job is None or int(job) == REUSED:
+                return
+            with self.handle.transact():
+                waiters = self.handle.decr(self._waiters_key(job), default=1)
+                if waiters > 0:
+                    return
+                self.handle.delete(self._waiters_key(job))
+            super().terminate_job(job)
+
+        def job_running(self, job):
+            if job is None or int(job) == REUSED:
+                return False
+            return super().job_running(job)
+
+        def get_progress(self, key):
+            return self.handle.get(self._make_progress_key(key))
+
+        def get_result(self, key, job):
+            result = super().get_result(key, job)
+            if result is not self.UNDEFINED:
+                self.handle.delete(self._job_key(key))
+            return result
+
+    _changed = manager_api_changes(dash.DiskcacheManager)
+    if _changed:
+        warnings.warn(f'dash {dash.__version__} changed DiskcacheManager.{", ".join(_changed)}; '
+                      'background jobs are not shared between clients')
+    background_manager = (dash.DiskcacheManager if _changed else SharedDiskcacheManager)(
+        diskcache.Cache(CACHE_DIR),
+        cache_by=[_data_versions],
+        expire=EXPIRE,
+    )
+else:
+    background_manager = None
+
+
+def _skip_progress(fn):
+    @functools.wraps(fn)
+    def inline(*args, **kwargs):
+        return fn(lambda *_: None, *args, **kwargs)
+    return inline
+
+
+def background_callback(*dependencies, progress=None, progress_default=None, cancel=None,
+                        interval=POLL_INTERVAL_MS, **kwargs):
+    """``dash.callback`` that runs in ``background_manager``.
+
+    With ``progress`` the function takes ``set_progress`` as its first
+    argument, as in Dash; inline it is a no-op. ``running`` works either way.
+    """
+    def decorator(fn):
+        if background_manager is None:
+            return dash.callback(*dependencies, **kwargs)(_skip_progress(fn) if progress else fn)
+        return dash.callback(
+            *dependencies,
+            background=True,
+            manager=background_manager,
+            progress=progress,
+            progress_default=progress_default,
+            cancel=cancel,
+            interval=interval,
+            **kwargs,
+        )(fn)
+    return decorator
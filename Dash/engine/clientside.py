@@ -0,0 +1,22 @@
+"""Clientside rendering mode for pages with small datasets.
+
+With ``DASH_RENDER_MODE=clientside`` pg1 and pg3 ship their pre-aggregated
+data to the browser once in a ``dcc.Store`` and the dropdowns update the
+figure through the functions in ``assets/clientside.js``, without a server
+round-trip. The default ``server`` mode keeps the Python callbacks.
+"""
+import json
+import os
+
+RENDER_MODE = os.environ.get('DASH_RENDER_MODE', 'server')
+CLIENTSIDE = RENDER_MODE == 'clientside'
+
+
+def figure_json(fig):
+    """Plain JSON-compatible dict for a figure, as the browser will see it."""
+    return json.loads(fig.to_json())
+
+
+def trace_arrays(fig, keys=('y', 'text')):
+    """Per-trace data arrays of ``fig``, for swapping into a template figure."""
+    return [{key: trace.get(key) for key in keys} for trace in figure_json(fig)['data']]
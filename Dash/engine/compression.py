@@ -0,0 +1,167 @@
+"""gzip/brotli compression of callback, layout and asset responses.
+
+Figure JSON is mostly repeated keys and numbers and compresses 5-10x, but
+Flask sends it as is. ``install_compression`` adds an ``after_request`` hook
+to the app's server that compresses text responses for clients that accept
+it, preferring brotli when the ``brotli`` package is installed and falling
+back to gzip. Static files (component bundles under ``/_dash-component-suites``
+and ``/assets``) do not change while the app runs, so their compressed bodies
+are kept in a small cache keyed by path, validator and encoding.
+
+A compressed body is a different representation, so its ETag gets an
+``-gzip``/``-br`` suffix; caches never take one encoding's validator for the
+other's. Dash and werkzeug compare ``If-None-Match`` with the ETags they
+computed on the uncompressed body, so the suffix is stripped from the request
+header before they see it and put back on their 304 responses.
+
+``DASH_COMPRESSION=0`` turns the layer off, e.g. behind a proxy that already
+compresses.
+"""
+import gzip
+import os
+import re
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENABLED = os.environ.get('DASH_COMPRESSION', '1') == '1'
+GZIP_LEVEL = int(os.environ.get('DASH_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('DASH_BROTLI_QUALITY', 5))
+# Below this the headers outweigh the savings
+MIN_SIZE = 500
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'text/javascript',
+    'text/html', 'text/css', 'text/plain', 'image/svg+xml',
+}
+STATIC_PREFIXES = ('/_dash-component-suites/', '/assets/')
+STATIC_CACHE_SIZE = 128
+ENCODINGS = ('br', 'gzip')
+_ETAG = re.compile(r'(W/)?"([^"]*)"')
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    raise ValueError(f'unsupported encoding {encoding!r}')
+
+
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in available_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def split_etag(tag):
+    """``(tag, encoding)`` of an ETag suffixed here, else ``(tag, None)``."""
+    for encoding in ENCODINGS:
+        if tag.endswith(f'-{encoding}'):
+            return tag[:-len(encoding) - 1], encoding
+    return tag, None
+
+
+class _StaticCache:
+
+    def __init__(self, maxsize=STATIC_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body
+        body = build()
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return body
+
+
+def _compressible(response):
+    return (
+        response.status_code == 200
+        and 'Content-Encoding' not in response.headers
+        and response.mimetype in COMPRESSIBLE_TYPES
+        # Files from send_file are streamed but finite; generators are not
+        and (response.direct_passthrough or not response.is_streamed)
+    )
+
+
+def install_compression(server):
+    """Compress eligible responses of the Flask ``server`` in place."""
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    static_cache = _StaticCache()
+
+    @server.before_request
+    def strip_etag_encodings():
+        header = request.environ.get('HTTP_IF_NONE_MATCH')
+        if not header:
+            return
+        g.etag_encodings = {}
+        tags = []
+        for weak, tag in _ETAG.findall(header):
+            tag, encoding = split_etag(tag)
+            if encoding:
+                g.etag_encodings[tag] = encoding
+            tags.append(f'{weak}"{tag}"')
+        if g.etag_encodings:
+            request.environ['HTTP_IF_NONE_MATCH'] = ', '.join(tags)
+            request.__dict__.pop('if_none_match', None)
+
+    @server.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            tag, weak = response.get_etag()
+            encoding = getattr(g, 'etag_encodings', {}).get(tag)
+            if encoding:
+                response.set_etag(f'{tag}-{encoding}', weak)
+                response.vary.add('Accept-Encoding')
+            return response
+        if not _compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        # send_file responses pass the file through; read them into memory
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if request.path.startswith(STATIC_PREFIXES) and validator:
+            body = static_cache.get((request.path, validator, encoding), lambda: compress(data, encoding))
+        else:
+            body = compress(data, encoding)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag:
+            response.set_etag(f'{tag}-{encoding}', weak)
+        return response
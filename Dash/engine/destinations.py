@@ -0,0 +1,118 @@
+"""Per-destination fact table joining countries.csv, population and bookings.
+
+Every destination gets a dense integer id (its position in ``codes``) and
+each fact is one array indexed by that id: coordinates, distance, area and
+language distance from countries.csv, male/female population totals from an
+``AgeGenderCube``, and booking counts and shares from the users summary. The
+join runs once when the data is loaded, so a callback that colours a map or
+ranks destinations only reads and indexes arrays.
+
+The users' ``NDF`` (no booking) and ``other`` destinations have no country,
+so they get no id; they are kept as totals so shares stay over all bookings.
+"""
+import numpy as np
+
+NO_BOOKING = 'NDF'
+OTHER = 'other'
+
+COUNTRY_NAMES = {
+    'US': 'United States',
+    'FR': 'France',
+    'IT': 'Italy',
+    'DE': 'Germany',
+    'GB': 'United Kingdom',
+    'ES': 'Spain',
+    'CA': 'Canada',
+    'AU': 'Australia',
+    'NL': 'Netherlands',
+    'PT': 'Portugal',
+}
+ISO3 = {
+    'US': 'USA', 'FR': 'FRA', 'IT': 'ITA', 'DE': 'DEU', 'GB': 'GBR',
+    'ES': 'ESP', 'CA': 'CAN', 'AU': 'AUS', 'NL': 'NLD', 'PT': 'PRT',
+}
+
+# metric -> (label, hover format); every metric is an attribute of DestinationFacts
+METRICS = {
+    'bookings': ('First Bookings', ',.0f'),
+    'booking_share': ('Share of Bookings (%)', '.1f'),
+    'bookings_per_million': ('Bookings per Million Residents', ',.1f'),
+    'population': ('Population (x 1000)', ',.0f'),
+    'population_density': ('Residents per km²', ',.1f'),
+    'distance_km': ('Distance from the US (km)', ',.0f'),
+    'language_distance': ('Language Distance from English', '.1f'),
+}
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    return np.divide(numerator * scale, denominator, out=np.full(len(numerator), np.nan), where=denominator > 0)
+
+
+class DestinationFacts:
+
+    def __init__(self, countries, cube, booking_counts, total_users):
+        countries = countries.rename(columns=lambda column: column.strip())
+        codes = list(dict.fromkeys(str(c) for c in countries['country_destination']))
+        codes += [c for c in cube.countries if c not in codes]
+        self.codes = codes
+        self.index = {code: i for i, code in enumerate(codes)}
+        self.names = [COUNTRY_NAMES.get(code, code) for code in codes]
+        self.iso3 = [ISO3.get(code, code) for code in codes]
+
+        attributes = countries.assign(country_destination=countries['country_destination'].astype(str))
+        attributes = attributes.drop_duplicates('country_destination').set_index('country_destination').reindex(codes)
+        self.lat = attributes['lat_destination'].to_numpy(dtype=float)
+        self.lng = attributes['lng_destination'].to_numpy(dtype=float)
+        self.distance_km = attributes['distance_km'].to_numpy(dtype=float)
+        self.area_km2 = attributes['destination_km2'].to_numpy(dtype=float)
+        self.language = attributes['destination_language'].astype(object).fillna('').astype(str).tolist()
+        self.language_distance = attributes['language_levenshtein_distance'].to_numpy(dtype=float)
+
+        # (country x gender) totals over all age buckets, zero where the cube has no country
+        by_gender = np.zeros((len(codes), len(cube.genders)))
+        known = [(i, cube.country_index[code]) for i, code in enumerate(codes) if code in cube.country_index]
+        if known:
+            ids, cube_ids = map(list, zip(*known))
+            by_gender[ids] = cube.values[cube_ids].sum(axis=2)
+        self.genders = list(cube.genders)
+        self.population_by_gender = by_gender
+        self.population = by_gender.sum(axis=1)
+        self.population_density = _ratio(self.population, self.area_km2, 1000.0)
+
+        booking_counts = {str(k): int(v) for k, v in booking_counts.items()}
+        self.total_users = int(total_users)
+        self.booked_users = sum(v for k, v in booking_counts.items() if k != NO_BOOKING)
+        self.other_bookings = booking_counts.get(OTHER, 0)
+        self.bookings = np.array([booking_counts.get(code, 0) for code in codes], dtype=float)
+        self.booking_share = _ratio(self.bookings, np.full(len(codes), float(self.booked_users)), 100.0)
+        self.bookings_per_million = _ratio(self.bookings, self.population, 1000.0)
+
+    @classmethod
+    def from_tables(cls, countries, cube, summary):
+        """Facts from countries.csv, an ``AgeGenderCube`` and a users summary."""
+        counts = summary['counts']['country']
+        return cls(countries, cube, dict(zip(counts['index'], counts['values'])), summary['rows'])
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, metric):
+        return getattr(self, metric)
+
+    def ranking(self, metric):
+        """Ids with a value for ``metric``, largest first."""
+        values = self.column(metric)
+        ids = np.flatnonzero(~np.isnan(values))
+        return ids[np.argsort(-values[ids], kind='stable')]
+
+    def row(self, code):
+        """Every fact of one destination, or None for an unknown code."""
+        i = self.index.get(code)
+        if i is None:
+            return None
+        row = {'code': code, 'name': self.names[i], 'language': self.language[i]}
+        row.update({metric: float(self.column(metric)[i]) for metric in METRICS})
+        row.update({f'population_{gender}': float(self.population_by_gender[i, g])
+                    for g, gender in enumerate(self.genders)})
+        return row
+
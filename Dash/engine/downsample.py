@@ -0,0 +1,88 @@
+"""Server-side reduction of plotted data to a small, bounded payload.
+
+Figures should carry a few kilobytes whatever the size of the dataset behind
+them: histograms are sent as pre-computed bars and smooth lines are thinned to
+the fewest points that still draw the same curve, or, for jagged series such as
+prices, to a fixed point budget that keeps their peaks and troughs.
+"""
+import numpy as np
+
+MAX_HISTOGRAM_BINS = 60
+LINE_TOLERANCE = 2e-3
+MIN_LINE_POINTS = 16
+MAX_LINE_POINTS = 256
+
+
+def integer_histogram(values, weights=None, max_bins=MAX_HISTOGRAM_BINS):
+    """Density histogram of whole-number ``values`` with integer-width bins
+    centred on whole numbers, so no bin covers more values than its neighbours.
+
+    Returns ``(edges, density)``; at most ``max_bins`` bins.
+    """
+    values = np.asarray(values, dtype=float)
+    lo, hi = values.min(), values.max()
+    width = max(1, int(np.ceil((hi - lo + 1) / max_bins)))
+    n_bins = int(np.ceil((hi - lo + 1) / width))
+    edges = lo - 0.5 + width * np.arange(n_bins + 1)
+    density, edges = np.histogram(values, bins=edges, weights=weights, density=True)
+    return edges, density
+
+
+def adaptive_line(x, y, tolerance=LINE_TOLERANCE, min_points=MIN_LINE_POINTS, max_points=MAX_LINE_POINTS):
+    """Thin a smooth line to evenly spaced points.
+
+    The point count doubles from ``min_points`` until linear interpolation
+    between the kept points is within ``tolerance * max(|y|)`` of every
+    original point, or ``max_points`` is reached.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    scale = np.abs(y).max() if n else 0
+    points = min_points
+    while points < n:
+        points = min(points, max_points)
+        index = np.unique(np.linspace(0, n - 1, points).round().astype(int))
+        if points == max_points or np.abs(np.interp(x, x[index], y[index]) - y).max() <= tolerance * scale:
+            return x[index], y[index]
+        points *= 2
+    return x, y
+
+
+def lttb(x, y, n_out):
+    """Indices of ``n_out`` points of ``(x, y)`` chosen by Largest-Triangle-
+    Three-Buckets: the first and last points, plus one point per bucket of
+    the rest, the one forming the largest triangle with the point kept in the
+    previous bucket and the mean of the next. ``x`` must be ascending.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i covers rows bounds[i]:bounds[i + 1]; the last point is its own bucket
+    bounds = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    bounds = np.append(bounds, n)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi, next_hi = bounds[i], bounds[i + 1], bounds[i + 2]
+        mean_x = (sum_x[next_hi] - sum_x[hi]) / (next_hi - hi)
+        mean_y = (sum_y[next_hi] - sum_y[hi]) / (next_hi - hi)
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(area.argmax())
+        kept[i + 1] = a
+    return kept
+
+
+def rounded(values, digits=6):
+    """Round to ``digits`` significant digits so the JSON carries no noise digits."""
+    values = np.asarray(values, dtype=float)
+    magnitude = np.floor(np.log10(np.abs(values), out=np.zeros_like(values), where=values != 0))
+    scale = 10.0 ** (digits - 1 - magnitude)
+    return np.round(values * scale) / scale
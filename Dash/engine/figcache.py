@@ -0,0 +1,141 @@
+"""Process-wide LRU cache of serialised Plotly figures.
+
+Page callbacks have tiny input domains (a country, a plot selector, a top-n),
+so the same figures are rebuilt over and over. ``figure_cache.get`` keys a
+figure on the page, its callback inputs and the version of the data it was
+built from, and keeps the figure's JSON, plus the parsed figure once a
+callback has asked for it so later hits return it without re-parsing. A new
+data version for a page drops that page's entries.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from engine.metrics import figure_build_seconds
+
+DEFAULT_MAXSIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 512))
+
+
+class FigureCache:
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+
+    def _invalidate(self, page, version):
+        if self._versions.get(page, version) != version:
+            stale = [key for key in self._entries if key[0] == page]
+            for key in stale:
+                self.bytes -= len(self._entries.pop(key)[0])
+            self.invalidations += len(stale)
+        self._versions[page] = version
+
+    def get_json(self, page, inputs, version, build):
+        """Return the figure JSON for ``inputs``, calling ``build()`` on a miss."""
+        key = (page, inputs)
+        with self._lock:
+            self._invalidate(page, version)
+            entry = self._hit(key)
+            if entry is not None:
+                return entry[0]
+        return self._build(key, version, build)[0]
+
+    def _hit(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _build(self, key, version, build):
+        # Build outside the lock; two concurrent misses just build twice.
+        start = time.perf_counter()
+        payload = build().to_json()
+        figure_build_seconds.observe(time.perf_counter() - start, key[0])
+        entry = [payload, json.loads(payload)]
+        return self._store(key, version, entry)
+
+    def _store(self, key, version, entry):
+        """Keep ``entry`` ([payload, parsed figure or None]) unless the page
+        moved to another version meanwhile; returns the entry now cached."""
+        with self._lock:
+            if self._versions.get(key[0]) != version:
+                return entry
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = entry
+            self.bytes += len(entry[0])
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted[0])
+                self.evictions += 1
+            return entry
+
+    def put(self, page, inputs, version, payload):
+        """Store figure JSON rendered elsewhere, e.g. by the warm-up pool."""
+        with self._lock:
+            self._invalidate(page, version)
+        self._store((page, inputs), version, [payload, None])
+
+    def lookup(self, page, inputs, version):
+        """The cached figure dict, or None without building anything."""
+        key = (page, inputs)
+        with self._lock:
+            self._invalidate(page, version)
+            entry = self._hit(key)
+            if entry is None:
+                return None
+        return self._parsed(entry)
+
+    def get(self, page, inputs, version, build):
+        """Return the cached figure as a dict, ready to hand back to Dash.
+
+        The dict is shared by every caller; hand it to Dash as is and never
+        modify it.
+        """
+        key = (page, inputs)
+        with self._lock:
+            self._invalidate(page, version)
+            entry = self._hit(key)
+        if entry is None:
+            entry = self._build(key, version, build)
+        return self._parsed(entry)
+
+    @staticmethod
+    def _parsed(entry):
+        # Warm-up stores JSON only; parse it once, on the first request
+        if entry[1] is None:
+            entry[1] = json.loads(entry[0])
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+figure_cache = FigureCache()
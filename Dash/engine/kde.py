@@ -0,0 +1,131 @@
+"""Binned Gaussian KDE evaluated by FFT convolution.
+
+``binned_kde`` uses the same bandwidth rule as ``scipy.stats.gaussian_kde``
+(scalar factor, 'scott' or 'silverman', optional weights), but instead of
+summing n kernels at each of m evaluation points (O(n * m)) it linearly bins
+the samples onto a regular grid and convolves the grid with the kernel via
+FFT (O(n + g log g)), then interpolates onto the requested points.
+
+Tolerance: with the default ``cells_per_bandwidth=20`` the binning and the
+final interpolation each contribute at most about (1/20)**2 / 8 of the peak
+density, so the result stays within 1e-3 * max(density) of scipy's;
+``benchmarks/bench_kde.py`` checks this. Raise ``cells_per_bandwidth`` for a
+tighter match.
+"""
+import numpy as np
+
+CELLS_PER_BANDWIDTH = 20
+KERNEL_TAIL = 5  # the kernel is truncated at +-5 bandwidths
+MAX_GRID = 1 << 20
+
+
+def _normalized_weights(data, weights):
+    if weights is None:
+        return np.full(data.shape, 1.0 / data.size)
+    weights = np.asarray(weights, dtype=float).ravel()
+    return weights / weights.sum()
+
+
+def _sample_size(data, weights):
+    """Number of samples behind ``data``: integer weights are counts of
+    repeated values (np.cov's fweights), any others are gaussian_kde's
+    reliability weights with their effective size 1 / sum(w**2)."""
+    if weights is None:
+        return float(data.size)
+    weights = np.asarray(weights, dtype=float).ravel()
+    if np.array_equal(weights, np.round(weights)):
+        return weights.sum()
+    return weights.sum() ** 2 / np.sum(weights ** 2)
+
+
+def kde_bandwidth(data, bw_method=None, weights=None):
+    """Kernel standard deviation gaussian_kde would use for 1-D ``data``.
+
+    With integer ``weights`` (counts) it is the bandwidth of gaussian_kde
+    fitted to the expanded samples, each value repeated count times.
+    """
+    data = np.asarray(data, dtype=float).ravel()
+    neff = _sample_size(data, weights)
+    weights = _normalized_weights(data, weights)
+
+    if bw_method is None or bw_method == 'scott':
+        factor = neff ** (-1.0 / 5)
+    elif bw_method == 'silverman':
+        factor = (neff * 3.0 / 4.0) ** (-1.0 / 5)
+    elif np.isscalar(bw_method) and not isinstance(bw_method, str):
+        factor = float(bw_method)
+    else:
+        raise ValueError("bw_method must be 'scott', 'silverman' or a scalar")
+
+    mean = np.sum(weights * data)
+    # Unbiased variance over neff samples; for reliability weights this is
+    # np.cov(aweights=...), for counts np.cov(fweights=...)
+    variance = np.sum(weights * (data - mean) ** 2) * neff / (neff - 1.0)
+    return factor * np.sqrt(variance)
+
+
+def _linear_binning(data, weights, lo, delta, size):
+    position = (data - lo) / delta
+    left = np.floor(position).astype(np.int64)
+    right_share = position - left
+    counts = np.bincount(left, weights * (1.0 - right_share), minlength=size + 1)
+    counts += np.bincount(left + 1, weights * right_share, minlength=size + 1)
+    return counts[:size]
+
+
+def binned_kde(data, x, bw_method=None, weights=None, cells_per_bandwidth=CELLS_PER_BANDWIDTH):
+    """Evaluate the Gaussian KDE of 1-D ``data`` at the points ``x``."""
+    data = np.asarray(data, dtype=float).ravel()
+    x = np.asarray(x, dtype=float)
+    if data.size < 2:
+        raise ValueError('binned_kde needs at least two samples')
+    bandwidth = kde_bandwidth(data, bw_method, weights)
+    weights = _normalized_weights(data, weights)
+    if not np.isfinite(bandwidth) or bandwidth <= 0:
+        raise ValueError('data has zero variance; the KDE is undefined')
+
+    tail = KERNEL_TAIL * bandwidth
+    lo = min(data.min(), x.min()) - tail
+    hi = max(data.max(), x.max()) + tail
+    delta = bandwidth / cells_per_bandwidth
+    size = int(np.ceil((hi - lo) / delta)) + 1
+    if size > MAX_GRID:
+        size = MAX_GRID
+        delta = (hi - lo) / (size - 1)
+
+    grid_counts = _linear_binning(data, weights, lo, delta, size)
+
+    half = int(np.ceil(tail / delta))
+    offsets = np.arange(-half, half + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+
+    n_fft = 1 << (size + 2 * half).bit_length()
+    convolved = np.fft.irfft(np.fft.rfft(grid_counts, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)
+    density = np.clip(convolved[half:half + size], 0, None)
+
+    grid = lo + np.arange(size) * delta
+    return np.interp(x, grid, density)
+
+
+def segment_kdes(data, segments, x, bw_method=None, weights=None, min_samples=2):
+    """Per-segment KDE curves on a shared set of points.
+
+    Returns ``{segment: density}`` for every segment with at least
+    ``min_samples`` samples and non-zero variance; each segment gets its own
+    bandwidth, as if gaussian_kde were fitted to it separately.
+    """
+    data = np.asarray(data, dtype=float).ravel()
+    segments = np.asarray(segments)
+    weights = None if weights is None else np.asarray(weights, dtype=float).ravel()
+
+    curves = {}
+    for segment in np.unique(segments):
+        mask = segments == segment
+        if mask.sum() < min_samples:
+            continue
+        segment_weights = None if weights is None else weights[mask]
+        try:
+            curves[segment] = binned_kde(data[mask], x, bw_method, segment_weights)
+        except ValueError:
+            continue
+    return curves
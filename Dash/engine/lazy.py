@@ -0,0 +1,77 @@
+"""Deferred page data loading and per-page readiness.
+
+Pages wrap their expensive setup (CSV loads, aggregates, model fits) in a
+``LazyData`` instead of running it at import time. The data is loaded on first
+``get()`` or by ``start_background_loading``, whichever comes first, so
+importing a page only registers its route and callbacks.
+"""
+import threading
+import time
+
+_registry = {}
+
+
+class LazyData:
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = 'pending'
+        self.error = None
+        self.seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self):
+        if self.state != 'ready':
+            with self._lock:
+                if self.state != 'ready':
+                    self._load()
+        return self._value
+
+    def _load(self):
+        self.state = 'loading'
+        start = time.perf_counter()
+        try:
+            self._value = self.loader()
+        except Exception as exc:
+            self.state = 'failed'
+            self.error = repr(exc)
+            raise
+        finally:
+            self.seconds = time.perf_counter() - start
+        self.state = 'ready'
+        self.error = None
+
+    def _load_quietly(self):
+        try:
+            self.get()
+        except Exception:
+            pass  # recorded in self.state / self.error; the next get() retries
+
+    def start(self):
+        threading.Thread(target=self._load_quietly, name=f'load-{self.name}', daemon=True).start()
+
+
+def start_background_loading():
+    for data in list(_registry.values()):
+        if data.state == 'pending':
+            data.start()
+
+
+def load_pending():
+    """Load every still pending page in this thread, e.g. in a gunicorn
+    master before it forks, where a half-done loading thread would not be
+    carried over."""
+    for data in list(_registry.values()):
+        if data.state == 'pending':
+            data._load_quietly()
+
+
+def readiness():
+    pages = {
+        name: {'state': data.state, 'seconds': data.seconds, 'error': data.error}
+        for name, data in _registry.items()
+    }
+    return all(page['state'] == 'ready' for page in pages.values()), pages
@@ -0,0 +1,149 @@
+"""Time-indexed columnar store of OHLCV bars for many tickers.
+
+Built by ``pipeline.marketdata`` and memory-mapped from a directory of
+``.npy`` arrays: one array per field (``time`` as int64 nanoseconds, then
+open, high, low, close, volume) holding every ticker's bars, ticker by
+ticker and in time order within each, plus ``offsets`` so that ticker i's
+bars are rows ``offsets[i]:offsets[i + 1]``.
+
+A visible time range is two ``np.searchsorted`` calls on the ticker's time
+slice, and re-aggregating it into coarser bars is one bucket id per row and
+a ``reduceat`` per field, so zooming costs O(rows in view) whatever the
+length of the history and never touches other tickers.
+"""
+import json
+import os
+
+import numpy as np
+
+STORE_VERSION = 1
+META_FILE = 'meta.json'
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Bar widths tried, finest first, when a range has to be re-aggregated;
+# 'W' buckets start on Monday and 'M' on the 1st
+BAR_WIDTHS = (
+    ('1min', np.timedelta64(1, 'm')),
+    ('5min', np.timedelta64(5, 'm')),
+    ('15min', np.timedelta64(15, 'm')),
+    ('1H', np.timedelta64(1, 'h')),
+    ('4H', np.timedelta64(4, 'h')),
+    ('1D', np.timedelta64(1, 'D')),
+    ('W', np.timedelta64(7, 'D')),
+    ('M', np.timedelta64(31, 'D')),
+)
+MONDAY = np.datetime64('1970-01-05', 'ns')
+
+
+def to_time(value):
+    """``datetime64[ns]`` of a date, ISO timestamp or Plotly axis value."""
+    return np.datetime64(str(value).strip().replace(' ', 'T'), 'ns')
+
+
+def bucket_starts(times, width):
+    """Start of the ``width`` bucket (see BAR_WIDTHS) containing each time."""
+    if width == 'M':
+        return times.astype('datetime64[M]').astype('datetime64[ns]')
+    step = dict(BAR_WIDTHS)[width].astype('timedelta64[ns]')
+    origin = MONDAY if width == 'W' else np.datetime64(0, 'ns')
+    return origin + (times - origin) // step * step
+
+
+class Bars:
+    """OHLCV columns of one ticker over a time window (views, no copies)."""
+
+    def __init__(self, time, open, high, low, close, volume, width=None):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        # None for the stored bars, else the BAR_WIDTHS label they were rolled up to
+        self.width = width
+
+    def __len__(self):
+        return len(self.time)
+
+    def resample(self, width):
+        """The same window rolled up into ``width`` bars."""
+        if not len(self):
+            return Bars(*(column[:0] for column in self.columns()), width=width)
+        buckets = bucket_starts(self.time, width)
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        ends = np.append(starts[1:], len(self)) - 1
+        return Bars(
+            buckets[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts),
+            width=width,
+        )
+
+    def columns(self):
+        return self.time, self.open, self.high, self.low, self.close, self.volume
+
+
+def choose_width(start, end, max_bars):
+    """Finest bar width that splits ``[start, end]`` into at most ``max_bars``."""
+    span = np.asarray(end - start).astype('timedelta64[ns]')
+    for label, width in BAR_WIDTHS:
+        if span // width.astype('timedelta64[ns]') < max_bars:
+            return label
+    return BAR_WIDTHS[-1][0]
+
+
+class MarketStore:
+
+    def __init__(self, tickers, offsets, time, **fields):
+        self.tickers = list(tickers)
+        self.offsets = offsets
+        self.time = time
+        self.fields = fields
+        self._positions = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f'{directory} has market store version {meta.get("version")}, '
+                             f'expected {STORE_VERSION}')
+        arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                  for name in ('offsets', 'time', *FIELDS)}
+        arrays['time'] = arrays['time'].view('datetime64[ns]')
+        return cls(meta['tickers'], **arrays)
+
+    def __contains__(self, ticker):
+        return ticker in self._positions
+
+    def _rows(self, ticker):
+        i = self._positions[ticker]
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def time_range(self, tickers=None):
+        """(first, last) bar time over ``tickers`` (all by default), or (None, None)."""
+        bounds = [self._rows(ticker) for ticker in (tickers or self.tickers) if ticker in self]
+        bounds = [(lo, hi) for lo, hi in bounds if hi > lo]
+        if not bounds:
+            return None, None
+        return min(self.time[lo] for lo, _ in bounds), max(self.time[hi - 1] for _, hi in bounds)
+
+    def bars(self, ticker, start=None, end=None):
+        """Stored bars of ``ticker`` with ``start <= time <= end``."""
+        lo, hi = self._rows(ticker)
+        times = self.time[lo:hi]
+        first = np.searchsorted(times, to_time(start), 'left') if start is not None else 0
+        last = np.searchsorted(times, to_time(end), 'right') if end is not None else len(times)
+        rows = slice(lo + first, lo + last)
+        return Bars(self.time[rows], *(self.fields[name][rows] for name in FIELDS))
+
+    def ohlc(self, ticker, start, end, max_bars):
+        """Bars of ``ticker`` in ``[start, end]``, rolled up to the finest
+        width that keeps them within ``max_bars`` (stored bars if they fit)."""
+        bars = self.bars(ticker, start, end)
+        if len(bars) <= max_bars:
+            return bars
+        return bars.resample(choose_width(to_time(start), to_time(end), max_bars))
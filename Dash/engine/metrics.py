@@ -0,0 +1,227 @@
+"""Per-callback latency, payload size and cache metrics in Prometheus format.
+
+``install_metrics(app)`` wraps every server-side callback in
+``app.callback_map`` and times Dash's JSON serialisation of the result, so
+each callback gets histograms of
+
+* ``dash_callback_seconds``: wall time of the whole callback,
+* ``dash_callback_build_seconds``: time in the page function (figure
+  building, cache lookups), i.e. wall time minus serialisation,
+* ``dash_callback_serialize_seconds``: time in ``to_json``,
+* ``dash_callback_response_bytes``: size of the JSON response body,
+
+plus ``dash_figure_build_seconds`` for figure-cache misses per page. ``/metrics``
+serves them together with the figure cache counters and page data load
+times. Numbers are per process; under gunicorn scrape each worker or sum.
+
+``DASH_METRICS=0`` leaves the callbacks unwrapped.
+"""
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('DASH_METRICS', '1') == '1'
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set."""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total, n) for labels, (counts, total, n) in self._series.items())
+        for labels, counts, total, n in series:
+            pairs = list(zip(self.label_names, labels))
+            label_text = _labels(pairs)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(pairs, le=_number(bound))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_labels(pairs, le="+Inf")} {n}')
+            lines.append(f'{self.name}_sum{label_text} {_number(total)}')
+            lines.append(f'{self.name}_count{label_text} {n}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, **extra):
+    pairs = list(pairs) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _scalar(name, kind, help_text, samples):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in samples]
+    return lines
+
+
+callback_seconds = Histogram('dash_callback_seconds', 'Wall time of a Dash callback request.',
+                             SECONDS_BUCKETS, ['callback'])
+callback_build_seconds = Histogram('dash_callback_build_seconds',
+                                   'Time spent in the callback function itself.',
+                                   SECONDS_BUCKETS, ['callback'])
+callback_serialize_seconds = Histogram('dash_callback_serialize_seconds',
+                                       'Time spent serialising the callback output to JSON.',
+                                       SECONDS_BUCKETS, ['callback'])
+callback_response_bytes = Histogram('dash_callback_response_bytes',
+                                    'Uncompressed size of the callback response body.',
+                                    BYTES_BUCKETS, ['callback'])
+figure_build_seconds = Histogram('dash_figure_build_seconds',
+                                 'Time to build and serialise a figure on a figure cache miss.',
+                                 SECONDS_BUCKETS, ['page'])
+HISTOGRAMS = [callback_seconds, callback_build_seconds, callback_serialize_seconds,
+              callback_response_bytes, figure_build_seconds]
+
+_errors = {}
+_errors_lock = threading.Lock()
+_serialize = threading.local()
+
+
+def _count_error(name, exc):
+    key = (name, type(exc).__name__)
+    with _errors_lock:
+        _errors[key] = _errors.get(key, 0) + 1
+
+
+def _instrument(name, callback):
+    def instrumented(*args, **kwargs):
+        _serialize.seconds = 0.0
+        start = time.perf_counter()
+        try:
+            response = callback(*args, **kwargs)
+        except Exception as exc:
+            # PreventUpdate and friends are counted but not timed
+            _count_error(name, exc)
+            raise
+        wall = time.perf_counter() - start
+        serialize = _serialize.seconds
+        callback_seconds.observe(wall, name)
+        callback_serialize_seconds.observe(serialize, name)
+        callback_build_seconds.observe(max(wall - serialize, 0.0), name)
+        if isinstance(response, (str, bytes)):
+            callback_response_bytes.observe(len(response), name)
+        return response
+
+    instrumented.__name__ = getattr(callback, '__name__', 'callback')
+    instrumented.__wrapped__ = callback
+    instrumented.instrumented = True
+    return instrumented
+
+
+def _callback_name(callback):
+    function = getattr(callback, '__wrapped__', callback)
+    module = getattr(function, '__module__', None)
+    return f'{module}.{function.__name__}' if module else function.__name__
+
+
+def instrument_callbacks(callback_map):
+    for entry in callback_map.values():
+        callback = entry.get('callback')
+        # Clientside callbacks have no server function
+        if callback is not None and not getattr(callback, 'instrumented', False):
+            entry['callback'] = _instrument(_callback_name(callback), callback)
+
+
+def _patch_serializer():
+    from dash import _callback
+
+    to_json = _callback.to_json
+    if getattr(to_json, 'instrumented', False):
+        return
+
+    def timed_to_json(obj):
+        start = time.perf_counter()
+        try:
+            return to_json(obj)
+        finally:
+            _serialize.seconds = getattr(_serialize, 'seconds', 0.0) + time.perf_counter() - start
+
+    timed_to_json.instrumented = True
+    _callback.to_json = timed_to_json
+
+
+def exposition():
+    """All metrics in the Prometheus text exposition format."""
+    from engine.figcache import figure_cache
+    from engine.lazy import readiness
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.exposition()
+
+    with _errors_lock:
+        errors = sorted(_errors.items())
+    lines += _scalar('dash_callback_exceptions_total', 'counter',
+                     'Callbacks that raised, including PreventUpdate.',
+                     [((('callback', name), ('exception', exc)), n) for (name, exc), n in errors])
+
+    stats = figure_cache.stats()
+    for key in ('hits', 'misses', 'evictions', 'invalidations'):
+        lines += _scalar(f'dash_figure_cache_{key}_total', 'counter', f'Figure cache {key}.', [((), stats[key])])
+    for key in ('entries', 'maxsize', 'bytes'):
+        lines += _scalar(f'dash_figure_cache_{key}', 'gauge', f'Figure cache {key}.', [((), stats[key])])
+
+    _, pages = readiness()
+    lines += _scalar('dash_page_data_ready', 'gauge', '1 once the page data has loaded.',
+                     [((('page', name),), int(page['state'] == 'ready')) for name, page in sorted(pages.items())])
+    lines += _scalar('dash_page_data_load_seconds', 'gauge', 'Time taken to load the page data.',
+                     [((('page', name),), page['seconds']) for name, page in sorted(pages.items())
+                      if page['seconds'] is not None])
+    return '\n'.join(lines) + '\n'
+
+
+def install_metrics(app):
+    """Instrument ``app``'s callbacks and serve ``/metrics`` from its server."""
+    from flask import Response
+
+    server = app.server
+
+    @server.route('/metrics')
+    def metrics():
+        return Response(exposition(), mimetype='text/plain; version=0.0.4')
+
+    if not ENABLED:
+        return
+    _patch_serializer()
+
+    # Page callbacks are merged into app.callback_map on the first request,
+    # so wrap whatever is new before each request; Dash's own setup hook was
+    # registered first and has already run.
+    @server.before_request
+    def instrument():
+        if any(entry.get('callback') is not None and not getattr(entry['callback'], 'instrumented', False)
+               for entry in app.callback_map.values()):
+            instrument_callbacks(app.callback_map)
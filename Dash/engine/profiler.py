@@ -0,0 +1,81 @@
+"""On-demand sampling profiler for hot-path investigation.
+
+With ``DASH_PROFILER=1`` the app serves ``/profile?seconds=10``: for that long
+a background thread snapshots every other thread's Python stack
+(``sys._current_frames``) every ``interval`` seconds, and the response is the
+samples in collapsed-stack format (``outer;inner;leaf count`` per line),
+which flamegraph.pl and speedscope read directly. Nothing runs between
+requests to the endpoint, so leaving the toggle on costs nothing; it is off by
+default because anyone who can reach the app could trigger it.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ENABLED = os.environ.get('DASH_PROFILER') == '1'
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 60
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def sample(seconds, interval=DEFAULT_INTERVAL):
+    """Sample all other threads for ``seconds``; returns ``Counter`` of stacks."""
+    stacks = Counter()
+    own = threading.get_ident()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def collapsed(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+def _clamped(value, default, low, high):
+    """``value`` as a float within [low, high]; ValueError if it is not a finite number."""
+    number = default if value is None else float(value)
+    if not math.isfinite(number):
+        raise ValueError(f'{value!r} is not a finite number')
+    return min(max(number, low), high)
+
+
+def install_profiler(server):
+    """Serve ``/profile`` from the Flask ``server`` when ``DASH_PROFILER=1``."""
+    if not ENABLED:
+        return
+    from flask import Response, request
+
+    busy = threading.Lock()
+
+    @server.route('/profile')
+    def profile():
+        try:
+            seconds = _clamped(request.args.get('seconds'), 10, 0, MAX_SECONDS)
+            interval = _clamped(request.args.get('interval'), DEFAULT_INTERVAL, MIN_INTERVAL, MAX_INTERVAL)
+        except ValueError as exc:
+            return Response(f'seconds and interval must be numbers: {exc}\n', status=400, mimetype='text/plain')
+        if not busy.acquire(blocking=False):
+            return Response('a profile is already running\n', status=409, mimetype='text/plain')
+        try:
+            stacks = sample(seconds, interval)
+        finally:
+            busy.release()
+        return Response(collapsed(stacks), mimetype='text/plain')
@@ -0,0 +1,184 @@
+"""Filter-and-aggregate engine over the users table.
+
+Every categorical column is dictionary-encoded once and gets one packed bitmap
+(``np.packbits``) per distinct value. A conjunctive filter such as "gender in
+{FEMALE} and country in {FR} and account created in Q3" is the AND of per
+column ORs of bitmaps, and a group-by count is a popcount of that bitmap ANDed
+with each value's bitmap. Both are byte-wise vector operations over n/8 bytes,
+so queries take milliseconds without rescanning the table.
+
+``UsersQuery.state`` returns the filtered rows in the same mergeable shape as
+``pipeline.users_summary.users_state``, so filtered views go through the same
+``summarize`` and figure code as the global ones.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from pipeline.users_summary import AGE_LIMIT, AGE_SEGMENTS, CATEGORY_COLUMNS
+
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+MISSING = 'NaN'
+# Day number of a missing date (NaT viewed as int64)
+NO_DAY = np.iinfo(np.int64).min
+
+Dimension = namedtuple('Dimension', ['categories', 'positions', 'codes', 'bitmaps'])
+
+
+class BitmapIndex:
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.all_rows = np.packbits(np.ones(n_rows, dtype=bool))
+        self.dimensions = {}
+
+    def add_dimension(self, name, values):
+        labels = pd.Series(values).astype(object).fillna(MISSING).astype(str)
+        categorical = pd.Categorical(labels)
+        codes = categorical.codes.astype(np.int32)
+        categories = [str(c) for c in categorical.categories]
+        bitmaps = np.empty((len(categories), len(self.all_rows)), dtype=np.uint8)
+        for i in range(len(categories)):
+            bitmaps[i] = np.packbits(codes == i)
+        self.dimensions[name] = Dimension(categories, {c: i for i, c in enumerate(categories)}, codes, bitmaps)
+
+    def select(self, filters):
+        """Bitmap of rows matching every ``{dimension: values}`` filter; empty
+        value lists are ignored, unknown values match nothing."""
+        selected = self.all_rows.copy()
+        for name, values in filters.items():
+            if not values:
+                continue
+            dimension = self.dimensions[name]
+            matching = np.zeros_like(selected)
+            for value in values:
+                position = dimension.positions.get(value)
+                if position is not None:
+                    matching |= dimension.bitmaps[position]
+            selected &= matching
+        return selected
+
+    def range_bitmap(self, values, lo=None, hi=None):
+        """Bitmap of rows with ``lo <= values <= hi``; a bounded range never
+        matches NO_DAY rows."""
+        mask = np.ones(self.n_rows, dtype=bool)
+        if lo is not None:
+            mask &= values >= lo
+        if hi is not None:
+            mask &= values <= hi
+        if lo is not None or hi is not None:
+            mask &= values != NO_DAY
+        return np.packbits(mask)
+
+    def mask(self, bitmap):
+        return np.unpackbits(bitmap, count=self.n_rows).view(bool)
+
+    @staticmethod
+    def count(bitmap):
+        return int(POPCOUNT[bitmap].sum(dtype=np.int64))
+
+    def group_counts(self, name, bitmap):
+        """``{value: rows}`` of dimension ``name`` within ``bitmap``, zeros dropped."""
+        dimension = self.dimensions[name]
+        counts = POPCOUNT[dimension.bitmaps & bitmap].sum(axis=1, dtype=np.int64)
+        return {c: int(n) for c, n in zip(dimension.categories, counts) if n}
+
+
+def _days(dates):
+    days = pd.to_datetime(dates, errors='coerce').to_numpy(dtype='datetime64[D]')
+    # NaT becomes NO_DAY, which is below every real day, so any ``<= hi``
+    # test matches it; callers have to exclude it explicitly
+    return days.astype(np.int64)
+
+
+def _day_label(day):
+    return str(np.datetime64(int(day), 'D'))
+
+
+def _to_day(value):
+    return None if value in (None, '') else int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+class UsersQuery:
+    """Bitmap-indexed users table answering filtered pg2 aggregates."""
+
+    def __init__(self, users):
+        self.index = BitmapIndex(len(users))
+        for name, column in CATEGORY_COLUMNS.items():
+            self.index.add_dimension(name, users[column])
+        for name, column in (('account_month', 'date_account_created'), ('booking_month', 'date_first_booking')):
+            months = pd.to_datetime(users[column], errors='coerce').dt.strftime('%Y-%m')
+            self.index.add_dimension(name, months)
+
+        self.account_days = _days(users['date_account_created'])
+        self.booking_days = _days(users['date_first_booking'])
+        ages = users['age'].to_numpy(dtype=float)
+        valid = (ages < AGE_LIMIT) & ~np.isnan(ages)
+        self.ages = np.where(valid, np.floor(np.where(valid, ages, 0)), -1).astype(np.int16)
+
+    def categories(self, name):
+        return self.index.dimensions[name].categories
+
+    def account_date_range(self):
+        valid = self.account_days[self.account_days != NO_DAY]
+        if not len(valid):
+            return None, None
+        return _day_label(valid.min()), _day_label(valid.max())
+
+    def select(self, filters, account_start=None, account_end=None):
+        bitmap = self.index.select(filters)
+        if account_start or account_end:
+            bitmap &= self.index.range_bitmap(self.account_days, _to_day(account_start), _to_day(account_end))
+        return bitmap
+
+    def _age_counts(self, mask, segment=None):
+        ages = self.ages[mask]
+        valid = ages >= 0
+        if segment is None:
+            counts = np.bincount(ages[valid], minlength=AGE_LIMIT)
+            return {str(age): int(n) for age, n in enumerate(counts) if n}
+
+        dimension = self.index.dimensions[segment]
+        codes = dimension.codes[mask][valid]
+        counts = np.bincount(codes * AGE_LIMIT + ages[valid], minlength=len(dimension.categories) * AGE_LIMIT)
+        by_segment = {}
+        for code, row in enumerate(counts.reshape(len(dimension.categories), AGE_LIMIT)):
+            ages_present = np.flatnonzero(row)
+            if len(ages_present):
+                by_segment[dimension.categories[code]] = {str(age): int(row[age]) for age in ages_present}
+        return by_segment
+
+    @staticmethod
+    def _day_counts(days):
+        days, counts = np.unique(days[days != NO_DAY], return_counts=True)
+        return {_day_label(day): int(n) for day, n in zip(days, counts)}
+
+    def _booking_lag(self, mask):
+        account = self.account_days[mask]
+        booking = self.booking_days[mask]
+        booked = (account != NO_DAY) & (booking != NO_DAY)
+        days, inverse = np.unique(account[booked], return_inverse=True)
+        totals = np.bincount(inverse, weights=booking[booked] - account[booked], minlength=len(days))
+        counts = np.bincount(inverse, minlength=len(days))
+        return {_day_label(day): [int(total), int(n)] for day, total, n in zip(days, totals, counts)}
+
+    def state(self, bitmap):
+        """Filtered rows in the ``users_state`` format."""
+        mask = self.index.mask(bitmap)
+        months = {
+            name: {k: v for k, v in self.index.group_counts(f'{name}_month', bitmap).items() if k != MISSING}
+            for name in ('account', 'booking')
+        }
+        return {
+            'rows': self.index.count(bitmap),
+            'months': months,
+            'days': {
+                'account': self._day_counts(self.account_days[mask]),
+                'booking': self._day_counts(self.booking_days[mask]),
+            },
+            'lag': self._booking_lag(mask),
+            'categories': {name: self.index.group_counts(name, bitmap) for name in CATEGORY_COLUMNS},
+            'age': self._age_counts(mask),
+            'age_by': {name: self._age_counts(mask, name) for name in AGE_SEGMENTS},
+        }
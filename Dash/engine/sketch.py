@@ -0,0 +1,100 @@
+"""Mergeable Space-Saving sketch of action counts and durations.
+
+A ``SpaceSaving`` summary keeps at most ``capacity`` counters, each holding an
+action's estimated count, the most it may be overestimated by, and the
+``secs_elapsed`` sum and sample count seen while it was tracked. Two summaries
+merge by adding counters, charging an action missing from a full summary that
+summary's smallest count, and keeping the ``capacity`` largest (Cafaro et al.,
+parallel Space-Saving). Every chunk or partition of the sessions log is summed
+exactly, then merged in, so memory is O(capacity) however long the log is.
+
+Guarantees, with N the number of rows summarised and k the capacity:
+
+- a count is never below the true count and at most N/k above it;
+- every action with more than N/k rows is tracked;
+- while fewer than k distinct actions have been seen nothing is ever evicted,
+  and counts and mean durations are exact.
+
+Mean durations of evicted-and-readmitted actions cover only the rows seen
+since they were last admitted.
+"""
+CAPACITY = 1024
+
+
+class SpaceSaving:
+
+    def __init__(self, capacity=CAPACITY, total=0, counters=None):
+        self.capacity = capacity
+        self.total = total
+        # action -> [count, error, secs_sum, secs_n]
+        self.counters = counters if counters is not None else {}
+
+    @classmethod
+    def exact(cls, counts, secs_sum, secs_n, capacity=CAPACITY):
+        """Summary of exactly known per-action totals (dicts keyed by action)."""
+        counters = {
+            action: [int(count), 0, float(secs_sum.get(action, 0.0)), int(secs_n.get(action, 0))]
+            for action, count in counts.items() if count > 0
+        }
+        sketch = cls(capacity, sum(counter[0] for counter in counters.values()), counters)
+        sketch._truncate()
+        return sketch
+
+    def __len__(self):
+        return len(self.counters)
+
+    @property
+    def full(self):
+        return len(self.counters) >= self.capacity
+
+    @property
+    def floor(self):
+        """Upper bound on the count of any action this summary does not track."""
+        if not self.full:
+            return 0
+        return min(counter[0] for counter in self.counters.values())
+
+    @property
+    def error_bound(self):
+        """Largest possible overestimate of any count."""
+        return self.total / self.capacity if self.full else 0
+
+    def _truncate(self):
+        if len(self.counters) <= self.capacity:
+            return
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        self.counters = dict(ranked[:self.capacity])
+
+    def merge(self, other):
+        """New summary of the rows of both ``self`` and ``other``."""
+        left_floor, right_floor = self.floor, other.floor
+        missing_left = [left_floor, left_floor, 0.0, 0]
+        missing_right = [right_floor, right_floor, 0.0, 0]
+        counters = {}
+        for action in self.counters.keys() | other.counters.keys():
+            left = self.counters.get(action, missing_left)
+            right = other.counters.get(action, missing_right)
+            counters[action] = [a + b for a, b in zip(left, right)]
+        merged = SpaceSaving(max(self.capacity, other.capacity), self.total + other.total, counters)
+        merged._truncate()
+        return merged
+
+    def top(self, n=None):
+        """``[(action, count, error, secs_sum, secs_n)]`` by descending count."""
+        ranked = sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))
+        return [(action, *counter) for action, counter in ranked[:n]]
+
+    def to_dict(self):
+        return {'capacity': self.capacity, 'total': self.total, 'counters': self.counters}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['capacity'], data['total'], {action: list(c) for action, c in data['counters'].items()})
+
+
+def merge_sketches(left, right):
+    """Merge two ``{slice: SpaceSaving}`` mappings slice by slice."""
+    merged = dict(left)
+    for key, sketch in right.items():
+        merged[key] = merged[key].merge(sketch) if key in merged else sketch
+    return merged
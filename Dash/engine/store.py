@@ -0,0 +1,162 @@
+"""Columnar binary cache for the dashboard's CSV assets.
+
+The first ``load_table`` of a CSV parses it once and writes one ``.npy`` file
+per column under ``assets/.cache``; later loads memory-map those files instead
+of parsing. Low-cardinality string columns (gender, country_destination,
+action, ...) are dictionary-encoded into small integer codes, other string
+columns are stored as fixed-width unicode arrays.
+
+Memory-mapped pages live in the OS page cache, so forked gunicorn workers
+reading the same table share one physical copy instead of each holding a
+private parsed frame. String columns are the exception once they are in a
+DataFrame, since pandas holds them as Python objects; ``load_table`` only
+materialises the columns asked for, and ``string_column`` returns the shared
+fixed-width array so callers can convert just the slice they need.
+
+The cache is keyed by the source file's size and mtime and by a hash of the
+``read_csv`` options, so callers parsing the same CSV differently get their
+own caches; changing the CSV produces fresh cache directories on the next
+load. ``columns`` only selects from the cached table and is not part of the
+key.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = 'assets/.cache'
+CACHE_VERSION = 1
+
+# Object columns with fewer distinct values than this share of rows are
+# dictionary-encoded.
+CATEGORICAL_MAX_RATIO = 0.5
+
+
+def _options_hash(read_options):
+    options = json.dumps(read_options, sort_keys=True, default=repr)
+    return hashlib.sha1(options.encode()).hexdigest()[:12]
+
+
+def _cache_path(source, cache_dir, read_options):
+    """Cache directory for ``source`` parsed with ``read_options``, and the
+    prefix shared by every cache of the current version of ``source``."""
+    stat = os.stat(source)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    prefix = f'{stem}-v{CACHE_VERSION}-{stat.st_size}-{stat.st_mtime_ns}-'
+    return os.path.join(cache_dir, prefix + _options_hash(read_options)), stem, prefix
+
+
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write_column(directory, index, series):
+    meta = {'name': series.name}
+    path = os.path.join(directory, f'{index}.npy')
+
+    if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.astype(object)
+        n_unique = values.nunique(dropna=True)
+        if n_unique < CATEGORICAL_MAX_RATIO * max(len(values), 1):
+            categorical = pd.Categorical(values)
+            codes = categorical.codes.astype(_codes_dtype(len(categorical.categories)))
+            np.save(path, codes)
+            meta.update(kind='categorical', categories=[str(c) for c in categorical.categories])
+        else:
+            missing = values.isna().to_numpy()
+            np.save(path, values.fillna('').astype(str).to_numpy(dtype=str))
+            if missing.any():
+                np.save(os.path.join(directory, f'{index}.missing.npy'), missing)
+            meta.update(kind='string', has_missing=bool(missing.any()))
+    elif series.dtype.kind in 'biuf':
+        np.save(path, series.to_numpy())
+        meta.update(kind='numeric')
+    else:
+        raise TypeError(f'cannot cache column {series.name!r} of dtype {series.dtype}')
+    return meta
+
+
+def _build(source, target, read_options):
+    df = pd.read_csv(source, **read_options)
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.staging-')
+    try:
+        columns = [_write_column(staging, i, df[name]) for i, name in enumerate(df.columns)]
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({'rows': len(df), 'columns': columns}, f)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            # Another worker published the same cache first.
+            shutil.rmtree(staging, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _read_column(directory, index, meta):
+    values = np.load(os.path.join(directory, f'{index}.npy'), mmap_mode='r')
+    if meta['kind'] == 'categorical':
+        return pd.Categorical.from_codes(values, categories=meta['categories'])
+    if meta['kind'] == 'string':
+        # Python objects are private to the worker; only requested columns get here
+        strings = values.astype(object)
+        if meta['has_missing']:
+            strings[np.load(os.path.join(directory, f'{index}.missing.npy'))] = np.nan
+        return strings
+    return values
+
+
+def _remove_stale(cache_dir, stem, current):
+    # Caches of the current file under other read options belong to other callers
+    for entry in os.listdir(cache_dir):
+        if entry.startswith(f'{stem}-v') and not entry.startswith(current):
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+
+
+def _open(source, cache_dir, read_options):
+    target, stem, current = _cache_path(source, cache_dir, read_options)
+    if not os.path.exists(os.path.join(target, 'meta.json')):
+        _build(source, target, read_options)
+        _remove_stale(cache_dir, stem, current)
+
+    with open(os.path.join(target, 'meta.json')) as f:
+        return target, json.load(f)
+
+
+def load_table(source, cache_dir=CACHE_DIR, columns=None, **read_options):
+    """Return ``source`` as a DataFrame, building the binary cache if needed.
+
+    Numeric and categorical columns are read-only memory maps; treat the frame
+    as immutable and ``copy()`` before modifying it. Pass ``columns`` on large
+    tables so unused string columns (ids and the like) are not copied into
+    every worker.
+    """
+    target, meta = _open(source, cache_dir, read_options)
+    wanted = None if columns is None else set(columns)
+    return pd.DataFrame({
+        column['name']: _read_column(target, i, column)
+        for i, column in enumerate(meta['columns'])
+        if wanted is None or column['name'] in wanted
+    }, copy=False)
+
+
+def string_column(source, name, cache_dir=CACHE_DIR, **read_options):
+    """Memory-mapped fixed-width unicode array of string column ``name``
+    (missing values are ''), shared by every worker; convert slices with
+    ``astype(object)`` as needed."""
+    target, meta = _open(source, cache_dir, read_options)
+    for i, column in enumerate(meta['columns']):
+        if column['name'] == name:
+            if column['kind'] != 'string':
+                raise TypeError(f'column {name!r} of {source} is {column["kind"]}, not string')
+            return np.load(os.path.join(target, f'{i}.npy'), mmap_mode='r')
+    raise KeyError(f'{source} has no column {name!r}')
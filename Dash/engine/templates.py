@@ -0,0 +1,42 @@
+"""Shared Plotly template for every page.
+
+Each figure's JSON embeds its whole template, and the stock 'plotly' template
+is about 7 KB of styling for some forty trace types, most of which no page
+draws. ``airbnb`` keeps the stock look (colours, fonts, axis styling) for the
+trace types the pages use and adds the white background and autosizing every
+page used to set per figure, plus the styling of pg3's centred value labels,
+so each annotation only carries its position and text. Importing this module
+makes it the default.
+"""
+import plotly.graph_objects as go
+import plotly.io as pio
+
+TEMPLATE_NAME = 'airbnb'
+
+# Layout settings of the stock template that affect the figures drawn here
+LAYOUT_KEYS = ('autotypenumbers', 'colorway', 'colorscale', 'font', 'hoverlabel', 'hovermode',
+               'title', 'xaxis', 'yaxis', 'geo')
+TRACE_TYPES = ('bar', 'scatter', 'choropleth', 'scattergeo')
+SHARED_LAYOUT = {
+    'plot_bgcolor': 'white',
+    'paper_bgcolor': 'white',
+    'autosize': True,
+    'annotationdefaults': {
+        'showarrow': False,
+        'font': {'size': 12, 'color': 'black', 'family': 'Arial'},
+        'align': 'center',
+        'bgcolor': 'white',
+    },
+}
+
+
+def slim_template(base='plotly'):
+    stock = pio.templates[base].to_plotly_json()
+    layout = {key: value for key, value in stock['layout'].items() if key in LAYOUT_KEYS}
+    layout.update(SHARED_LAYOUT)
+    data = {key: value for key, value in stock['data'].items() if key in TRACE_TYPES}
+    return go.layout.Template(layout=layout, data=data)
+
+
+pio.templates[TEMPLATE_NAME] = slim_template()
+pio.templates.default = TEMPLATE_NAME
@@ -0,0 +1,85 @@
+"""Date-indexed series with O(log n) range rollups.
+
+Daily values are kept once as a sorted array of days plus running totals
+(``np.cumsum`` with a leading zero). The sum over any ``[start, end]`` range
+is two ``np.searchsorted`` lookups and a subtraction, so rolling a range up
+into b daily, weekly or monthly buckets costs O(b log n) however many days
+and users lie inside it, and zooming never rescans the data.
+"""
+import numpy as np
+
+RESOLUTIONS = {'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly'}
+# Auto resolution picks the finest one with at most this many buckets
+MAX_BUCKETS = 400
+MONDAY = np.datetime64('1970-01-05', 'D')
+
+
+def to_day(value):
+    """``datetime64[D]`` of a date, ISO string or Plotly axis value."""
+    return np.datetime64(str(value)[:10], 'D')
+
+
+def choose_resolution(start, end, max_buckets=MAX_BUCKETS):
+    days = int((to_day(end) - to_day(start)).astype(np.int64)) + 1
+    if days <= max_buckets:
+        return 'D'
+    if days <= max_buckets * 7:
+        return 'W'
+    return 'M'
+
+
+def bucket_edges(start, end, resolution):
+    """Bucket start days covering ``[start, end]``, plus the day after the last bucket.
+
+    Weeks start on Monday and months on the 1st, so buckets line up however
+    the range is zoomed; the first and last bucket may be partial.
+    """
+    start, end = to_day(start), to_day(end)
+    if resolution == 'D':
+        return np.arange(start, end + 2)
+    if resolution == 'W':
+        first = start - (start - MONDAY).astype(np.int64) % 7
+        return np.arange(first, end + 8, 7)
+    if resolution == 'M':
+        months = np.arange(start.astype('datetime64[M]'), end.astype('datetime64[M]') + 2)
+        return months.astype('datetime64[D]')
+    raise ValueError(f'unknown resolution {resolution!r}, expected one of {sorted(RESOLUTIONS)}')
+
+
+class DateSeries:
+    """Named daily value columns over a sorted day index."""
+
+    def __init__(self, days, **values):
+        days = np.asarray(days, dtype='datetime64[D]')
+        order = np.argsort(days, kind='stable')
+        self.days = days[order]
+        self.cumulative = {
+            name: np.concatenate([[0], np.cumsum(np.asarray(column, dtype=np.int64)[order])])
+            for name, column in values.items()
+        }
+
+    def __len__(self):
+        return len(self.days)
+
+    def date_range(self):
+        if not len(self.days):
+            return None, None
+        return str(self.days[0]), str(self.days[-1])
+
+    def _totals(self, name, edges):
+        return self.cumulative[name][np.searchsorted(self.days, edges, side='left')]
+
+    def range_sum(self, name, start, end):
+        lo, hi = self._totals(name, np.array([to_day(start), to_day(end) + 1]))
+        return int(hi - lo)
+
+    def rollup(self, start, end, resolution, names=None):
+        """``(bucket starts, {name: per-bucket sums})`` over ``[start, end]``.
+
+        Partial first and last buckets only count the days inside the range.
+        """
+        start, end = to_day(start), to_day(end)
+        edges = bucket_edges(start, end, resolution)
+        clipped = np.minimum(np.maximum(edges, start), end + 1)
+        sums = {name: np.diff(self._totals(name, clipped)) for name in names or self.cumulative}
+        return edges[:-1], sums
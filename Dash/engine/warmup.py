@@ -0,0 +1,78 @@
+"""Opt-in pre-rendering of every page figure at startup.
+
+Each page registers the finite domain of its figure inputs with
+``register_warmup``. ``warm_up`` renders them all in a forked process pool and
+stores the JSON in ``engine.figcache.figure_cache`` under the same keys the
+page callbacks use, so the first click after a deploy is a cache hit.
+
+Enable it with ``DASH_WARMUP=1`` (``DASH_WARMUP_WORKERS`` sets the pool size).
+Run gunicorn with ``--preload`` to warm up once in the master and share the
+cache with every forked worker.
+"""
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from engine.figcache import figure_cache
+
+_targets = []
+
+
+def register_warmup(page, inputs, build, version):
+    """Register ``build(*args)`` for every ``args`` tuple in ``inputs``.
+
+    ``inputs`` may be a callable so that pages with lazily loaded data only
+    enumerate their domain when warm-up runs. ``version`` is a callable
+    returning the data version the page callback passes to the figure cache.
+    """
+    _targets.append((page, inputs, build, version))
+
+
+def _render(index, args):
+    _, _, build, _ = _targets[index]
+    return build(*args).to_json()
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _executor(workers):
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Forked children inherit the loaded page data and the registry.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def warm_up(workers=None):
+    start = time.perf_counter()
+    rss_before = _rss_bytes()
+
+    domains = [inputs() if callable(inputs) else inputs for _, inputs, _, _ in _targets]
+    jobs = [(index, tuple(args)) for index, domain in enumerate(domains) for args in domain]
+    versions = [version() for _, _, _, version in _targets]
+    if len(jobs) > figure_cache.maxsize:
+        print(f'Warm-up: {len(jobs)} figures exceed FIGURE_CACHE_SIZE={figure_cache.maxsize}; '
+              'the oldest will be evicted')
+
+    if jobs:
+        with _executor(workers or os.cpu_count()) as pool:
+            payloads = pool.map(_render, *zip(*jobs), chunksize=max(1, len(jobs) // 64))
+            for (index, args), payload in zip(jobs, payloads):
+                figure_cache.put(_targets[index][0], args, versions[index], payload)
+
+    report = {
+        'figures': len(jobs),
+        'seconds': time.perf_counter() - start,
+        'cache_bytes': figure_cache.stats()['bytes'],
+        'rss_delta_bytes': _rss_bytes() - rss_before,
+    }
+    print(f"Warm-up rendered {report['figures']} figures in {report['seconds']:.2f}s "
+          f"({report['cache_bytes'] / 1e6:.1f} MB cached, RSS +{report['rss_delta_bytes'] / 1e6:.1f} MB)")
+    return report
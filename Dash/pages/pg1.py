@@ -1,57 +1,50 @@
 # pg1.py
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, ClientsideFunction
 import dash_bootstrap_components as dbc
-import pandas as pd
 from functools import lru_cache
 import plotly.graph_objects as go
+from engine.age_gender import AgeGenderCube
+from engine.clientside import CLIENTSIDE, figure_json, trace_arrays
+from engine.destinations import COUNTRY_NAMES
+from engine.figcache import figure_cache
+from engine.lazy import LazyData
+from engine.store import load_table
+from engine.warmup import register_warmup
+from pipeline.artifacts import file_stamp
 
 dash.register_page(__name__, path='/', title='Airbnb statistics', name='Countries')
 
 
+AGE_GENDER_CSV = 'assets/age_gender_bkts.csv'
+
+
 @lru_cache(maxsize=1)
 def load_age_gender_data():
-    return pd.read_csv('assets/age_gender_bkts.csv')
-
-age_gender = load_age_gender_data()
-
-country_name_map = {
-    'US': 'United States',
-    'FR': 'France',
-    'IT': 'Italy',
-    'DE': 'Germany',
-    'GB': 'United Kingdom',
-    'ES': 'Spain',
-    'CA': 'Canada',
-    'AU': 'Australia',
-    'NL': 'Netherlands',
-    'PL': 'Portugal',
-}
-
-x_axis_labels = age_gender.age_bucket.unique()[::-1]
-countries = age_gender.country_destination.unique()
-country_options = [
-    {"label": country_name_map.get(c, c), "value": c} for c in countries
-]
+    return load_table(AGE_GENDER_CSV)
 
+# Loaded on first use or by the app's background loader, not at import
+page_data = LazyData('pg1', lambda: AgeGenderCube(load_age_gender_data()))
+data_version = file_stamp(AGE_GENDER_CSV)
 
-def make_figure(selected_country):
-    data_male = age_gender[(age_gender["country_destination"] == selected_country) & (age_gender["gender"] == 'male')]
-    data_female = age_gender[(age_gender["country_destination"] == selected_country) & (age_gender["gender"] == 'female')]
+def make_country_options(countries):
+    return [
+        {"label": COUNTRY_NAMES.get(c, c), "value": c} for c in countries
+    ]
 
-    base = pd.DataFrame(x_axis_labels, columns=['0'])
-    base = base.merge(data_male, how='left', left_on='0', right_on='age_bucket')
-    base = base.merge(data_female, how='left', left_on='0', right_on='age_bucket')
 
-    male_vals = base["population_in_thousands_x"].fillna(0)
-    female_vals = base["population_in_thousands_y"].fillna(0)
+def make_figure(selected_country):
+    cube = page_data.get()
+    x_axis_labels = cube.age_buckets
+    male_vals, female_vals = cube.country(selected_country)
 
     trace_male = go.Bar(
         x=x_axis_labels,
         y=male_vals,
         name="Male",
         marker_color='steelblue',
-        text=[f'<b>{v}</b>' for v in male_vals],  
+        # Populations have one decimal, so this prints them as str() did
+        texttemplate='<b>%{y:.1f}</b>',
         textposition='auto'
     )
 
@@ -60,7 +53,7 @@ def make_figure(selected_country):
         y=female_vals,
         name="Female",
         marker_color='lightcoral',
-        text=[f'<b>{v}</b>' for v in female_vals],  # Bold text on bars
+        texttemplate='<b>%{y:.1f}</b>',  # Bold text on bars
         textposition='auto'
     )
 
@@ -71,9 +64,6 @@ def make_figure(selected_country):
         barmode="group",
         legend=dict(x=0.7, y=1.1, orientation='h'),
         margin=dict(l=40, r=40, t=80, b=40),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        autosize=True,
 
         xaxis=dict(
             title=dict(text='Age Bucket', font=dict(size=14, color='black', family='Arial Black')),
@@ -88,47 +78,157 @@ def make_figure(selected_country):
     return fig
 
 
+def make_compare_figure(selected_countries, normalize=True):
+    cube = page_data.get()
+    x_axis_labels = cube.age_buckets
+    profiles = cube.age_profiles(selected_countries, normalize)
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            html.H3("Age & Gender Distribution by Country", style={"color": "#FF5A5F", "font-weight": "bold"})
-        ], width=8),
-
-        dbc.Col([
-            dcc.Dropdown(
-                id='country-dropdown',
-                options=country_options,
-                value=countries[0],
-                clearable=False,
-                style={
-                    "fontWeight": "bold",
-                    "color": "#FF5A5F",
-                    "border": "2px solid #FF5A5F",
-                },
-                placeholder="Select Country",
-                className='custom-dropdown'
-            )
-        ], width=4)
-    ]),
-
-    html.Hr(),
-
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='age-gender-graph', figure=make_figure(countries[0]), config={'responsive': True})
-        ])
+    fig = go.Figure([
+        go.Scatter(
+            x=x_axis_labels,
+            y=profile,
+            mode='lines+markers',
+            name=COUNTRY_NAMES.get(c, c)
+        )
+        for c, profile in zip(selected_countries, profiles)
     ])
-], fluid=True)
 
+    fig.update_layout(
+        legend=dict(orientation='h', y=1.1),
+        margin=dict(l=40, r=40, t=80, b=40),
+        hovermode='x unified',
+
+        xaxis=dict(
+            title=dict(text='Age Bucket', font=dict(size=14, color='black', family='Arial Black')),
+            tickfont=dict(family='Arial Black', size=12, color='black')
+        ),
+        yaxis=dict(
+            title=dict(text='Share of Population (%)' if normalize else 'Population (x 1000)',
+                       font=dict(size=14, color='black', family='Arial Black')),
+            tickfont=dict(family='Arial Black', size=12, color='black')
+        )
+    )
 
-@dash.callback(
-    Output('age-gender-graph', 'figure'),
-    Input('country-dropdown', 'value')
-)
-def update_figure(selected_country):
-    fig = make_figure(selected_country)
     return fig
 
 
+def cached_figure(selected_country):
+    return figure_cache.get('pg1', (selected_country,), data_version, lambda: make_figure(selected_country))
+
+
+@lru_cache(maxsize=1)
+def clientside_data():
+    countries = page_data.get().countries
+    return {
+        'template': figure_json(make_figure(countries[0])),
+        'countries': {c: trace_arrays(make_figure(c), keys=('y',)) for c in countries},
+    }
+
+
+def layout(**kwargs):
+    countries = page_data.get().countries
+    country_options = make_country_options(countries)
+
+    container = dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                html.H3("Age & Gender Distribution by Country", style={"color": "#FF5A5F", "font-weight": "bold"})
+            ], width=8),
+
+            dbc.Col([
+                dcc.Dropdown(
+                    id='country-dropdown',
+                    options=country_options,
+                    value=countries[0],
+                    clearable=False,
+                    style={
+                        "fontWeight": "bold",
+                        "color": "#FF5A5F",
+                        "border": "2px solid #FF5A5F",
+                    },
+                    placeholder="Select Country",
+                    className='custom-dropdown'
+                )
+            ], width=4)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='age-gender-graph', figure=cached_figure(countries[0]), config={'responsive': True})
+            ])
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.H3("Compare Age Profiles", style={"color": "#FF5A5F", "font-weight": "bold"})
+            ], width=4),
+
+            dbc.Col([
+                dcc.Dropdown(
+                    id='compare-countries-dropdown',
+                    options=country_options,
+                    value=countries[:3],
+                    multi=True,
+                    placeholder="Select Countries",
+                    className='custom-dropdown'
+                )
+            ], width=6),
+
+            dbc.Col([
+                dcc.Checklist(
+                    id='compare-normalize',
+                    options=[{'label': ' Share of population (%)', 'value': 'normalize'}],
+                    value=['normalize'],
+                    style={"font-weight": "bold", "margin-top": "6px"}
+                )
+            ], width=2)
+        ]),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='age-compare-graph', config={'responsive': True})
+            ])
+        ])
+    ], fluid=True)
+
+    if CLIENTSIDE:
+        container.children.append(dcc.Store(id='age-gender-store', data=clientside_data()))
+
+    return container
+
+
+@dash.callback(
+    Output('age-compare-graph', 'figure'),
+    Input('compare-countries-dropdown', 'value'),
+    Input('compare-normalize', 'value')
+)
+def update_compare_figure(selected_countries, normalize):
+    country_index = page_data.get().country_index
+    selected_countries = tuple(c for c in (selected_countries or []) if c in country_index)
+    normalize = 'normalize' in (normalize or [])
+    return figure_cache.get('pg1-compare', (selected_countries, normalize), data_version,
+                            lambda: make_compare_figure(selected_countries, normalize))
+
+
+if CLIENTSIDE:
+    dash.clientside_callback(
+        ClientsideFunction(namespace='airbnb', function_name='ageGenderFigure'),
+        Output('age-gender-graph', 'figure'),
+        Input('country-dropdown', 'value'),
+        State('age-gender-store', 'data')
+    )
+
+else:
+    @dash.callback(
+        Output('age-gender-graph', 'figure'),
+        Input('country-dropdown', 'value')
+    )
+    def update_figure(selected_country):
+        return cached_figure(selected_country)
 
+    register_warmup('pg1', lambda: [(c,) for c in page_data.get().countries], make_figure,
+                    lambda: data_version)
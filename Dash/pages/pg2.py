@@ -3,67 +3,150 @@ from dash import dcc, html
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.graph_objects as go
-from dash.dependencies import Output, Input
+from dash.dependencies import Output, Input, State
+from dash.exceptions import PreventUpdate
 import numpy as np 
-from scipy.stats import gaussian_kde
-from functools import lru_cache
+import os
+import threading
+from collections import OrderedDict
+from engine.background import background_callback, register_cache_by
+from engine.figcache import figure_cache
+from engine.lazy import LazyData
+from engine.query import UsersQuery
+from engine.store import load_table
+from engine.warmup import register_warmup
+from pipeline.artifacts import FileCache, file_stamp
+from pipeline.users_summary import STATE_COLUMNS, SUMMARY_PATH, USERS_CSV, load_users_summary, month_order, summarize
 
 
 dash.register_page(__name__, path='/account-booking-distribution', title='Account & Booking Distribution', name='Account & Booking Distribution')
 
-@lru_cache(maxsize=1)
-def load_age_gender_data():
-    return pd.read_csv('assets/train_users_2.csv') 
-
-users = load_age_gender_data()
-
-users['date_account_created'] = pd.to_datetime(users['date_account_created'], errors='coerce')
-users['date_first_booking'] = pd.to_datetime(users['date_first_booking'], errors='coerce')
-
-months_account_created = users['date_account_created'].dropna().dt.month_name().str[:3]
-months_first_booking = users['date_first_booking'].dropna().dt.month_name().str[:3]
-
-month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+# (title, x-axis title) for every count plot
+count_plots = {
+    'account': ('Account Creation Month Distribution', 'Month'),
+    'booking': ('Booking Date Month Distribution', 'Month'),
+    'signup': ('Signup Method Distribution', 'Signup Method'),
+    'device': ('First Device Type Distribution', 'First Device Type'),
+    'gender': ('Gender Distribution', 'Gender'),
+    'country': ('Destination Country Distribution', 'Destination Country'),
+    'app': ('Signup App Distribution', 'Signup App'),
+    'affiliate': ('Affiliate Provider Distribution', 'Affiliate Provider'),
+}
+
+# (summary segment, title) for every per-segment age density plot
+density_plots = {
+    'age_by_gender': ('gender', 'Age Density by Gender'),
+    'age_by_country': ('country', 'Age Density by Destination Country'),
+}
+
+
+# (dimension, label) for every filter control; drill-down needs the raw users
+# table, so the filters are hidden when only the summary artifact is deployed
+filter_dimensions = {
+    'country': 'Destination',
+    'device': 'Device',
+    'gender': 'Gender',
+}
+
+
+def build_aggregates(summary):
+    total_users = summary['rows']
+    counts = {
+        name: pd.Series(c['values'], index=c['index'])
+        for name, c in summary['counts'].items()
+    }
+    percents = {name: c / total_users * 100 for name, c in counts.items()}
+
+    # Value counts reindexed in correct order; months are shares of dated rows
+    for name in ('account', 'booking'):
+        counts[name] = counts[name].reindex(month_order, fill_value=0)
+        percents[name] = counts[name] / counts[name].sum() * 100
+
+    return {
+        'counts': counts,
+        'percents': percents,
+        'age_edges': np.asarray(summary['age_hist']['edges']),
+        'age_density': np.asarray(summary['age_hist']['density']),
+        'x_range_age': np.asarray(summary['age_kde']['x']),
+        'kde_values_age': np.asarray(summary['age_kde']['y']),
+        'age_kde_by': summary['age_kde_by'],
+        # Options and bounds of the filter controls, so drawing them never
+        # needs the raw users table
+        'categories': {name: sorted(summary['counts'][name]['index']) for name in filter_dimensions},
+        'account_days': summary['daily']['account']['days'],
+    }
+
+
+# Reloaded whenever pipeline.state republishes the summary; the first load
+# happens on first use or in the app's background loader, not at import
+aggregates_cache = FileCache(SUMMARY_PATH, lambda: build_aggregates(load_users_summary()))
+page_data = LazyData('pg2', aggregates_cache.get)
+
+
+def load_aggregates():
+    """``(aggregates, version)`` of the same summary load."""
+    page_data.get()
+    return aggregates_cache.get()
+
+
+def load_users_query():
+    if not os.path.exists(USERS_CSV):
+        return None
+    return UsersQuery(load_table(USERS_CSV, columns=STATE_COLUMNS))
+
+
+# Parsed on the first filtered request only and reloaded when the CSV changes
+users_cache = FileCache(USERS_CSV, load_users_query)
+
+
+def filters_key(country, device, gender, start_date, end_date):
+    key = tuple(
+        (name, tuple(sorted(values)))
+        for name, values in (('country', country), ('device', device), ('gender', gender))
+        if values
+    )
+    if start_date or end_date:
+        key += (('account_created', (start_date, end_date)),)
+    return key
 
-# Value counts reindexed in correct order
-counts_account = months_account_created.value_counts().reindex(month_order, fill_value=0)
-counts_booking = months_first_booking.value_counts().reindex(month_order, fill_value=0)
 
-percent_account = counts_account / counts_account.sum() * 100
-percent_booking = counts_booking / counts_booking.sum() * 100
+def filtered_bitmap(query, key):
+    """Bitmap of the rows of ``query`` matching ``key`` (see filters_key)."""
+    filters = dict(key)
+    account_start, account_end = filters.pop('account_created', (None, None))
+    return query.select(filters, account_start, account_end)
 
-users['signup_method'] = users['signup_method'].fillna('NaN')
-counts_signup = users['signup_method'].value_counts()
-percent_signup = counts_signup / users.shape[0] * 100
 
-counts_device = users['first_device_type'].fillna('NaN').value_counts(dropna=False)
-percent_device = counts_device / users.shape[0] * 100
+# (users version, filters key) -> aggregates, filled from the background
+# jobs' summaries so repeated filters and plot switches stay in this worker
+FILTERED_CACHE_SIZE = 64
+_filtered = OrderedDict()
+_filtered_lock = threading.Lock()
 
-users['gender'] = users['gender'].fillna('NaN')
-counts_gender = users['gender'].value_counts()
-percent_gender = counts_gender / users.shape[0] * 100
 
-filtered_users = users[(users['age'] < 120) & (users['age'].notnull())]
-hist_data_age = filtered_users['age']
-kde = gaussian_kde(hist_data_age, bw_method=0.3)
-x_range_age = np.linspace(hist_data_age.min(), hist_data_age.max(), 1000)
-kde_values_age = kde(x_range_age)
+def cached_filtered_aggregates(version, key):
+    with _filtered_lock:
+        aggregates = _filtered.get((version, key))
+        if aggregates is not None:
+            _filtered.move_to_end((version, key))
+        return aggregates
 
-counts_country = users['country_destination'].fillna('NaN').value_counts(dropna=False)
-percent_country = counts_country / users.shape[0] * 100
 
-counts_app = users['signup_app'].fillna('NaN').value_counts(dropna=False)
-percent_app = counts_app / users.shape[0] * 100
+def store_filtered_aggregates(version, key, summary):
+    aggregates = build_aggregates(summary)
+    with _filtered_lock:
+        _filtered[(version, key)] = aggregates
+        while len(_filtered) > FILTERED_CACHE_SIZE:
+            _filtered.popitem(last=False)
+    return aggregates
 
-counts_affiliate = users['affiliate_provider'].fillna('NaN').value_counts(dropna=False).head(10)
-percent_affiliate = counts_affiliate / users.shape[0] * 100
 
 def make_figure(x_labels, counts, percents, title, xaxis_title=''):
     fig = go.Figure(go.Bar(
         x=x_labels,
         y=counts,
-        text=[f"{count:,} ({perc:.1f}%)" for count, perc in zip(counts, percents)],
+        customdata=np.round(percents, 1),
+        texttemplate='%{y:,} (%{customdata:.1f}%)',
         textposition='outside',
         marker_color='steelblue',
         textfont=dict(size=14)
@@ -74,9 +157,6 @@ def make_figure(x_labels, counts, percents, title, xaxis_title=''):
         xaxis_title=xaxis_title,
         yaxis_title='Count',
         margin=dict(l=20, r=20, t=60, b=60),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        autosize=True,
         showlegend=False,
         font=dict(size=14),
         xaxis=dict(tickfont=dict(size=16)),
@@ -85,21 +165,29 @@ def make_figure(x_labels, counts, percents, title, xaxis_title=''):
     return fig
 
 
-def make_age_figure():
+def make_count_figure(name, aggregates):
+    title, xaxis_title = count_plots[name]
+    counts = aggregates['counts'][name]
+    return make_figure(counts.index.tolist(), counts.values, aggregates['percents'][name].values,
+                       title, xaxis_title)
+
+
+def make_age_figure(aggregates):
+    # Pre-binned on the server; equal-width bins, so bargap spaces them
+    age_edges = aggregates['age_edges']
     fig = go.Figure()
 
-    fig.add_trace(go.Histogram(
-        x=hist_data_age,
-        nbinsx=60,
+    fig.add_trace(go.Bar(
+        x=(age_edges[:-1] + age_edges[1:]) / 2,
+        y=aggregates['age_density'],
         name='Age Distribution',
         opacity=0.6,
-        marker=dict(color='skyblue'),
-        histnorm='probability density'
+        marker=dict(color='skyblue')
     ))
 
     fig.add_trace(go.Scatter(
-        x=x_range_age,
-        y=kde_values_age,
+        x=aggregates['x_range_age'],
+        y=aggregates['kde_values_age'],
         mode='lines',
         name='KDE',
         line=dict(color='red', width=2)
@@ -112,8 +200,6 @@ def make_age_figure():
         bargap=0.1,
         title_x=0.5,
         xaxis=dict(tickmode='linear', tick0=0, dtick=10),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
         showlegend=True,
         font=dict(size=14),
         margin=dict(l=20, r=20, t=60, b=60)
@@ -121,108 +207,233 @@ def make_age_figure():
 
     return fig
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(html.H3("", style={"color": "#FF5A5F", "font-weight": "bold", "text-align": "center"}), width=12)
-    ]),
-
-    html.Hr(),
-
-    dbc.Row([
-        dbc.Col([
-            dbc.Row([
-                dbc.Col(html.Label("Select Plot:", style={"font-weight": "bold", "margin-top": "8px"}), width="auto"),
-                dbc.Col(dcc.Dropdown(
-                    id='plot-selector',
-                    options=[
-                        {'label': 'Account Creation Month', 'value': 'account'},
-                        {'label': 'Booking Date Month', 'value': 'booking'},
-                        {'label': 'Signup Method', 'value': 'signup'},
-                        {'label': 'First Device Type', 'value': 'device'},
-                        {'label': 'Gender Distribution', 'value': 'gender'},
-                        {'label': 'Age Distribution (≤120)', 'value': 'age'},
-                        {'label': 'Destination Country', 'value': 'country'},
-                        {'label': 'Signup App', 'value': 'app'},
-                        {'label': 'Affiliate Providers', 'value': 'affiliate'}
-                    ],
-                    value='account',
-                    clearable=False,
-                    style={'minWidth': '260px'}
-                ), width="auto"),
-                dbc.Col(html.Label("Compare:", style={"font-weight": "bold", "margin-left": "15px", "margin-top": "8px"}), width="auto"),
-                dbc.Col(dcc.Dropdown(
-                    id='compare-selector',
-                    options=[
-                        {'label': 'None', 'value': 'none'},
-                        {'label': 'Account vs Booking', 'value': 'account_booking'},
-                        {'label': 'Age vs Gender', 'value': 'age_gender'}
-                    ],
-                    value='none',
-                    clearable=False,
-                    style={'minWidth': '220px'}
-                ), width="auto")
-            ], align="center", justify="end", style={"margin-bottom": "10px"})
-        ], width=12)
-    ]),
-
-    dbc.Row(id='graph-row', children=[
-        dbc.Col(dcc.Graph(id='distribution-graph', config={'responsive': True}, style={'width': '100%', 'height': '80vh'}), width=12)
+
+def make_density_figure(name, aggregates):
+    segment, title = density_plots[name]
+    curves = aggregates['age_kde_by'][segment]
+
+    fig = go.Figure([
+        go.Scatter(x=curve['x'], y=curve['y'], mode='lines', name=label, line=dict(width=2))
+        for label, curve in curves.items()
     ])
-], fluid=True)
+
+    fig.update_layout(
+        title=title,
+        xaxis_title='Age',
+        yaxis_title='Density',
+        title_x=0.5,
+        xaxis=dict(tickmode='linear', tick0=0, dtick=10),
+        showlegend=True,
+        font=dict(size=14),
+        margin=dict(l=20, r=20, t=60, b=60)
+    )
+
+    return fig
+
+
+def make_plot_figure(name, aggregates=None):
+    if aggregates is None:
+        aggregates = load_aggregates()[0]
+    if name == 'age':
+        return make_age_figure(aggregates)
+    if name in density_plots:
+        return make_density_figure(name, aggregates)
+    return make_count_figure(name, aggregates)
+
+
+def cached_plot_figure(name, aggregates, version, key=()):
+    # Filtered figures have their own data version, so keep them apart
+    page = 'pg2-filtered' if key else 'pg2'
+    return figure_cache.get(page, (name,) + key, version, lambda: make_plot_figure(name, aggregates))
+
+
+def make_filter_row():
+    if not os.path.exists(USERS_CSV):
+        return dbc.Row(id='filter-row', style={'display': 'none'}, children=[
+            dcc.Dropdown(id=f'filter-{name}', multi=True) for name in filter_dimensions
+        ] + [dcc.DatePickerRange(id='filter-account-created')])
+
+    aggregates = load_aggregates()[0]
+    days = aggregates['account_days']
+    controls = []
+    for name, label in filter_dimensions.items():
+        controls += [
+            dbc.Col(html.Label(f"{label}:", style={"font-weight": "bold", "margin-top": "8px"}), width="auto"),
+            dbc.Col(dcc.Dropdown(
+                id=f'filter-{name}',
+                options=[{'label': c, 'value': c} for c in aggregates['categories'][name]],
+                multi=True,
+                placeholder='All',
+                style={'minWidth': '180px'}
+            ), width="auto"),
+        ]
+    controls += [
+        dbc.Col(html.Label("Account created:", style={"font-weight": "bold", "margin-top": "8px"}), width="auto"),
+        dbc.Col(dcc.DatePickerRange(
+            id='filter-account-created',
+            min_date_allowed=days[0] if days else None,
+            max_date_allowed=days[-1] if days else None,
+            clearable=True
+        ), width="auto"),
+        dbc.Col(html.Small("Filtered views count train_users_2.csv only; users folded in from later delta files are left out.",
+                           style={"color": "gray"}), width=12, style={"text-align": "right"}),
+    ]
+    return dbc.Row(id='filter-row', children=controls, align="center", justify="end",
+                   style={"margin-bottom": "10px"})
+
+
+def layout(**kwargs):
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H3("", style={"color": "#FF5A5F", "font-weight": "bold", "text-align": "center"}), width=12)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                dbc.Row([
+                    dbc.Col(html.Label("Select Plot:", style={"font-weight": "bold", "margin-top": "8px"}), width="auto"),
+                    dbc.Col(dcc.Dropdown(
+                        id='plot-selector',
+                        options=[
+                            {'label': 'Account Creation Month', 'value': 'account'},
+                            {'label': 'Booking Date Month', 'value': 'booking'},
+                            {'label': 'Signup Method', 'value': 'signup'},
+                            {'label': 'First Device Type', 'value': 'device'},
+                            {'label': 'Gender Distribution', 'value': 'gender'},
+                            {'label': 'Age Distribution (≤120)', 'value': 'age'},
+                            {'label': 'Age Density by Gender', 'value': 'age_by_gender'},
+                            {'label': 'Age Density by Destination', 'value': 'age_by_country'},
+                            {'label': 'Destination Country', 'value': 'country'},
+                            {'label': 'Signup App', 'value': 'app'},
+                            {'label': 'Affiliate Providers', 'value': 'affiliate'}
+                        ],
+                        value='account',
+                        clearable=False,
+                        style={'minWidth': '260px'}
+                    ), width="auto"),
+                    dbc.Col(html.Label("Compare:", style={"font-weight": "bold", "margin-left": "15px", "margin-top": "8px"}), width="auto"),
+                    dbc.Col(dcc.Dropdown(
+                        id='compare-selector',
+                        options=[
+                            {'label': 'None', 'value': 'none'},
+                            {'label': 'Account vs Booking', 'value': 'account_booking'},
+                            {'label': 'Age vs Gender', 'value': 'age_gender'}
+                        ],
+                        value='none',
+                        clearable=False,
+                        style={'minWidth': '220px'}
+                    ), width="auto")
+                ], align="center", justify="end", style={"margin-bottom": "10px"}),
+                make_filter_row()
+            ], width=12)
+        ]),
+
+        dbc.Progress(id='graph-progress', value=0, striped=True, animated=True, style={'display': 'none'}),
+        # Filters whose aggregates are being computed, and the summary the job returns
+        dcc.Store(id='filter-request'),
+        dcc.Store(id='filter-summary'),
+
+        dbc.Row(id='graph-row', children=[
+            dbc.Col(dcc.Graph(id='distribution-graph', config={'responsive': True}, style={'width': '100%', 'height': '80vh'}), width=12)
+        ])
+    ], fluid=True)
+
+
+# Figures shown side by side for every compare view
+compare_plots = {
+    'account_booking': ('account', 'booking'),
+    'age_gender': ('age', 'gender'),
+}
+PROGRESS_STYLE = {'height': '20px', 'margin-bottom': '10px'}
+
+# Results are kept per data version, so a republished summary or users table
+# is never answered from an old result
+register_cache_by(lambda: (file_stamp(SUMMARY_PATH), file_stamp(USERS_CSV)))
+
+FILTER_INPUTS = [Input('filter-country', 'value'),
+                 Input('filter-device', 'value'),
+                 Input('filter-gender', 'value'),
+                 Input('filter-account-created', 'start_date'),
+                 Input('filter-account-created', 'end_date')]
+
+
+def graph_columns(names, aggregates, version, key):
+    columns = []
+    for name in names:
+        fig = cached_plot_figure(name, aggregates, version, key)
+        columns.append(dbc.Col(dcc.Graph(figure=fig, config={'responsive': True}, style={'height': '80vh'}),
+                               width=12 // len(names)))
+    return columns
+
 
 @dash.callback(
     Output('graph-row', 'children'),
+    Output('filter-request', 'data'),
     [Input('plot-selector', 'value'),
-     Input('compare-selector', 'value')]
+     Input('compare-selector', 'value'),
+     *FILTER_INPUTS]
 )
-def update_graph(selected, compare):
-    if compare == 'account_booking':
-        fig1 = make_figure(counts_account.index.tolist(), counts_account.values, percent_account.values,
-                           'Account Creation Month Distribution', 'Month')
-        fig2 = make_figure(counts_booking.index.tolist(), counts_booking.values, percent_booking.values,
-                           'Booking Date Month Distribution', 'Month')
-
-        return [
-            dbc.Col(dcc.Graph(figure=fig1, config={'responsive': True}, style={'height': '80vh'}), width=6),
-            dbc.Col(dcc.Graph(figure=fig2, config={'responsive': True}, style={'height': '80vh'}), width=6)
-        ]
+def update_graph(selected, compare, country=None, device=None, gender=None, start_date=None, end_date=None):
+    # Everything already aggregated is drawn here, from this worker's caches;
+    # only filters it has not aggregated yet go to the background job.
+    names = compare_plots.get(compare, (selected,))
+    key = filters_key(country, device, gender, start_date, end_date)
+    if key and os.path.exists(USERS_CSV):
+        version = file_stamp(USERS_CSV)
+        aggregates = cached_filtered_aggregates(version, key)
+        if aggregates is None:
+            filters = dict(country=country, device=device, gender=gender, start_date=start_date,
+                           end_date=end_date)
+            return dash.no_update, filters
+        return graph_columns(names, aggregates, version, key), dash.no_update
+
+    aggregates, version = load_aggregates()
+    return graph_columns(names, aggregates, version, ()), dash.no_update
+
+
+@background_callback(
+    Output('filter-summary', 'data'),
+    Input('filter-request', 'data'),
+    progress=[Output('graph-progress', 'value'), Output('graph-progress', 'label')],
+    progress_default=[0, ''],
+    running=[(Output('graph-progress', 'style'), PROGRESS_STYLE, {'display': 'none'})],
+    prevent_initial_call=True
+)
+def aggregate_filters(set_progress, filters):
+    # The job only reads users_cache, which request threads never load, so
+    # a fork cannot inherit a lock held by a page-data loading thread
+    if not filters:
+        raise PreventUpdate
+    set_progress((10, 'Loading users'))
+    query, version = users_cache.get()
+    if query is None:
+        raise PreventUpdate
+    set_progress((60, 'Selecting users'))
+    bitmap = filtered_bitmap(query, filters_key(**filters))
+    set_progress((80, f'Aggregating {query.index.count(bitmap):,} users'))
+    return {'filters': filters, 'version': version, 'summary': summarize(query.state(bitmap))}
 
-    elif compare == 'age_gender':
-        fig1 = make_age_figure()
-        fig2 = make_figure(counts_gender.index.tolist(), counts_gender.values, percent_gender.values,
-                           'Gender Distribution', 'Gender')
 
-        return [
-            dbc.Col(dcc.Graph(figure=fig1, config={'responsive': True}, style={'height': '80vh'}), width=6),
-            dbc.Col(dcc.Graph(figure=fig2, config={'responsive': True}, style={'height': '80vh'}), width=6)
-        ]
-
-    else:
-        if selected == 'account':
-            fig = make_figure(counts_account.index.tolist(), counts_account.values, percent_account.values,
-                              'Account Creation Month Distribution', 'Month')
-        elif selected == 'booking':
-            fig = make_figure(counts_booking.index.tolist(), counts_booking.values, percent_booking.values,
-                              'Booking Date Month Distribution', 'Month')
-        elif selected == 'signup':
-            fig = make_figure(counts_signup.index.tolist(), counts_signup.values, percent_signup.values,
-                              'Signup Method Distribution', 'Signup Method')
-        elif selected == 'device':
-            fig = make_figure(counts_device.index.tolist(), counts_device.values, percent_device.values,
-                              'First Device Type Distribution', 'First Device Type')
-        elif selected == 'gender':
-            fig = make_figure(counts_gender.index.tolist(), counts_gender.values, percent_gender.values,
-                              'Gender Distribution', 'Gender')
-        elif selected == 'age':
-            fig = make_age_figure()
-        elif selected == 'country':
-            fig = make_figure(counts_country.index.tolist(), counts_country.values, percent_country.values,
-                              'Destination Country Distribution', 'Destination Country')
-        elif selected == 'app':
-            fig = make_figure(counts_app.index.tolist(), counts_app.values, percent_app.values,
-                              'Signup App Distribution', 'Signup App')
-        elif selected == 'affiliate':
-            fig = make_figure(counts_affiliate.index.tolist(), counts_affiliate.values, percent_affiliate.values,
-                              'Affiliate Provider Distribution', 'Affiliate Provider')
-
-        return [dbc.Col(dcc.Graph(figure=fig, config={'responsive': True}, style={'height': '80vh'}), width=12)]
+@dash.callback(
+    Output('graph-row', 'children', allow_duplicate=True),
+    Input('filter-summary', 'data'),
+    [State('plot-selector', 'value'),
+     State('compare-selector', 'value'),
+     *[State(dependency.component_id, dependency.component_property) for dependency in FILTER_INPUTS]],
+    prevent_initial_call=True
+)
+def show_filtered(result, selected, compare, country=None, device=None, gender=None, start_date=None,
+                  end_date=None):
+    key = filters_key(country, device, gender, start_date, end_date)
+    # A result for filters changed meanwhile is dropped; their own job is on the way
+    if not result or filters_key(**result['filters']) != key:
+        raise PreventUpdate
+    version = tuple(result['version'])
+    aggregates = store_filtered_aggregates(version, key, result['summary'])
+    return graph_columns(compare_plots.get(compare, (selected,)), aggregates, version, key)
+
+
+register_warmup('pg2', [(name,) for name in [*count_plots, 'age', *density_plots]], make_plot_figure,
+                lambda: load_aggregates()[1])
@@ -1,59 +1,83 @@
 import dash
 from dash import dcc, html
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
-from dash.dependencies import Output, Input, State
+from functools import lru_cache
+from dash.dependencies import Output, Input, ClientsideFunction
+from engine.clientside import CLIENTSIDE, figure_json
+from engine.figcache import figure_cache
+from engine.lazy import LazyData
+from engine.warmup import register_warmup
+from pipeline.action_sketch import ALL, SKETCH_PATH, load_sketches, partials_frame, slice_label
+from pipeline.artifacts import FileCache, file_stamp
+from pipeline.sessions import ACTION_COUNTS_CSV, ACTION_TIME_CSV, action_counts_table, action_time_table
 
 dash.register_page(__name__, path='/top-actions', title='Top Actions', name='Top Actions')
 
-action_counts_df = pd.read_csv('assets/action_counts_top_15.csv')
-action_time_df = pd.read_csv('assets/action_time_top_20.csv')
+# Reloaded whenever pipeline.state, pipeline.sessions or pipeline.action_sketch
+# republishes; without a sketch the Top Actions CSVs are served, so they are
+# part of the version too
+sketch_cache = FileCache(SKETCH_PATH, load_sketches, stamp=lambda: tuple(
+    file_stamp(path) for path in (SKETCH_PATH, ACTION_COUNTS_CSV, ACTION_TIME_CSV)))
+page_data = LazyData('pg3', sketch_cache.get)
 
-def make_figure_first(top_n):
-    df = action_counts_df.head(top_n).copy()
+# Warm-up and the initial value cover the usual range; any larger N is served on demand
+WARMUP_TOP_N = 50
+
+
+def load_sketch():
+    """``(sketches, version)`` of the same load."""
+    page_data.get()
+    return sketch_cache.get()
+
+
+@lru_cache(maxsize=8)
+def sketch_partials(sketch):
+    # Keyed on the sketch object, so a reloaded sketch never meets stale partials
+    return partials_frame(sketch)
+
+
+def current_partials(slice_key, sketches=None):
+    if sketches is None:
+        sketches = load_sketch()[0]
+    return sketch_partials(sketches.get(slice_key, sketches[ALL]))
+
+
+def make_figure_first(top_n, slice_key=ALL, sketches=None):
+    partials = current_partials(slice_key, sketches)
+    df = action_counts_table(partials).head(top_n).copy()
+    error = partials['error'].reindex(df['action']).to_numpy()
     fig = px.bar(df, x='action', y='count')
     fig.update_traces(
-        text=df['formatted_count'],
+        texttemplate='%{y:,}',
         textposition='outside',
         marker_color='steelblue'
     )
+    if error.any():
+        # Space-Saving counts only overestimate: the true count lies in [count - error, count]
+        fig.update_traces(error_y=dict(type='data', symmetric=False, array=[0] * len(error), arrayminus=error))
     fig.update_layout(
         xaxis_title='<b>Action</b>',
         yaxis_title='<b>Frequency</b>',
         margin=dict(l=40, r=40, t=40, b=40),
-        autosize=True,
-        plot_bgcolor='white',
-        paper_bgcolor='white',
         showlegend=False,
     )
     fig.update_xaxes(tickfont=dict(size=12, family='Arial', color='black'))
     fig.update_yaxes(tickfont=dict(size=12, family='Arial', color='black'))
     return fig
 
-def make_figure_second(top_n):
-    df = action_time_df.head(top_n).copy()
+def make_figure_second(top_n, slice_key=ALL, sketches=None):
+    df = action_time_table(current_partials(slice_key, sketches)).head(top_n).copy()
     fig = px.bar(df, x='action', y='secs_elapsed',
                  labels={'secs_elapsed': 'Average Time (Seconds)', 'action': 'Action'})
 
-    for _, row in df.iterrows():
-        fig.add_annotation(
-            x=row['action'],
-            y=row['secs_elapsed'],
-            text=row['time_formatted'],
-            showarrow=False,
-            font=dict(size=12, color="black", family="Arial"),
-            align="center",
-            bgcolor="white"
-        )
-
     fig.update_layout(
+        # Centred white-background labels; their styling is the template's annotationdefaults
+        annotations=[dict(x=action, y=secs, text=text) for action, secs, text
+                     in zip(df['action'], df['secs_elapsed'], df['time_formatted'])],
         xaxis_title='<b>Action</b>',
         yaxis_title='<b>Average Time (Seconds)</b>',
         margin=dict(l=40, r=40, t=40, b=40),
-        autosize=True,
-        plot_bgcolor='white',
-        paper_bgcolor='white',
         showlegend=False,
     )
     fig.update_traces(marker_color='steelblue')
@@ -61,59 +85,143 @@ def make_figure_second(top_n):
     fig.update_yaxes(showticklabels=False, title_font=dict(size=14, family='Arial', color='black'))
     return fig
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            html.H3(id='plot-title', style={"color": 'steelblue', "font-weight": "bold", "text-align": "center"})
-        ], width=12),
-    ]),
-
-    html.Hr(),
-
-    dbc.Row([
-        dbc.Col([
-            html.Div([
-                html.Label("Number of top actions:", style={"margin-right": "10px"}),
-                dcc.Input(
-                    id='top-n-input',
-                    type='number',
-                    value=10,
-                    min=1,
-                    max=50,
-                    step=1,
-                    style={"width": "80px", "margin-right": "30px"}
-                ),
-                html.Label("Chart type:", style={"margin-right": "10px"}),
-                dcc.Dropdown(
-                    id='dropdown',
-                    options=[
-                        {'label': 'Actions', 'value': 'first'},
-                        {'label': 'Average Duration', 'value': 'second'}
-                    ],
-                    value='first',
-                    style={"width": "200px", "display": "inline-block"}
-                )
-            ], style={"display": "flex", "justify-content": "flex-end", "align-items": "center"})
-        ], width=12, style={"margin-bottom": "20px"}),
-    ]),
-
-    dbc.Row([
-        dbc.Col([
-            dcc.Graph(id='top-actions-graph', config={'responsive': True})
-        ], width=12)
-    ])
-], fluid=True)
-
-@dash.callback(
-    [Output('top-actions-graph', 'figure'),
-     Output('plot-title', 'children')],
-    [Input('dropdown', 'value'),
-     Input('top-n-input', 'value')]
-)
-def update_plot(selected_value, top_n):
-    if top_n is None or top_n < 1:
-        top_n = 10
+def make_top_actions_figure(selected_value, top_n, slice_key=ALL, sketches=None):
     if selected_value == 'first':
-        return make_figure_first(top_n), f"Top {top_n} Most Common User Actions"
-    else:
-        return make_figure_second(top_n), f"Top {top_n} Actions by Average Time Spent (hh:mm)"
+        return make_figure_first(top_n, slice_key, sketches)
+    return make_figure_second(top_n, slice_key, sketches)
+
+
+def title_suffix(slice_key):
+    return '' if slice_key == ALL else f' ({slice_label(slice_key)})'
+
+
+def plot_title(selected_value, top_n, slice_key):
+    suffix = title_suffix(slice_key)
+    if selected_value == 'first':
+        return f"Top {top_n} Most Common User Actions{suffix}"
+    return f"Top {top_n} Actions by Average Time Spent (hh:mm){suffix}"
+
+
+def data_version():
+    return load_sketch()[1]
+
+
+def slice_options(sketches):
+    keys = sorted(sketches, key=lambda key: (key != ALL, key))
+    return [{'label': slice_label(key), 'value': key} for key in keys]
+
+
+def clientside_data(slice_key):
+    sketches = load_sketch()[0]
+    return _clientside_data(slice_key, sketches.get(slice_key, sketches[ALL]))
+
+
+@lru_cache(maxsize=8)
+def _clientside_data(slice_key, sketch):
+    # Keyed on the sketch object, like sketch_partials
+    sketches = {slice_key: sketch}
+    size = len(current_partials(slice_key, sketches))
+    return {
+        'first': figure_json(make_figure_first(size, slice_key, sketches)),
+        'second': figure_json(make_figure_second(size, slice_key, sketches)),
+        'label': title_suffix(slice_key),
+    }
+
+
+def layout(**kwargs):
+    sketches = load_sketch()[0]
+    container = dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                html.H3(id='plot-title', style={"color": 'steelblue', "font-weight": "bold", "text-align": "center"})
+            ], width=12),
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.Div([
+                    html.Label("Sessions:", style={"margin-right": "10px"}),
+                    dcc.Dropdown(
+                        id='action-slice',
+                        options=slice_options(sketches),
+                        value=ALL,
+                        clearable=False,
+                        style={"width": "260px", "display": "inline-block", "margin-right": "30px"}
+                    ),
+                    html.Label("Number of top actions:", style={"margin-right": "10px"}),
+                    dcc.Input(
+                        id='top-n-input',
+                        type='number',
+                        value=10,
+                        min=1,
+                        step=1,
+                        style={"width": "80px", "margin-right": "30px"}
+                    ),
+                    html.Label("Chart type:", style={"margin-right": "10px"}),
+                    dcc.Dropdown(
+                        id='dropdown',
+                        options=[
+                            {'label': 'Actions', 'value': 'first'},
+                            {'label': 'Average Duration', 'value': 'second'}
+                        ],
+                        value='first',
+                        style={"width": "200px", "display": "inline-block"}
+                    )
+                ], style={"display": "flex", "justify-content": "flex-end", "align-items": "center"})
+            ], width=12, style={"margin-bottom": "20px"}),
+        ]),
+
+        dbc.Row([
+            dbc.Col([
+                dcc.Graph(id='top-actions-graph', config={'responsive': True})
+            ], width=12)
+        ])
+    ], fluid=True)
+
+    if CLIENTSIDE:
+        container.children.append(dcc.Store(id='top-actions-store', data=clientside_data(ALL)))
+
+    return container
+
+
+if CLIENTSIDE:
+    @dash.callback(
+        Output('top-actions-store', 'data'),
+        Input('action-slice', 'value'),
+        prevent_initial_call=True
+    )
+    def update_store(slice_key):
+        return clientside_data(slice_key or ALL)
+
+    dash.clientside_callback(
+        ClientsideFunction(namespace='airbnb', function_name='topActionsFigure'),
+        [Output('top-actions-graph', 'figure'),
+         Output('plot-title', 'children')],
+        [Input('dropdown', 'value'),
+         Input('top-n-input', 'value'),
+         Input('top-actions-store', 'data')]
+    )
+
+else:
+    @dash.callback(
+        [Output('top-actions-graph', 'figure'),
+         Output('plot-title', 'children')],
+        [Input('dropdown', 'value'),
+         Input('top-n-input', 'value'),
+         Input('action-slice', 'value')]
+    )
+    def update_plot(selected_value, top_n, slice_key):
+        if top_n is None or top_n < 1:
+            top_n = 10
+        slice_key = slice_key or ALL
+        sketches, version = load_sketch()
+        # Beyond the tracked actions every N draws the same figure
+        top_n = min(int(top_n), len(current_partials(slice_key, sketches))) or 1
+        fig = figure_cache.get('pg3', (selected_value, top_n, slice_key), version,
+                               lambda: make_top_actions_figure(selected_value, top_n, slice_key, sketches))
+        return fig, plot_title(selected_value, top_n, slice_key)
+
+    register_warmup('pg3', [(chart, n, ALL) for chart in ('first', 'second') for n in range(1, WARMUP_TOP_N + 1)],
+                    make_top_actions_figure, data_version)
@@ -0,0 +1,189 @@
+import dash
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+import numpy as np
+import plotly.graph_objects as go
+from dash.dependencies import Output, Input, State
+from dash.exceptions import PreventUpdate
+from engine.lazy import LazyData
+from engine.timeseries import RESOLUTIONS, DateSeries, choose_resolution, to_day
+from pipeline.artifacts import FileCache
+from pipeline.users_summary import SUMMARY_PATH, load_users_summary
+
+dash.register_page(__name__, path='/signup-booking-trends', title='Signup & Booking Trends', name='Signup & Booking Trends')
+
+
+def build_series(daily):
+    return {
+        'account': DateSeries(daily['account']['days'], count=daily['account']['counts']),
+        'booking': DateSeries(daily['booking']['days'], count=daily['booking']['counts']),
+        'lag': DateSeries(daily['lag']['days'], total=daily['lag']['total'], bookings=daily['lag']['bookings']),
+    }
+
+
+# Same artifact as pg2, reloaded whenever pipeline.state republishes it
+series_cache = FileCache(SUMMARY_PATH, lambda: build_series(load_users_summary()['daily']))
+page_data = LazyData('pg4', series_cache.get)
+
+
+def load_series():
+    page_data.get()
+    return series_cache.get()[0]
+
+
+def full_range(series):
+    ranges = [s.date_range() for s in series.values() if len(s)]
+    if not ranges:
+        return None, None
+    return min(start for start, _ in ranges), max(end for _, end in ranges)
+
+
+def visible_range(relayout_data, first_day, last_day):
+    """Zoomed x-axis range from ``relayoutData``, clamped to the data.
+
+    Returns None when the event did not touch the x-axis (legend clicks,
+    y-axis zoom), so the figures are left as they are.
+    """
+    relayout_data = relayout_data or {}
+    if 'xaxis.range[0]' in relayout_data:
+        start, end = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        start, end = relayout_data['xaxis.range']
+    elif relayout_data.get('xaxis.autorange') or not relayout_data:
+        return first_day, last_day
+    else:
+        return None
+    start = max(to_day(start), to_day(first_day))
+    end = min(to_day(end), to_day(last_day))
+    if end < start:
+        return None
+    return str(start), str(end)
+
+
+def make_volume_figure(series, start, end, resolution, first_day, last_day):
+    fig = go.Figure()
+    for name, label, color in (('account', 'Accounts Created', 'steelblue'),
+                               ('booking', 'First Bookings', '#FF5A5F')):
+        buckets, sums = series[name].rollup(start, end, resolution)
+        fig.add_trace(go.Scatter(
+            x=buckets.astype(str),
+            y=sums['count'],
+            mode='lines',
+            name=label,
+            line=dict(color=color, width=2)
+        ))
+
+    fig.update_layout(
+        title={'text': f'{RESOLUTIONS[resolution]} Signup & Booking Volume', 'x': 0.5},
+        yaxis_title='Users',
+        margin=dict(l=20, r=20, t=60, b=20),
+        hovermode='x unified',
+        legend=dict(orientation='h', y=1.1),
+        font=dict(size=14),
+        # Keeps legend toggles across re-aggregations
+        uirevision='trends',
+        xaxis=dict(
+            type='date',
+            range=[start, end],
+            rangeslider=dict(visible=True, range=[first_day, last_day]),
+        )
+    )
+    return fig
+
+
+def make_lag_figure(series, start, end, resolution):
+    buckets, sums = series['lag'].rollup(start, end, resolution)
+    bookings = sums['bookings']
+    mean_lag = np.divide(sums['total'], bookings, out=np.full(len(bookings), np.nan), where=bookings > 0)
+
+    fig = go.Figure(go.Bar(
+        x=buckets.astype(str),
+        y=np.round(mean_lag, 1),
+        marker_color='steelblue',
+        name='Mean Booking Lag'
+    ))
+    fig.update_layout(
+        title={'text': 'Mean Days from Account Creation to First Booking', 'x': 0.5},
+        yaxis_title='Days',
+        margin=dict(l=20, r=20, t=60, b=40),
+        showlegend=False,
+        font=dict(size=14),
+        xaxis=dict(type='date', range=[start, end])
+    )
+    return fig
+
+
+def range_summary(series, start, end, resolution):
+    accounts = series['account'].range_sum('count', start, end)
+    bookings = series['booking'].range_sum('count', start, end)
+    booked = series['lag'].range_sum('bookings', start, end)
+    lag = series['lag'].range_sum('total', start, end) / booked if booked else float('nan')
+    return (f"{start} – {end} ({RESOLUTIONS[resolution].lower()}): "
+            f"{accounts:,} accounts created, {bookings:,} first bookings, "
+            f"mean booking lag {lag:.1f} days")
+
+
+def layout(**kwargs):
+    first_day, last_day = full_range(load_series())
+    if first_day is None:
+        return dbc.Container([html.H3("No signup dates available.", style={"color": "#FF5A5F"})], fluid=True)
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H3("Signup & Booking Trends", style={"color": "#FF5A5F", "font-weight": "bold"}), width=8),
+            dbc.Col(dcc.RadioItems(
+                id='trends-resolution',
+                options=[{'label': ' Auto', 'value': 'auto'}] + [
+                    {'label': f' {label}', 'value': value} for value, label in RESOLUTIONS.items()
+                ],
+                value='auto',
+                inline=True,
+                labelStyle={"margin-right": "12px"},
+                style={"font-weight": "bold", "margin-top": "6px"}
+            ), width=4)
+        ]),
+
+        html.Hr(),
+
+        html.Div(id='trends-summary', style={"font-weight": "bold", "margin-bottom": "10px"}),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='trends-graph', config={'responsive': True}, style={'height': '55vh'}), width=12)
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='trends-lag-graph', config={'responsive': True}, style={'height': '35vh'}), width=12)
+        ])
+    ], fluid=True)
+
+
+@dash.callback(
+    Output('trends-graph', 'figure'),
+    Output('trends-lag-graph', 'figure'),
+    Output('trends-summary', 'children'),
+    Input('trends-graph', 'relayoutData'),
+    Input('trends-resolution', 'value'),
+    State('trends-graph', 'figure')
+)
+def update_trends(relayout_data, resolution, figure):
+    # Rollups are a handful of binary searches, so every zoom re-aggregates
+    # the visible range at a resolution that suits it instead of caching.
+    series = load_series()
+    first_day, last_day = full_range(series)
+    if first_day is None:
+        raise PreventUpdate
+    visible = visible_range(relayout_data, first_day, last_day)
+    if visible is None:
+        if dash.ctx.triggered_id != 'trends-resolution' or not figure:
+            raise PreventUpdate
+        # New resolution for the range already on screen
+        visible = tuple(str(to_day(day)) for day in figure['layout']['xaxis']['range'])
+
+    start, end = visible
+    if resolution not in RESOLUTIONS:
+        resolution = choose_resolution(start, end)
+    return (
+        make_volume_figure(series, start, end, resolution, first_day, last_day),
+        make_lag_figure(series, start, end, resolution),
+        range_summary(series, start, end, resolution),
+    )
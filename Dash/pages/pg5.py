@@ -0,0 +1,244 @@
+import dash
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+import numpy as np
+import plotly.graph_objects as go
+from functools import lru_cache
+from dash.dependencies import Output, Input
+from engine.figcache import figure_cache
+from engine.lazy import LazyData
+from engine.sequences import SessionSequences
+from engine.warmup import register_warmup
+from pipeline.artifacts import FileCache
+from pipeline.sequences import SEQUENCES_DIR, SEQUENCES_POINTER
+
+dash.register_page(__name__, path='/session-funnels', title='Session Funnels', name='Session Funnels')
+
+DEFAULT_STEPS = ['search', 'show', 'requested']
+NGRAM_LENGTHS = (2, 3, 4)
+TOP_PATHS = 20
+TOP_NEXT = 15
+
+
+def load_sequences():
+    return SessionSequences.load_current(SEQUENCES_DIR)
+
+
+# Reloaded whenever pipeline.sequences or pipeline.state points to a new build
+sequences_cache = FileCache(SEQUENCES_POINTER, load_sequences)
+page_data = LazyData('pg5', sequences_cache.get)
+
+
+def load_current():
+    """``(sequences, version)`` of the same load."""
+    page_data.get()
+    return sequences_cache.get()
+
+
+def data_version():
+    return load_current()[1]
+
+
+def action_options(sequences):
+    order = np.argsort(-sequences.action_counts(), kind='stable')
+    return [{'label': sequences.actions[code], 'value': sequences.actions[code]} for code in order]
+
+
+def default_steps(sequences):
+    steps = [action for action in DEFAULT_STEPS if sequences.code(action) is not None]
+    return steps or [option['value'] for option in action_options(sequences)[:3]]
+
+
+# Keyed on the loaded SessionSequences, so a new build never meets stale results
+@lru_cache(maxsize=64)
+def funnel_result(sequences, steps):
+    reached = sequences.funnel_rows(steps)
+    return sequences.funnel(steps, reached), sequences.next_actions(reached[-1], TOP_NEXT)
+
+
+@lru_cache(maxsize=len(NGRAM_LENGTHS))
+def ngram_counts(sequences, n):
+    return sequences.ngram_counts(n)
+
+
+def format_seconds(seconds):
+    if np.isnan(seconds):
+        return ''
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{secs:02d}'
+
+
+def make_funnel_figure(steps, total_users):
+    labels = [f'{i + 1}. {step.action}' for i, step in enumerate(steps)]
+    users = [step.users for step in steps]
+    first = users[0] or 1
+    text = [f'{n:,} ({n / first:.1%})' for n in users]
+    hover = [
+        f'{n:,} users, {n / (total_users or 1):.1%} of all users'
+        + (f'<br>median {format_seconds(step.median_seconds)} after the previous step' if i else '')
+        for i, (n, step) in enumerate(zip(users, steps))
+    ]
+    fig = go.Figure(go.Bar(
+        x=users,
+        y=labels,
+        orientation='h',
+        text=text,
+        textposition='outside',
+        cliponaxis=False,
+        hovertext=hover,
+        hoverinfo='text',
+        marker_color='steelblue'
+    ))
+    fig.update_layout(
+        title={'text': 'Users Reaching Each Step', 'x': 0.5},
+        xaxis_title='Users',
+        yaxis=dict(autorange='reversed'),
+        margin=dict(l=20, r=80, t=60, b=40),
+        showlegend=False,
+        font=dict(size=14)
+    )
+    return fig
+
+
+def make_next_figure(last_action, next_actions):
+    fig = go.Figure(go.Bar(
+        x=[action for action, _ in next_actions],
+        y=[users for _, users in next_actions],
+        texttemplate='%{y:,}',
+        textposition='outside',
+        marker_color='#FF5A5F'
+    ))
+    fig.update_layout(
+        title={'text': f'Next Action after "{last_action}"', 'x': 0.5},
+        yaxis_title='Users',
+        margin=dict(l=20, r=20, t=60, b=40),
+        showlegend=False,
+        font=dict(size=14)
+    )
+    return fig
+
+
+def make_ngram_figure(n, sequences=None):
+    if sequences is None:
+        sequences = load_current()[0]
+    paths = sequences.top_ngrams(n, TOP_PATHS, ngram_counts(sequences, n))
+    fig = go.Figure(go.Bar(
+        x=[count for _, count in paths],
+        y=[' → '.join(path) for path, _ in paths],
+        orientation='h',
+        texttemplate='%{x:,}',
+        textposition='outside',
+        cliponaxis=False,
+        marker_color='steelblue'
+    ))
+    fig.update_layout(
+        title={'text': f'Most Common {n}-Step Paths', 'x': 0.5},
+        xaxis_title='Occurrences',
+        yaxis=dict(autorange='reversed'),
+        margin=dict(l=20, r=80, t=60, b=40),
+        height=max(400, 28 * len(paths) + 120),
+        showlegend=False,
+        font=dict(size=14)
+    )
+    return fig
+
+
+def funnel_summary(steps, total_users):
+    if not steps:
+        return ''
+    parts = [f"{steps[-1].users:,} of {total_users:,} users ({steps[-1].users / (total_users or 1):.1%}) "
+             f"complete the funnel"]
+    for previous, step in zip(steps, steps[1:]):
+        if previous.users:
+            parts.append(f"{previous.action} → {step.action}: {step.users / previous.users:.1%}, "
+                         f"median {format_seconds(step.median_seconds) or 'n/a'}")
+    return '; '.join(parts)
+
+
+def layout(**kwargs):
+    sequences = load_current()[0]
+    if sequences is None:
+        return dbc.Container([html.H3(
+            "No session sequences available. Build them with: python -m pipeline.sequences --source <sessions.csv>",
+            style={"color": "#FF5A5F"}
+        )], fluid=True)
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H3("Session Funnels", style={"color": "#FF5A5F", "font-weight": "bold"}), width=12)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.Label("Funnel steps, in order:", style={"font-weight": "bold"}),
+                dcc.Dropdown(
+                    id='funnel-steps',
+                    options=action_options(sequences),
+                    value=default_steps(sequences),
+                    multi=True
+                )
+            ], width=12, style={"margin-bottom": "10px"})
+        ]),
+
+        html.Div(id='funnel-summary', style={"font-weight": "bold", "margin-bottom": "10px"}),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='funnel-graph', config={'responsive': True}), width=6),
+            dbc.Col(dcc.Graph(id='funnel-next-graph', config={'responsive': True}), width=6)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col(dcc.RadioItems(
+                id='ngram-length',
+                options=[{'label': f' {n} steps', 'value': n} for n in NGRAM_LENGTHS],
+                value=NGRAM_LENGTHS[0],
+                inline=True,
+                labelStyle={"margin-right": "12px"},
+                style={"font-weight": "bold"}
+            ), width=12)
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='ngram-graph', config={'responsive': True}), width=12)
+        ])
+    ], fluid=True)
+
+
+@dash.callback(
+    Output('funnel-graph', 'figure'),
+    Output('funnel-next-graph', 'figure'),
+    Output('funnel-summary', 'children'),
+    Input('funnel-steps', 'value')
+)
+def update_funnel(steps):
+    sequences = load_current()[0]
+    if sequences is None or not steps:
+        return go.Figure(), go.Figure(), "Pick at least one action."
+    steps = tuple(steps)
+    funnel, next_actions = funnel_result(sequences, steps)
+    return (
+        make_funnel_figure(funnel, sequences.n_users),
+        make_next_figure(steps[-1], next_actions),
+        funnel_summary(funnel, sequences.n_users),
+    )
+
+
+@dash.callback(
+    Output('ngram-graph', 'figure'),
+    Input('ngram-length', 'value')
+)
+def update_ngrams(n):
+    sequences, version = load_current()
+    if sequences is None:
+        return go.Figure()
+    n = n if n in NGRAM_LENGTHS else NGRAM_LENGTHS[0]
+    return figure_cache.get('pg5', (n,), version, lambda: make_ngram_figure(n, sequences))
+
+
+register_warmup('pg5', lambda: [(n,) for n in NGRAM_LENGTHS] if load_current()[0] is not None else [],
+                make_ngram_figure, data_version)
@@ -0,0 +1,280 @@
+import os
+import dash
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from dash.dependencies import Output, Input, State
+from dash.exceptions import PreventUpdate
+from engine.downsample import lttb, rounded
+from engine.lazy import LazyData
+from engine.marketstore import to_time
+from pipeline.artifacts import FileCache
+from pipeline.marketdata import MARKET_SOURCE, load_market, source_stamp
+
+dash.register_page(__name__, path='/stock-comparison', title='Stock Comparison', name='Stock Comparison')
+
+# Points per close line and candles per chart, whatever the zoom level
+POINT_BUDGET = 1000
+MAX_CANDLES = 300
+DEFAULT_TICKERS = 5
+COLORS = ['#FF5A5F', 'steelblue', '#00A699', '#FC642D', '#484848', '#7B0051', '#8CE071', '#FFB400']
+WIDTH_LABELS = {None: '', '1min': '1-Minute ', '5min': '5-Minute ', '15min': '15-Minute ', '1H': 'Hourly ',
+                '4H': '4-Hour ', '1D': 'Daily ', 'W': 'Weekly ', 'M': 'Monthly '}
+
+def load_market_store():
+    if not os.path.exists(MARKET_SOURCE):
+        return None
+    return load_market(MARKET_SOURCE)
+
+
+def market_stamp():
+    return source_stamp(MARKET_SOURCE) if os.path.exists(MARKET_SOURCE) else None
+
+
+# Rebuilt from the source (see pipeline.marketdata) whenever it changes; a
+# directory's own mtime misses edits to the CSVs in it, so stamp those
+market_cache = FileCache(MARKET_SOURCE, load_market_store, stamp=market_stamp)
+page_data = LazyData('pg6', market_cache.get)
+
+
+def load_store():
+    page_data.get()
+    return market_cache.get()[0]
+
+
+def axis_times(times):
+    """Plotly-ready strings of ``times``, without a time of day for daily bars."""
+    times = np.asarray(times)
+    daily = times.astype('datetime64[D]')
+    if np.array_equal(daily, times):
+        return daily.astype(str)
+    return times.astype('datetime64[s]').astype(str)
+
+
+def axis_time(value):
+    return axis_times([value])[0]
+
+
+def visible_window(relayout_data, first, last):
+    """Zoomed x-axis range from ``relayoutData``, clamped to the data.
+
+    Returns None when the event did not touch the x-axis (legend clicks,
+    y-axis zoom, autosize), so the figure is left as it is.
+    """
+    relayout_data = relayout_data or {}
+    for axis in ('xaxis', 'xaxis2'):
+        if f'{axis}.range[0]' in relayout_data:
+            start, end = relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']
+            break
+        if f'{axis}.range' in relayout_data:
+            start, end = relayout_data[f'{axis}.range']
+            break
+    else:
+        if relayout_data.get('xaxis.autorange') or relayout_data.get('xaxis2.autorange') or not relayout_data:
+            return first, last
+        return None
+    start, end = max(to_time(start), first), min(to_time(end), last)
+    if end < start:
+        return None
+    return start, end
+
+
+def shown_window(figure, first, last):
+    """Range already on screen, so control changes keep the zoom."""
+    try:
+        start, end = figure['layout']['xaxis']['range']
+    except (KeyError, TypeError, ValueError):
+        return first, last
+    return visible_window({'xaxis.range': [start, end]}, first, last) or (first, last)
+
+
+def make_lines_figure(store, tickers, normalized, start, end):
+    fig = go.Figure()
+    for i, ticker in enumerate(tickers):
+        bars = store.bars(ticker, start, end)
+        if not len(bars):
+            continue
+        close = np.asarray(bars.close)
+        keep = lttb(np.asarray(bars.time).view(np.int64), close, POINT_BUDGET)
+        values = 100 * close[keep] / close[0] if normalized else close[keep]
+        fig.add_trace(go.Scatter(
+            x=axis_times(bars.time[keep]),
+            y=rounded(values),
+            mode='lines',
+            name=ticker,
+            line=dict(color=COLORS[i % len(COLORS)], width=2)
+        ))
+
+    fig.update_layout(
+        title={'text': 'Close, Rebased to 100' if normalized else 'Close Price', 'x': 0.5},
+        yaxis_title='Index' if normalized else 'Price',
+        margin=dict(l=20, r=20, t=60, b=20),
+        hovermode='x unified',
+        legend=dict(orientation='h', y=1.1),
+        font=dict(size=14),
+        # Keeps legend toggles across zooms
+        uirevision='market',
+        xaxis=dict(type='date', range=[axis_time(start), axis_time(end)])
+    )
+    return fig
+
+
+def make_candles_figure(store, ticker, start, end):
+    bars = store.ohlc(ticker, start, end, MAX_CANDLES)
+    times = axis_times(bars.time)
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25], vertical_spacing=0.03)
+    fig.add_trace(go.Candlestick(
+        x=times,
+        open=rounded(bars.open),
+        high=rounded(bars.high),
+        low=rounded(bars.low),
+        close=rounded(bars.close),
+        name=ticker,
+        increasing_line_color='#00A699',
+        decreasing_line_color='#FF5A5F'
+    ), row=1, col=1)
+    fig.add_trace(go.Bar(
+        x=times,
+        y=np.asarray(bars.volume),
+        name='Volume',
+        marker_color='steelblue'
+    ), row=2, col=1)
+
+    fig.update_layout(
+        title={'text': f'{ticker} {WIDTH_LABELS[bars.width]}OHLC and Volume', 'x': 0.5},
+        margin=dict(l=20, r=20, t=60, b=20),
+        showlegend=False,
+        font=dict(size=14),
+        uirevision='candles',
+        xaxis=dict(type='date', range=[axis_time(start), axis_time(end)], rangeslider=dict(visible=False)),
+        xaxis2=dict(type='date', range=[axis_time(start), axis_time(end)])
+    )
+    fig.update_yaxes(title_text='Price', row=1, col=1)
+    fig.update_yaxes(title_text='Volume', row=2, col=1)
+    return fig
+
+
+def range_summary(store, tickers, start, end):
+    parts = []
+    for ticker in tickers:
+        bars = store.bars(ticker, start, end)
+        if len(bars):
+            parts.append(f"{ticker} {bars.close[-1] / bars.close[0] - 1:+.1%}")
+    return f"{axis_time(start)} – {axis_time(end)}: " + ', '.join(parts)
+
+
+def layout(**kwargs):
+    store = load_store()
+    if store is None or store.time_range()[0] is None:
+        return dbc.Container([html.H3("No market data available.", style={"color": "#FF5A5F"})], fluid=True)
+
+    tickers = store.tickers
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H3("Stock Comparison", style={"color": "#FF5A5F", "font-weight": "bold"}), width=8),
+            dbc.Col(dcc.RadioItems(
+                id='market-scale',
+                options=[{'label': ' Rebased', 'value': 'normalized'}, {'label': ' Price', 'value': 'price'}],
+                value='normalized',
+                inline=True,
+                labelStyle={"margin-right": "12px"},
+                style={"font-weight": "bold", "margin-top": "6px"}
+            ), width=4)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.Label("Tickers:", style={"font-weight": "bold"}),
+                dcc.Dropdown(
+                    id='market-tickers',
+                    options=[{'label': ticker, 'value': ticker} for ticker in tickers],
+                    value=tickers[:DEFAULT_TICKERS],
+                    multi=True
+                )
+            ], width=12, style={"margin-bottom": "10px"})
+        ]),
+
+        html.Div(id='market-summary', style={"font-weight": "bold", "margin-bottom": "10px"}),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='market-lines', config={'responsive': True}, style={'height': '50vh'}), width=12)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.Label("Candlestick chart:", style={"font-weight": "bold"}),
+                dcc.Dropdown(
+                    id='market-candle-ticker',
+                    options=[{'label': ticker, 'value': ticker} for ticker in tickers],
+                    value=tickers[0],
+                    clearable=False
+                )
+            ], width=4)
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='market-candles', config={'responsive': True}, style={'height': '60vh'}), width=12)
+        ])
+    ], fluid=True)
+
+
+@dash.callback(
+    Output('market-lines', 'figure'),
+    Output('market-summary', 'children'),
+    Input('market-tickers', 'value'),
+    Input('market-scale', 'value'),
+    Input('market-lines', 'relayoutData'),
+    State('market-lines', 'figure')
+)
+def update_lines(tickers, scale, relayout_data, figure):
+    # Each zoom re-reads the visible rows (two binary searches per ticker)
+    # and thins them to POINT_BUDGET, so detail appears as the range narrows.
+    store = load_store()
+    if store is None:
+        raise PreventUpdate
+    tickers = [ticker for ticker in tickers or [] if ticker in store]
+    first, last = store.time_range(tickers) if tickers else (None, None)
+    if first is None:
+        return go.Figure(), "Pick at least one ticker."
+    if dash.ctx.triggered_id == 'market-lines':
+        visible = visible_window(relayout_data, first, last)
+        if visible is None:
+            raise PreventUpdate
+    else:
+        visible = shown_window(figure, first, last)
+
+    start, end = visible
+    return (
+        make_lines_figure(store, tickers, scale == 'normalized', start, end),
+        range_summary(store, tickers, start, end),
+    )
+
+
+@dash.callback(
+    Output('market-candles', 'figure'),
+    Input('market-candle-ticker', 'value'),
+    Input('market-candles', 'relayoutData'),
+    State('market-candles', 'figure')
+)
+def update_candles(ticker, relayout_data, figure):
+    # Zooming out rolls the stored bars up to at most MAX_CANDLES candles;
+    # zooming in goes back to finer bars, down to the stored ones.
+    store = load_store()
+    if store is None or ticker not in store:
+        raise PreventUpdate
+    first, last = store.time_range([ticker])
+    if first is None:
+        return go.Figure()
+    if dash.ctx.triggered_id == 'market-candles':
+        visible = visible_window(relayout_data, first, last)
+        if visible is None:
+            raise PreventUpdate
+    else:
+        visible = shown_window(figure, first, last)
+    return make_candles_figure(store, ticker, *visible)
@@ -0,0 +1,219 @@
+import dash
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+import numpy as np
+import plotly.graph_objects as go
+from dash.dependencies import Output, Input
+from engine.age_gender import AgeGenderCube
+from engine.destinations import METRICS, DestinationFacts
+from engine.figcache import figure_cache
+from engine.lazy import LazyData
+from engine.store import load_table
+from engine.warmup import register_warmup
+from pipeline.artifacts import FileCache, file_stamp
+from pipeline.users_summary import SUMMARY_PATH, load_users_summary
+
+dash.register_page(__name__, path='/destinations', title='Destinations', name='Destinations')
+
+COUNTRIES_CSV = 'assets/countries.csv'
+AGE_GENDER_CSV = 'assets/age_gender_bkts.csv'
+MAP_STYLES = {'choropleth': 'Shaded Countries', 'bubbles': 'Bubbles'}
+DEFAULT_METRIC = 'booking_share'
+MAX_BUBBLE_PX = 60
+
+
+def build_facts():
+    return DestinationFacts.from_tables(
+        load_table(COUNTRIES_CSV),
+        AgeGenderCube(load_table(AGE_GENDER_CSV)),
+        load_users_summary(),
+    )
+
+
+def facts_stamp():
+    return file_stamp(SUMMARY_PATH), file_stamp(COUNTRIES_CSV), file_stamp(AGE_GENDER_CSV)
+
+
+# Joined once per version of the three tables; callbacks only index its arrays
+facts_cache = FileCache(SUMMARY_PATH, build_facts, stamp=facts_stamp)
+page_data = LazyData('pg7', facts_cache.get)
+
+
+def load_facts():
+    """``(facts, version)`` of the same load."""
+    page_data.get()
+    return facts_cache.get()
+
+
+def data_version():
+    return load_facts()[1]
+
+
+def hover_template(metric):
+    label, fmt = METRICS[metric]
+    return f'<b>%{{hovertext}}</b><br>{label}: %{{customdata[1]:{fmt}}}<extra></extra>'
+
+
+def make_map_figure(metric, style, facts=None):
+    if facts is None:
+        facts = load_facts()[0]
+    values = facts.column(metric)
+    label = METRICS[metric][0]
+    customdata = np.column_stack([np.asarray(facts.codes, dtype=object), values])
+    if style == 'bubbles':
+        largest = np.nanmax(values) if np.isfinite(values).any() else 0
+        sizes = MAX_BUBBLE_PX * np.sqrt(np.divide(values, largest, out=np.zeros_like(values),
+                                                  where=np.isfinite(values) & (largest > 0)))
+        trace = go.Scattergeo(
+            lat=facts.lat,
+            lon=facts.lng,
+            hovertext=facts.names,
+            customdata=customdata,
+            hovertemplate=hover_template(metric),
+            mode='markers',
+            marker=dict(size=np.maximum(sizes, 4), color='#FF5A5F', opacity=0.7,
+                        line=dict(color='white', width=1))
+        )
+    else:
+        trace = go.Choropleth(
+            locations=facts.iso3,
+            locationmode='ISO-3',
+            z=values,
+            hovertext=facts.names,
+            customdata=customdata,
+            hovertemplate=hover_template(metric),
+            colorscale='Reds',
+            marker_line_color='white',
+            colorbar=dict(title=dict(text=label, side='right'))
+        )
+
+    fig = go.Figure(trace)
+    fig.update_layout(
+        title={'text': label, 'x': 0.5},
+        margin=dict(l=0, r=0, t=60, b=0),
+        font=dict(size=14),
+        geo=dict(projection_type='natural earth', showcountries=True, showframe=False,
+                 landcolor='#F2F2F2', countrycolor='white'),
+        uirevision='destinations'
+    )
+    return fig
+
+
+def make_ranking_figure(metric, facts=None):
+    if facts is None:
+        facts = load_facts()[0]
+    ids = facts.ranking(metric)
+    label, fmt = METRICS[metric]
+    fig = go.Figure(go.Bar(
+        x=facts.column(metric)[ids],
+        y=[facts.names[i] for i in ids],
+        customdata=[facts.codes[i] for i in ids],
+        orientation='h',
+        texttemplate=f'%{{x:{fmt}}}',
+        textposition='outside',
+        cliponaxis=False,
+        marker_color='steelblue'
+    ))
+    fig.update_layout(
+        title={'text': 'Ranking', 'x': 0.5},
+        xaxis_title=label,
+        yaxis=dict(autorange='reversed'),
+        margin=dict(l=20, r=60, t=60, b=40),
+        showlegend=False,
+        font=dict(size=14)
+    )
+    return fig
+
+
+def destination_details(code, facts):
+    row = facts.row(code)
+    if row is None:
+        return "Click a destination on the map or in the ranking for its details."
+    items = [html.Li(f"{label}: {row[metric]:{fmt}}") for metric, (label, fmt) in METRICS.items()
+             if not np.isnan(row[metric])]
+    items.append(html.Li(f"Language: {row['language'] or 'n/a'}"))
+    items += [html.Li(f"{gender.capitalize()} population (x 1000): {row[f'population_{gender}']:,.0f}")
+              for gender in facts.genders]
+    return [html.H5(row['name'], style={"font-weight": "bold"}), html.Ul(items)]
+
+
+def clicked_code(*click_data):
+    """Destination code of whichever graph was clicked last."""
+    triggered = dash.ctx.triggered_id
+    for graph, data in zip(('geo-map', 'geo-ranking'), click_data):
+        if graph == triggered and data and data.get('points'):
+            point = data['points'][0]
+            customdata = point.get('customdata')
+            return customdata[0] if isinstance(customdata, list) else customdata
+    return None
+
+
+def layout(**kwargs):
+    facts = load_facts()[0]
+    if not len(facts):
+        return dbc.Container([html.H3("No destination data available.", style={"color": "#FF5A5F"})], fluid=True)
+
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(html.H3("Destinations", style={"color": "#FF5A5F", "font-weight": "bold"}), width=8),
+            dbc.Col(dcc.RadioItems(
+                id='geo-style',
+                options=[{'label': f' {label}', 'value': value} for value, label in MAP_STYLES.items()],
+                value='choropleth',
+                inline=True,
+                labelStyle={"margin-right": "12px"},
+                style={"font-weight": "bold", "margin-top": "6px"}
+            ), width=4)
+        ]),
+
+        html.Hr(),
+
+        dbc.Row([
+            dbc.Col([
+                html.Label("Metric:", style={"font-weight": "bold"}),
+                dcc.Dropdown(
+                    id='geo-metric',
+                    options=[{'label': label, 'value': metric} for metric, (label, _) in METRICS.items()],
+                    value=DEFAULT_METRIC,
+                    clearable=False
+                )
+            ], width=4, style={"margin-bottom": "10px"})
+        ]),
+
+        dbc.Row([
+            dbc.Col(dcc.Graph(id='geo-map', config={'responsive': True}, style={'height': '60vh'}), width=8),
+            dbc.Col(dcc.Graph(id='geo-ranking', config={'responsive': True}, style={'height': '60vh'}), width=4)
+        ]),
+
+        html.Div(id='geo-details', style={"margin-top": "10px"})
+    ], fluid=True)
+
+
+@dash.callback(
+    Output('geo-map', 'figure'),
+    Output('geo-ranking', 'figure'),
+    Input('geo-metric', 'value'),
+    Input('geo-style', 'value')
+)
+def update_maps(metric, style):
+    facts, version = load_facts()
+    metric = metric if metric in METRICS else DEFAULT_METRIC
+    style = style if style in MAP_STYLES else 'choropleth'
+    return (
+        figure_cache.get('pg7', (metric, style), version, lambda: make_map_figure(metric, style, facts)),
+        figure_cache.get('pg7-ranking', (metric,), version, lambda: make_ranking_figure(metric, facts)),
+    )
+
+
+@dash.callback(
+    Output('geo-details', 'children'),
+    Input('geo-map', 'clickData'),
+    Input('geo-ranking', 'clickData')
+)
+def update_details(map_click, ranking_click):
+    return destination_details(clicked_code(map_click, ranking_click), load_facts()[0])
+
+
+register_warmup('pg7', lambda: [(metric, style) for metric in METRICS for style in MAP_STYLES],
+                make_map_figure, data_version)
+register_warmup('pg7-ranking', lambda: [(metric,) for metric in METRICS], make_ranking_figure, data_version)
@@ -0,0 +1,145 @@
+"""Per-slice Space-Saving sketches of the sessions log for the Top Actions page.
+
+Run from the Dash directory:
+
+    python -m pipeline.action_sketch --source assets/sessions.csv --workers 8
+
+Every chunk is grouped exactly by (slice value, action) and merged into one
+``engine.sketch.SpaceSaving`` per slice: all sessions, each ``device_type``
+and each ``action_type``. The published JSON is what pg3 serves, so any top-N
+of any slice is a lookup instead of a rescan of the log.
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from engine.sketch import CAPACITY, SpaceSaving, merge_sketches
+from pipeline.artifacts import atomic_write
+from pipeline.sessions import (ACTION_COUNTS_CSV, ACTION_TIME_CSV, CHUNK_SIZE, SESSIONS_CSV, aggregate_chunk,
+                               empty_partials, iter_chunks, merge_partials)
+
+SKETCH_PATH = 'assets/action_sketch.json'
+SKETCH_VERSION = 1
+
+ALL = 'all'
+SLICE_COLUMNS = ('device_type', 'action_type')
+SKETCH_COLUMNS = ['action', 'secs_elapsed', *SLICE_COLUMNS]
+
+
+def slice_key(column, value):
+    return f'{column}={value}'
+
+
+def slice_label(key):
+    if key == ALL:
+        return 'All sessions'
+    column, value = key.split('=', 1)
+    return f"{column.replace('_', ' ').capitalize()}: {value}"
+
+
+def _exact(grouped, capacity):
+    return SpaceSaving.exact(grouped['count'].to_dict(), grouped['secs_sum'].to_dict(),
+                             grouped['secs_n'].to_dict(), capacity)
+
+
+def sketch_chunk(chunk, capacity=CAPACITY):
+    chunk = chunk.dropna(subset=['action'])
+    sketches = {}
+    for column in (None, *SLICE_COLUMNS):
+        keys = ['action'] if column is None else [column, 'action']
+        secs = chunk.groupby(keys, sort=False)['secs_elapsed']
+        grouped = pd.DataFrame({'count': secs.size(), 'secs_sum': secs.sum(), 'secs_n': secs.count()})
+        if column is None:
+            sketches[ALL] = _exact(grouped, capacity)
+            continue
+        for value, group in grouped.groupby(level=0, sort=False):
+            sketches[slice_key(column, value)] = _exact(group.droplevel(0), capacity)
+    return sketches
+
+
+def sketch_sessions(source=SESSIONS_CSV, chunk_size=CHUNK_SIZE, workers=1, capacity=CAPACITY):
+    if workers > 1:
+        from pipeline.parallel import sketch_sessions_parallel
+        return sketch_sessions_parallel(source, workers, chunk_size, capacity)
+
+    sketches = {}
+    for chunk in iter_chunks(source, chunk_size, columns=SKETCH_COLUMNS):
+        sketches = merge_sketches(sketches, sketch_chunk(chunk, capacity))
+    return sketches
+
+
+def aggregate_and_sketch(source=SESSIONS_CSV, chunk_size=CHUNK_SIZE, workers=1, capacity=CAPACITY):
+    """``(partials, sketches)`` of the log in one read: the exact per-action
+    partials of ``pipeline.sessions`` and the per-slice sketches."""
+    if workers > 1:
+        from pipeline.parallel import aggregate_and_sketch_parallel
+        return aggregate_and_sketch_parallel(source, workers, chunk_size, capacity)
+
+    totals, sketches = empty_partials(), {}
+    for chunk in iter_chunks(source, chunk_size, columns=SKETCH_COLUMNS):
+        totals = merge_partials(totals, aggregate_chunk(chunk))
+        sketches = merge_sketches(sketches, sketch_chunk(chunk, capacity))
+    return totals, sketches
+
+
+def sketches_to_dict(sketches):
+    return {key: sketch.to_dict() for key, sketch in sketches.items()}
+
+
+def sketches_from_dict(data):
+    return {key: SpaceSaving.from_dict(sketch) for key, sketch in data.items()}
+
+
+def write_sketches(sketches, path=SKETCH_PATH):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': SKETCH_VERSION, 'slices': sketches_to_dict(sketches)}, f, separators=(',', ':'))
+    atomic_write(path, write)
+
+
+def sketches_from_tables(counts_path=ACTION_COUNTS_CSV, time_path=ACTION_TIME_CSV, capacity=CAPACITY):
+    """Unsliced sketch rebuilt from the published action tables, for trees
+    where the sessions log was never sketched."""
+    counts = pd.read_csv(counts_path).set_index('action')['count']
+    means = pd.read_csv(time_path).set_index('action')['secs_elapsed']
+    timed = counts.reindex(means.index).fillna(0)
+    return {ALL: SpaceSaving.exact(counts.to_dict(), (means * timed).to_dict(), timed.to_dict(), capacity)}
+
+
+def load_sketches(path=SKETCH_PATH, counts_path=ACTION_COUNTS_CSV, time_path=ACTION_TIME_CSV):
+    if not os.path.exists(path):
+        return sketches_from_tables(counts_path, time_path)
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != SKETCH_VERSION:
+        raise ValueError(f'{path} has sketch version {data.get("version")}, expected {SKETCH_VERSION}')
+    return sketches_from_dict(data['slices'])
+
+
+def partials_frame(sketch):
+    """A sketch's counters as ``pipeline.sessions`` partials, for its table builders."""
+    rows = sketch.top()
+    frame = pd.DataFrame(rows, columns=['action', 'count', 'error', 'secs_sum', 'secs_n']).set_index('action')
+    return frame.astype({'count': 'int64', 'error': 'int64', 'secs_sum': 'float64', 'secs_n': 'int64'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Sketch the sessions log for the Top Actions page.')
+    parser.add_argument('--source', default=SESSIONS_CSV)
+    parser.add_argument('--output', default=SKETCH_PATH)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--capacity', type=int, default=CAPACITY, help='counters kept per slice')
+    parser.add_argument('--workers', type=int, default=1, help='sketch byte ranges of the log in a process pool')
+    args = parser.parse_args(argv)
+
+    sketches = sketch_sessions(args.source, args.chunk_size, args.workers, args.capacity)
+    write_sketches(sketches, args.output)
+    overall = sketches.get(ALL, SpaceSaving(args.capacity))
+    print(f'Sketched {overall.total:,} actions into {len(sketches)} slices '
+          f'({os.path.getsize(args.output):,} bytes, counts within +{overall.error_bound:,.0f})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Helpers for publishing pre-aggregated artifacts and picking them up at runtime."""
+import os
+import threading
+import uuid
+
+
+def atomic_write(path, write):
+    """Call ``write(tmp_path)`` and move the result over ``path`` in one step,
+    so running workers never read a half-written artifact.
+
+    The temporary file is private to this call, so concurrent writers of the
+    same artifact never mix their output; the last one to finish wins.
+    """
+    tmp_path = f'{path}.{os.getpid()}-{uuid.uuid4().hex}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileCache:
+    """Value loaded from a file, reloaded whenever the file is replaced.
+
+    ``get`` costs a single ``stat`` when nothing changed, so callbacks can call
+    it on every request and pick up refreshed aggregates without a restart.
+    It returns ``(value, version)`` from the same load, so anything keyed on
+    the version (figure caches, lru_caches) can never pair new data with an
+    old version or the reverse.
+
+    A loader that reads more than ``path`` (or falls back to other files when
+    it is missing) passes ``stamp``, a callable returning a version that
+    covers every file it reads.
+    """
+
+    def __init__(self, path, loader, stamp=None):
+        self.path = path
+        self.loader = loader
+        self.stamp = stamp or (lambda: file_stamp(self.path))
+        # (value, version) of the last load, replaced as one object
+        self._current = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        stamp = self.stamp()
+        current = self._current
+        if current is not None and current[1] == stamp:
+            return current
+        with self._lock:
+            current = self._current
+            if current is None or current[1] != stamp:
+                current = self._current = (self.loader(), stamp)
+        return current
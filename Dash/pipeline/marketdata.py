@@ -0,0 +1,219 @@
+"""Local OHLCV loader and the columnar store behind the Stock Comparison page.
+
+Run from the Dash directory:
+
+    python -m pipeline.marketdata --source assets/data.csv
+
+A source is any of:
+
+- a wide CSV like ``assets/data.csv``: a ``Date`` column and one
+  ``<Field>_<TICKER>`` column per field and ticker;
+- a long CSV with a ``Ticker`` (or ``Symbol``) column and one column per field;
+- a directory of per-ticker CSVs named ``<TICKER>.csv`` with one column per
+  field, as downloaded from most data vendors; they are parsed in a process
+  pool, so bulk loads of hundreds of tickers use every core.
+
+Field names are matched case-insensitively (``Adj Close`` is ignored) and the
+time column may be ``Date``, ``Datetime`` or ``Timestamp``, at any bar width.
+
+The parsed bars are written once as an ``engine.marketstore`` directory under
+``assets/.cache`` keyed by the source's size and mtime, like
+``engine.store``, and memory-mapped from then on. ``DataReader`` answers the
+``pandas_datareader.DataReader`` calls the dashboard needs from that store, so
+pages work offline and never wait on a remote API.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine.marketstore import FIELDS, META_FILE, STORE_VERSION, MarketStore
+from engine.store import CACHE_DIR
+from pipeline.parallel import default_workers
+
+MARKET_SOURCE = os.environ.get('DASH_MARKET_SOURCE', 'assets/data.csv')
+TIME_COLUMNS = ('date', 'datetime', 'timestamp', 'time')
+TICKER_COLUMNS = ('ticker', 'symbol')
+LONG_COLUMNS = ('ticker', 'time') + FIELDS
+
+
+def _time_column(columns):
+    for column in columns:
+        if column.lower() in TIME_COLUMNS:
+            return column
+    raise ValueError(f'No time column among {list(columns)}; expected one of {TIME_COLUMNS}')
+
+
+def _long_frame(frame, ticker):
+    """``frame`` with one column per field renamed to LONG_COLUMNS."""
+    renames = {column: column.lower() for column in frame.columns if column.lower() in FIELDS}
+    renames[_time_column(frame.columns)] = 'time'
+    if ticker is None:
+        ticker = next(column for column in frame.columns if column.lower() in TICKER_COLUMNS)
+        renames[ticker] = 'ticker'
+    frame = frame.rename(columns=renames)
+    if 'ticker' not in frame:
+        frame['ticker'] = ticker
+    return frame.reindex(columns=LONG_COLUMNS)
+
+
+def read_wide(frame):
+    """Long bars of a ``Date`` + ``<Field>_<TICKER>`` frame."""
+    time = frame[_time_column(frame.columns)]
+    parts = []
+    for column in frame.columns:
+        field, _, ticker = column.partition('_')
+        if field.lower() in FIELDS and ticker:
+            parts.append(pd.DataFrame({'ticker': ticker, 'time': time, 'field': field.lower(),
+                                       'value': frame[column]}))
+    if not parts:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    stacked = pd.concat(parts, ignore_index=True)
+    bars = stacked.pivot_table(index=['ticker', 'time'], columns='field', values='value', aggfunc='last')
+    return bars.reset_index().reindex(columns=LONG_COLUMNS)
+
+
+def read_csv(path, ticker=None):
+    """Long bars of one CSV in any of the supported layouts."""
+    frame = pd.read_csv(path)
+    if ticker is None and not any(column.lower() in TICKER_COLUMNS for column in frame.columns):
+        return read_wide(frame)
+    return _long_frame(frame, ticker)
+
+
+def _read_ticker_file(path):
+    return read_csv(path, ticker=os.path.splitext(os.path.basename(path))[0].upper())
+
+
+def read_source(source=MARKET_SOURCE, workers=None):
+    if not os.path.isdir(source):
+        return read_csv(source)
+    paths = sorted(glob.glob(os.path.join(source, '*.csv')))
+    if not paths:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    workers = min(workers or default_workers(), len(paths))
+    if workers == 1:
+        frames = [_read_ticker_file(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_read_ticker_file, paths, chunksize=max(1, len(paths) // (4 * workers))))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_arrays(bars):
+    """The ``engine.marketstore`` arrays of a long bars frame."""
+    bars = bars.assign(time=pd.to_datetime(bars['time'], utc=True).dt.tz_localize(None))
+    bars = bars.dropna(subset=['time', 'close'])
+    bars = bars.sort_values(['ticker', 'time'], kind='stable').drop_duplicates(['ticker', 'time'], keep='last')
+    tickers, codes = np.unique(bars['ticker'].astype(str).to_numpy(), return_inverse=True)
+    offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(tickers)), out=offsets[1:])
+
+    close = bars['close'].to_numpy(dtype=np.float64)
+    arrays = {'offsets': offsets, 'time': bars['time'].to_numpy(dtype='datetime64[ns]').view(np.int64)}
+    for field in ('open', 'high', 'low'):
+        # A missing open/high/low is drawn as a flat bar at the close
+        arrays[field] = np.where(bars[field].isna(), close, bars[field].to_numpy(dtype=np.float64))
+    arrays['close'] = close
+    arrays['volume'] = bars['volume'].fillna(0).to_numpy(dtype=np.float64)
+    return arrays, [str(ticker) for ticker in tickers]
+
+
+def write_store(arrays, tickers, directory):
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.staging-')
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), values)
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump({'version': STORE_VERSION, 'tickers': tickers, 'rows': len(arrays['time'])}, f)
+        if os.path.exists(directory):
+            # Another worker built the same source first
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            os.rename(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def source_stamp(source):
+    """Size and mtime of ``source``, or of every CSV in it if it is a directory."""
+    paths = sorted(glob.glob(os.path.join(source, '*.csv'))) if os.path.isdir(source) else [source]
+    stats = [os.stat(path) for path in paths]
+    return sum(stat.st_size for stat in stats), max((stat.st_mtime_ns for stat in stats), default=0), len(stats)
+
+
+def _store_path(source, cache_dir):
+    size, mtime, files = source_stamp(source)
+    stem = f"market-{os.path.splitext(os.path.basename(os.path.normpath(source)))[0]}"
+    return os.path.join(cache_dir, f'{stem}-v{STORE_VERSION}-{files}-{size}-{mtime}'), stem
+
+
+def _remove_stale(cache_dir, stem, keep):
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry.startswith(f'{stem}-v') and path != keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_market(source=MARKET_SOURCE, cache_dir=CACHE_DIR, workers=None):
+    """``MarketStore`` of ``source``, building its cache directory if needed."""
+    target, stem = _store_path(source, cache_dir)
+    if not os.path.exists(os.path.join(target, META_FILE)):
+        write_store(*build_arrays(read_source(source, workers)), target)
+        _remove_stale(cache_dir, stem, target)
+    return MarketStore.load(target)
+
+
+def DataReader(name, data_source='local', start=None, end=None, source=MARKET_SOURCE, **kwargs):
+    """Local stand-in for ``pandas_datareader.DataReader``.
+
+    One symbol gives a frame of Open/High/Low/Close/Volume indexed by Date; a
+    list gives the same fields over ``(Attributes, Symbols)`` columns. Any
+    ``data_source`` other than ``'local'`` is passed on to pandas_datareader.
+    """
+    if data_source != 'local':
+        from pandas_datareader import data as web
+        return web.DataReader(name, data_source, start, end, **kwargs)
+
+    store = load_market(source)
+    symbols = [name] if isinstance(name, str) else list(name)
+    missing = [symbol for symbol in symbols if symbol not in store]
+    if missing:
+        raise KeyError(f'No local bars for {missing} in {source}')
+
+    frames = {}
+    for symbol in symbols:
+        bars = store.bars(symbol, start, end)
+        frames[symbol] = pd.DataFrame(
+            {field.capitalize(): np.asarray(getattr(bars, field)) for field in FIELDS},
+            index=pd.DatetimeIndex(np.asarray(bars.time), name='Date'),
+        )
+    if isinstance(name, str):
+        return frames[name]
+    combined = pd.concat(frames, axis=1, names=['Symbols', 'Attributes'])
+    return combined.swaplevel(axis=1).sort_index(axis=1, level=0, sort_remaining=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the columnar OHLCV store for the Stock Comparison page.')
+    parser.add_argument('--source', default=MARKET_SOURCE)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    store = load_market(args.source, args.cache_dir, args.workers)
+    first, last = store.time_range()
+    print(f"{len(store.time):,} bars of {len(store.tickers):,} tickers from {first} to {last}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Process-pool versions of the sessions and users aggregations.
+
+The input CSV is split into line-aligned byte ranges; each worker parses only
+its own range and returns mergeable partials (``pipeline.sessions`` partials,
+``pipeline.action_sketch`` sketches or ``pipeline.users_summary`` state),
+which are merged in range order.
+
+Counts are exact for any worker count. ``secs_elapsed`` sums are exact too as
+long as the values are whole seconds (as in the sessions log), since float64
+addition of integers below 2**53 does not depend on order. Sketches are exact
+only while a slice has fewer distinct actions than the sketch capacity;
+beyond that their estimates depend on the partitioning, within the same bound.
+
+Records must not contain embedded newlines, which holds for both logs.
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from engine.sketch import CAPACITY, merge_sketches
+from pipeline import action_sketch, sessions, users_summary
+
+PARTITIONS_PER_WORKER = 4
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def split_ranges(path, parts):
+    """Return the header columns and up to ``parts`` line-aligned byte ranges
+    covering every data row of ``path``."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8')]))
+        bounds = [f.tell()]
+        for i in range(1, parts):
+            target = bounds[0] + (size - bounds[0]) * i // parts
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > bounds[-1]:
+                bounds.append(f.tell())
+        bounds.append(size)
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return header, ranges
+
+
+def open_range(path, start, end):
+    return io.BufferedReader(_ByteRange(path, start, end))
+
+
+def _sessions_partition(path, header, start, end, chunk_size):
+    totals = sessions.empty_partials()
+    with open_range(path, start, end) as f:
+        for chunk in sessions.iter_chunks(f, chunk_size, header=None, names=header):
+            totals = sessions.merge_partials(totals, sessions.aggregate_chunk(chunk))
+    return totals
+
+
+def _sketch_partition(path, header, start, end, chunk_size, capacity):
+    sketches = {}
+    with open_range(path, start, end) as f:
+        for chunk in sessions.iter_chunks(f, chunk_size, columns=action_sketch.SKETCH_COLUMNS,
+                                          header=None, names=header):
+            sketches = merge_sketches(sketches, action_sketch.sketch_chunk(chunk, capacity))
+    return sketches
+
+
+def _sessions_and_sketch_partition(path, header, start, end, chunk_size, capacity):
+    totals, sketches = sessions.empty_partials(), {}
+    with open_range(path, start, end) as f:
+        for chunk in sessions.iter_chunks(f, chunk_size, columns=action_sketch.SKETCH_COLUMNS,
+                                          header=None, names=header):
+            totals = sessions.merge_partials(totals, sessions.aggregate_chunk(chunk))
+            sketches = merge_sketches(sketches, action_sketch.sketch_chunk(chunk, capacity))
+    return totals, sketches
+
+
+def _users_partition(path, header, start, end):
+    with open_range(path, start, end) as f:
+        return users_summary.users_state(pd.read_csv(f, header=None, names=header))
+
+
+def _run(task, path, workers, partitions, *args):
+    header, ranges = split_ranges(path, partitions or workers * PARTITIONS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task, path, header, start, end, *args) for start, end in ranges]
+        return [future.result() for future in futures]
+
+
+def aggregate_sessions_parallel(source, workers=None, chunk_size=sessions.CHUNK_SIZE, partitions=None):
+    totals = sessions.empty_partials()
+    for partial in _run(_sessions_partition, source, workers or default_workers(), partitions, chunk_size):
+        totals = sessions.merge_partials(totals, partial)
+    return totals
+
+
+def sketch_sessions_parallel(source, workers=None, chunk_size=sessions.CHUNK_SIZE, capacity=CAPACITY,
+                             partitions=None):
+    sketches = {}
+    for partial in _run(_sketch_partition, source, workers or default_workers(), partitions, chunk_size, capacity):
+        sketches = merge_sketches(sketches, partial)
+    return sketches
+
+
+def aggregate_and_sketch_parallel(source, workers=None, chunk_size=sessions.CHUNK_SIZE, capacity=CAPACITY,
+                                  partitions=None):
+    totals, sketches = sessions.empty_partials(), {}
+    for partial, partial_sketches in _run(_sessions_and_sketch_partition, source, workers or default_workers(),
+                                          partitions, chunk_size, capacity):
+        totals = sessions.merge_partials(totals, partial)
+        sketches = merge_sketches(sketches, partial_sketches)
+    return totals, sketches
+
+
+def users_state_parallel(source, workers=None, partitions=None):
+    states = _run(_users_partition, source, workers or default_workers(), partitions)
+    if not states:
+        return users_summary.users_state(pd.read_csv(source))
+    state = states[0]
+    for partial in states[1:]:
+        state = users_summary.merge_users_state(state, partial)
+    return state
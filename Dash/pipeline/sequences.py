@@ -0,0 +1,203 @@
+"""Build the per-user action sequences behind the Session Funnels page.
+
+Run from the Dash directory:
+
+    python -m pipeline.sequences --source assets/sessions.csv
+
+The log is read in chunks and every chunk is dictionary-encoded on its own
+(``pd.factorize``); the per-chunk codes are remapped to global user and
+action codes at the end, so no Python-level dict is touched per row. A stable
+sort by user code then makes each user's rows contiguous while keeping them
+in log order. The sessions log has no timestamps, so log order is the order
+of actions; ``secs_elapsed`` is summed per user into ``elapsed``.
+
+Each build is written to a staging directory, renamed to a versioned
+directory inside SEQUENCES_DIR and published by atomically replacing the
+``CURRENT`` pointer file, so there is never a moment without a complete
+build; the page picks the new build up on its next callback (see
+``engine.sequences`` for the layout). The previous build is kept for workers
+still reading it, older ones are removed.
+
+``append_sequences`` folds a delta of the log into the current build without
+re-reading the history; ``python -m pipeline.state fold-sessions`` calls it.
+A build's meta lists the digests of the deltas folded into it, so a fold that
+is retried after the build was published does not add the rows twice.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine.sequences import META_FILE, POINTER_FILE, SEQUENCES_VERSION, SessionSequences, current_build
+from pipeline.artifacts import atomic_write
+from pipeline.sessions import CHUNK_SIZE, SESSIONS_CSV, iter_chunks
+
+SEQUENCES_DIR = 'assets/session_sequences'
+SEQUENCES_POINTER = os.path.join(SEQUENCES_DIR, POINTER_FILE)
+SEQUENCE_COLUMNS = ('user_id', 'action', 'secs_elapsed')
+
+
+def _index_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def _remap(chunk_codes, chunk_uniques):
+    """Global codes and uniques of per-chunk ``pd.factorize`` results."""
+    uniques = pd.Index(np.concatenate(chunk_uniques)) if chunk_uniques else pd.Index([], dtype=object)
+    global_codes, global_uniques = pd.factorize(uniques)
+    codes, start = [], 0
+    for local_codes, local_uniques in zip(chunk_codes, chunk_uniques):
+        lookup = global_codes[start:start + len(local_uniques)]
+        codes.append(lookup[local_codes])
+        start += len(local_uniques)
+    return (np.concatenate(codes) if codes else np.empty(0, dtype=np.int64)), np.asarray(global_uniques)
+
+
+def read_sequences(source=SESSIONS_CSV, chunk_size=CHUNK_SIZE):
+    user_codes, user_uniques = [], []
+    action_codes, action_uniques = [], []
+    secs = []
+    for chunk in iter_chunks(source, chunk_size, columns=SEQUENCE_COLUMNS):
+        chunk = chunk.dropna(subset=['user_id', 'action'])
+        codes, uniques = pd.factorize(chunk['user_id'])
+        user_codes.append(codes)
+        user_uniques.append(np.asarray(uniques, dtype=object))
+        codes, uniques = pd.factorize(chunk['action'])
+        action_codes.append(codes)
+        action_uniques.append(np.asarray(uniques, dtype=object))
+        secs.append(chunk['secs_elapsed'].fillna(0).to_numpy(dtype=np.float64))
+
+    users, user_ids = _remap(user_codes, user_uniques)
+    actions, action_names = _remap(action_codes, action_uniques)
+    secs = np.concatenate(secs) if secs else np.empty(0, dtype=np.float64)
+    return users, user_ids, actions, action_names, secs
+
+
+def build_arrays(users, user_ids, actions, action_names, secs):
+    """The ``engine.sequences`` arrays of row-aligned user and action codes."""
+    order = np.argsort(users, kind='stable')
+    n_rows, n_users, n_actions = len(order), len(user_ids), len(action_names)
+    row_dtype = _index_dtype(n_rows)
+
+    row_user = users[order].astype(_index_dtype(n_users))
+    codes = actions[order].astype(np.int16 if n_actions < np.iinfo(np.int16).max else np.int32)
+    offsets = np.zeros(n_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_user, minlength=n_users), out=offsets[1:])
+
+    # Running total per user: global cumsum minus the total before the user's first row
+    elapsed = np.cumsum(secs[order])
+    before = np.concatenate(([0.0], elapsed))[offsets[:-1]]
+    elapsed -= np.repeat(before, np.diff(offsets))
+
+    postings = np.argsort(codes, kind='stable').astype(row_dtype)
+    action_offsets = np.zeros(n_actions + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=n_actions), out=action_offsets[1:])
+
+    return {
+        'codes': codes,
+        'offsets': offsets,
+        'row_user': row_user,
+        'elapsed': elapsed,
+        'postings': postings,
+        'action_offsets': action_offsets,
+        'users': np.asarray(user_ids).astype(str),
+    }, [str(action) for action in action_names]
+
+
+def _remove_stale(directory, keep):
+    for entry in os.listdir(directory):
+        if entry.startswith('v') and entry not in keep:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def write_sequences(arrays, actions, directory=SEQUENCES_DIR, deltas=()):
+    os.makedirs(directory, exist_ok=True)
+    previous = current_build(directory)
+    staging = tempfile.mkdtemp(dir=directory, prefix='.staging-')
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(staging, f'{name}.npy'), values)
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump({'version': SEQUENCES_VERSION, 'actions': actions,
+                       'users': len(arrays['offsets']) - 1, 'rows': len(arrays['codes']),
+                       'deltas': list(deltas)}, f)
+        build = f'v{SEQUENCES_VERSION}-{time.time_ns()}'
+        os.rename(staging, os.path.join(directory, build))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    def write_pointer(tmp_path):
+        with open(tmp_path, 'w') as f:
+            f.write(build)
+    atomic_write(os.path.join(directory, POINTER_FILE), write_pointer)
+    _remove_stale(directory, {build, previous and os.path.basename(previous)})
+
+
+def build_sequences(source=SESSIONS_CSV, directory=SEQUENCES_DIR, chunk_size=CHUNK_SIZE):
+    arrays, actions = build_arrays(*read_sequences(source, chunk_size))
+    write_sequences(arrays, actions, directory)
+    return arrays, actions
+
+
+def _user_rows(sequences):
+    """``(users, user_ids, actions, action_names, secs)`` of a loaded build,
+    as ``read_sequences`` returns them for a log."""
+    elapsed = np.asarray(sequences.elapsed)
+    secs = np.diff(elapsed, prepend=0.0)
+    # A user's first row starts its own running total
+    starts = np.asarray(sequences.offsets[:-1])
+    starts = starts[starts < len(elapsed)]
+    secs[starts] = elapsed[starts]
+    return (np.asarray(sequences.row_user, dtype=np.int64), np.asarray(sequences.users, dtype=object),
+            np.asarray(sequences.codes, dtype=np.int64), np.asarray(sequences.actions, dtype=object), secs)
+
+
+def folded_deltas(directory=SEQUENCES_DIR):
+    """Digests of the deltas folded into the current build."""
+    build = current_build(directory)
+    if build is None:
+        return []
+    with open(os.path.join(build, META_FILE)) as f:
+        return json.load(f).get('deltas', [])
+
+
+def append_sequences(delta, directory=SEQUENCES_DIR, chunk_size=CHUNK_SIZE, digest=None):
+    """Add the rows of the sessions CSV ``delta`` after every user's current
+    rows and publish the result, recording ``digest`` in the build's meta;
+    returns None when nothing is built yet or ``digest`` is already folded in."""
+    deltas = folded_deltas(directory)
+    if digest is not None and digest in deltas:
+        return None
+    current = SessionSequences.load_current(directory)
+    if current is None:
+        return None
+    old_users, old_ids, old_actions, old_names, old_secs = _user_rows(current)
+    users, user_ids, actions, action_names, secs = read_sequences(delta, chunk_size)
+    users, user_ids = _remap([old_users, users], [old_ids, np.asarray(user_ids, dtype=object)])
+    actions, action_names = _remap([old_actions, actions], [old_names, np.asarray(action_names, dtype=object)])
+    arrays, actions = build_arrays(users, user_ids, actions, action_names, np.concatenate([old_secs, secs]))
+    write_sequences(arrays, actions, directory, deltas + [digest] if digest is not None else deltas)
+    return arrays, actions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build per-user action sequences for the Session Funnels page.')
+    parser.add_argument('--source', default=SESSIONS_CSV)
+    parser.add_argument('--output', default=SEQUENCES_DIR)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    arrays, actions = build_sequences(args.source, args.output, args.chunk_size)
+    size = sum(values.nbytes for values in arrays.values())
+    print(f"Encoded {len(arrays['codes']):,} actions of {len(arrays['offsets']) - 1:,} users "
+          f"({len(actions):,} distinct actions, {size / 1e6:,.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
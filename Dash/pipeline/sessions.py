@@ -0,0 +1,128 @@
+"""Streaming aggregation of the sessions log into the Top Actions tables.
+
+Run from the Dash directory:
+
+    python -m pipeline.sessions --source assets/sessions.csv
+
+The log is read in fixed-size chunks and only per-action partials
+(rows, secs_elapsed sum and secs_elapsed sample count) are kept between
+chunks, so memory depends on the chunk size and the number of distinct
+actions, not on the length of the log. The same read also rebuilds the
+``pipeline.action_sketch`` sketch that pg3 serves, so the published tables
+and sketch always describe the same log.
+"""
+import argparse
+
+import pandas as pd
+
+from pipeline.artifacts import atomic_write
+
+SESSIONS_CSV = 'assets/sessions.csv'
+ACTION_COUNTS_CSV = 'assets/action_counts_top_15.csv'
+ACTION_TIME_CSV = 'assets/action_time_top_20.csv'
+
+CHUNK_SIZE = 500_000
+
+
+def empty_partials():
+    return pd.DataFrame(
+        {'count': pd.Series(dtype='int64'), 'secs_sum': pd.Series(dtype='float64'), 'secs_n': pd.Series(dtype='int64')},
+        index=pd.Index([], name='action', dtype='object'),
+    )
+
+
+def aggregate_chunk(chunk):
+    chunk = chunk.dropna(subset=['action'])
+    grouped = chunk.groupby('action', sort=False)['secs_elapsed']
+    partial = pd.DataFrame({
+        'count': grouped.size(),
+        'secs_sum': grouped.sum(),
+        'secs_n': grouped.count(),
+    })
+    partial.index.name = 'action'
+    return partial
+
+
+def merge_partials(left, right):
+    merged = left.add(right, fill_value=0)
+    return merged.astype({'count': 'int64', 'secs_sum': 'float64', 'secs_n': 'int64'})
+
+
+def partials_to_dict(partials):
+    return {
+        action: [int(count), float(secs_sum), int(secs_n)]
+        for action, count, secs_sum, secs_n in partials[['count', 'secs_sum', 'secs_n']].itertuples()
+    }
+
+
+def partials_from_dict(actions):
+    if not actions:
+        return empty_partials()
+    partials = pd.DataFrame.from_dict(actions, orient='index', columns=['count', 'secs_sum', 'secs_n'])
+    partials.index.name = 'action'
+    return partials.astype({'count': 'int64', 'secs_sum': 'float64', 'secs_n': 'int64'})
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE, columns=('action', 'secs_elapsed'), **read_options):
+    return pd.read_csv(
+        source,
+        usecols=list(columns),
+        dtype={column: 'float64' if column == 'secs_elapsed' else 'object' for column in columns},
+        chunksize=chunk_size,
+        **read_options,
+    )
+
+
+def aggregate_sessions(source=SESSIONS_CSV, chunk_size=CHUNK_SIZE, workers=1):
+    if workers > 1:
+        from pipeline.parallel import aggregate_sessions_parallel
+        return aggregate_sessions_parallel(source, workers, chunk_size)
+
+    totals = empty_partials()
+    for chunk in iter_chunks(source, chunk_size):
+        totals = merge_partials(totals, aggregate_chunk(chunk))
+    return totals
+
+
+def action_counts_table(partials):
+    counts = partials['count'].sort_values(ascending=False, kind='stable')
+    df = counts.rename_axis('action').reset_index()
+    df['formatted_count'] = df['count'].map('{:,}'.format)
+    return df[['action', 'count', 'formatted_count']]
+
+
+def action_time_table(partials):
+    timed = partials[partials['secs_n'] > 0]
+    mean = (timed['secs_sum'] / timed['secs_n']).sort_values(ascending=False, kind='stable')
+    df = mean.rename('secs_elapsed').rename_axis('action').reset_index()
+    df['hours'] = (df['secs_elapsed'] // 3600).astype(float)
+    df['minutes'] = ((df['secs_elapsed'] % 3600) // 60).astype(float)
+    df['time_formatted'] = [f'{int(h)}:{int(m):02d}' for h, m in zip(df['hours'], df['minutes'])]
+    return df[['action', 'secs_elapsed', 'hours', 'minutes', 'time_formatted']]
+
+
+def write_action_tables(partials, counts_path=ACTION_COUNTS_CSV, time_path=ACTION_TIME_CSV):
+    atomic_write(counts_path, lambda tmp_path: action_counts_table(partials).to_csv(tmp_path, index=False))
+    atomic_write(time_path, lambda tmp_path: action_time_table(partials).to_csv(tmp_path, index=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Regenerate the Top Actions CSVs from the sessions log.')
+    parser.add_argument('--source', default=SESSIONS_CSV)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--counts-output', default=ACTION_COUNTS_CSV)
+    parser.add_argument('--time-output', default=ACTION_TIME_CSV)
+    parser.add_argument('--sketch-output', default=None, help='defaults to pipeline.action_sketch.SKETCH_PATH')
+    parser.add_argument('--workers', type=int, default=1, help='aggregate byte ranges of the log in a process pool')
+    args = parser.parse_args(argv)
+
+    # action_sketch builds on this module, so it is imported here
+    from pipeline import action_sketch
+    partials, sketches = action_sketch.aggregate_and_sketch(args.source, args.chunk_size, args.workers)
+    write_action_tables(partials, args.counts_output, args.time_output)
+    action_sketch.write_sketches(sketches, args.sketch_output or action_sketch.SKETCH_PATH)
+    print(f"Aggregated {int(partials['count'].sum()):,} actions across {len(partials):,} action types")
+
+
+if __name__ == '__main__':
+    main()
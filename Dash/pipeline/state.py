@@ -0,0 +1,162 @@
+"""Mergeable running state behind the pg2 and pg3 aggregates.
+
+Run from the Dash directory:
+
+    python -m pipeline.state init --users assets/train_users_2.csv --sessions assets/sessions.csv
+    python -m pipeline.state fold-users new_users.csv
+    python -m pipeline.state fold-sessions new_sessions.csv
+
+The state holds counts, sums and sample counts (per month, per category, per
+action) and the per-slice action sketches, so a delta file is aggregated on
+its own and merged in; history is never rescanned. Every command republishes
+users_summary.json, the two Top Actions CSVs and the action sketch, which the
+running pages reload on their next callback. fold-sessions also appends the
+delta to the Session Funnels sequences (``pipeline.sequences``) when they
+have been built; they are arrays rather than counts, so they live in their
+own build directory instead of this state.
+Each delta is recorded by hash and folding the same file twice is a no-op.
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from engine.sketch import merge_sketches
+from pipeline import action_sketch, sequences, sessions, users_summary
+from pipeline.artifacts import atomic_write
+
+STATE_VERSION = 4
+STATE_PATH = 'assets/aggregate_state.json'
+
+
+def empty_state():
+    return {'version': STATE_VERSION, 'users': None, 'sessions': None}
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return empty_state()
+    if state.get('version') != STATE_VERSION:
+        raise ValueError(f'{path} has state version {state.get("version")}, expected {STATE_VERSION}')
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+    atomic_write(path, write)
+
+
+def init_users(state, source, workers=1):
+    state['users'] = {
+        'base': users_summary.source_fingerprint(source),
+        'deltas': [],
+        'totals': users_summary.read_users_state(source, workers),
+    }
+
+
+def init_sessions(state, source, chunk_size=sessions.CHUNK_SIZE, workers=1):
+    # Partials and sketches come from the same read of the log
+    partials, sketches = action_sketch.aggregate_and_sketch(source, chunk_size, workers)
+    state['sessions'] = {
+        'base': users_summary.source_fingerprint(source),
+        'deltas': [],
+        'actions': sessions.partials_to_dict(partials),
+        'sketch': action_sketch.sketches_to_dict(sketches),
+    }
+
+
+def _require(state, key):
+    if state[key] is None:
+        raise ValueError(f'no {key} state yet; run "python -m pipeline.state init --{key} <csv>" first')
+    return state[key]
+
+
+def fold_users(state, delta_path):
+    users = _require(state, 'users')
+    digest = users_summary.file_sha256(delta_path)
+    if digest in users['deltas']:
+        return False
+    delta = users_summary.users_state(pd.read_csv(delta_path))
+    users['totals'] = users_summary.merge_users_state(users['totals'], delta)
+    users['deltas'].append(digest)
+    return True
+
+
+def fold_sessions(state, delta_path, chunk_size=sessions.CHUNK_SIZE, sequences_dir=sequences.SEQUENCES_DIR):
+    session_state = _require(state, 'sessions')
+    digest = users_summary.file_sha256(delta_path)
+    if digest in session_state['deltas']:
+        return False
+    totals = sessions.partials_from_dict(session_state['actions'])
+    delta, delta_sketches = action_sketch.aggregate_and_sketch(delta_path, chunk_size)
+    session_state['actions'] = sessions.partials_to_dict(sessions.merge_partials(totals, delta))
+    sketches = merge_sketches(action_sketch.sketches_from_dict(session_state['sketch']), delta_sketches)
+    session_state['sketch'] = action_sketch.sketches_to_dict(sketches)
+    # Skipped if a previous run published this delta's build but failed before saving the state
+    sequences.append_sequences(delta_path, sequences_dir, chunk_size, digest)
+    session_state['deltas'].append(digest)
+    return True
+
+
+def publish(state, summary_path=users_summary.SUMMARY_PATH,
+            counts_path=sessions.ACTION_COUNTS_CSV, time_path=sessions.ACTION_TIME_CSV,
+            sketch_path=action_sketch.SKETCH_PATH):
+    if state['users'] is not None:
+        summary = users_summary.summarize(state['users']['totals'])
+        users_summary.publish_summary(summary, state['users']['base'], summary_path)
+    if state['sessions'] is not None:
+        partials = sessions.partials_from_dict(state['sessions']['actions'])
+        sessions.write_action_tables(partials, counts_path, time_path)
+        action_sketch.write_sketches(action_sketch.sketches_from_dict(state['sessions']['sketch']), sketch_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the incremental aggregate state for pg2 and pg3.')
+    parser.add_argument('--state', default=STATE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    init = commands.add_parser('init', help='build the state from full users and/or sessions files')
+    init.add_argument('--users')
+    init.add_argument('--sessions')
+    init.add_argument('--workers', type=int, default=1, help='aggregate in a process pool')
+
+    fold_users_cmd = commands.add_parser('fold-users', help='fold a users delta CSV into the state')
+    fold_users_cmd.add_argument('delta')
+
+    fold_sessions_cmd = commands.add_parser('fold-sessions', help='fold a sessions delta CSV into the state')
+    fold_sessions_cmd.add_argument('delta')
+
+    commands.add_parser('publish', help='rewrite the dashboard artifacts from the current state')
+
+    args = parser.parse_args(argv)
+    state = load_state(args.state)
+
+    if args.command == 'init':
+        if not args.users and not args.sessions:
+            parser.error('init needs --users and/or --sessions')
+        if args.users:
+            init_users(state, args.users, workers=args.workers)
+        if args.sessions:
+            init_sessions(state, args.sessions, workers=args.workers)
+    elif args.command == 'fold-users':
+        if not fold_users(state, args.delta):
+            print(f'{args.delta} was already folded in')
+            return
+    elif args.command == 'fold-sessions':
+        if not fold_sessions(state, args.delta):
+            print(f'{args.delta} was already folded in')
+            return
+
+    save_state(state, args.state)
+    publish(state)
+    print(f'Updated {args.state} ({os.path.getsize(args.state):,} bytes)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""Offline pre-aggregation of train_users_2.csv for the Account & Booking page.
+
+Run from the Dash directory:
+
+    python -m pipeline.users_summary
+    python -m pipeline.users_summary --source assets/train_users_2.csv --output assets/users_summary.json
+
+The summary is keyed by the SHA-256 of the source CSV, so pg2 can tell when it
+is stale and fall back to aggregating the raw file.
+
+Aggregation goes through a mergeable running state (``users_state``), so a
+delta of new users can be folded in with ``merge_users_state`` without
+rescanning history; see ``pipeline.state``.
+"""
+import argparse
+import hashlib
+import json
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from engine.downsample import adaptive_line, integer_histogram, rounded
+from engine.kde import binned_kde, segment_kdes
+from engine.store import load_table
+from pipeline.artifacts import atomic_write
+
+SUMMARY_VERSION = 5
+
+USERS_CSV = 'assets/train_users_2.csv'
+SUMMARY_PATH = 'assets/users_summary.json'
+
+month_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+CATEGORY_COLUMNS = {
+    'signup': 'signup_method',
+    'device': 'first_device_type',
+    'gender': 'gender',
+    'country': 'country_destination',
+    'app': 'signup_app',
+    'affiliate': 'affiliate_provider',
+}
+TOP_AFFILIATES = 10
+
+# Ages are kept as counts per whole year so the histogram and KDE can be
+# rebuilt after merging deltas; the data only contains whole-year ages.
+# The KDE is evaluated on KDE_POINTS and then thinned by adaptive_line, and
+# the histogram has at most AGE_BINS integer-width bins, so the summary and
+# the figures built from it stay a few kilobytes regardless of user count.
+AGE_LIMIT = 120
+AGE_BINS = 60
+KDE_POINTS = 1000
+KDE_BW = 0.3
+
+# Age density curves per segment, e.g. per gender or per destination
+AGE_SEGMENTS = {
+    'gender': 'gender',
+    'country': 'country_destination',
+}
+
+# Every column users_state reads; loading only these keeps string ids out of memory
+STATE_COLUMNS = ('age', 'date_account_created', 'date_first_booking', *CATEGORY_COLUMNS.values())
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {'sha256': file_sha256(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _to_dict(series):
+    return {str(k): int(v) for k, v in series.items()}
+
+
+def _category_counts(column):
+    # Same as fillna('NaN').value_counts(), but also works on categorical
+    # columns loaded from engine.store
+    counts = Counter()
+    for value, count in column.value_counts(dropna=False).items():
+        if count:
+            counts['NaN' if pd.isna(value) else str(value)] += int(count)
+    return dict(counts)
+
+
+def _year_month_counts(dates):
+    dates = pd.to_datetime(dates, errors='coerce').dropna()
+    return _to_dict(dates.dt.strftime('%Y-%m').value_counts())
+
+
+def _day_counts(dates):
+    return _to_dict(dates.dropna().dt.strftime('%Y-%m-%d').value_counts())
+
+
+def _booking_lag(account, booking):
+    # Days from account creation to first booking, summed per account day so
+    # the mean lag of any date range can be rebuilt from merged states
+    booked = account.notnull() & booking.notnull()
+    lag = pd.DataFrame({
+        'day': account[booked].dt.strftime('%Y-%m-%d'),
+        'lag': (booking[booked] - account[booked]).dt.days,
+    }).groupby('day')['lag'].agg(['sum', 'size'])
+    return {str(day): [int(total), int(n)] for day, total, n in lag.itertuples()}
+
+
+def _segment_age_counts(segments, ages):
+    grouped = pd.DataFrame({
+        'segment': segments.astype(object).fillna('NaN').to_numpy(),
+        'age': ages.to_numpy(),
+    }).groupby(['segment', 'age']).size()
+    by_segment = {}
+    for (segment, age), count in grouped.items():
+        by_segment.setdefault(str(segment), {})[str(age)] = int(count)
+    return by_segment
+
+
+def users_state(users):
+    ages = users['age']
+    valid = (ages < AGE_LIMIT) & ages.notnull()
+    valid_ages = np.floor(ages[valid]).astype(int)
+    account = pd.to_datetime(users['date_account_created'], errors='coerce')
+    booking = pd.to_datetime(users['date_first_booking'], errors='coerce')
+    return {
+        'rows': int(users.shape[0]),
+        'months': {
+            'account': _year_month_counts(account),
+            'booking': _year_month_counts(booking),
+        },
+        'days': {
+            'account': _day_counts(account),
+            'booking': _day_counts(booking),
+        },
+        'lag': _booking_lag(account, booking),
+        'categories': {
+            name: _category_counts(users[column])
+            for name, column in CATEGORY_COLUMNS.items()
+        },
+        'age': _to_dict(valid_ages.value_counts()),
+        'age_by': {
+            name: _segment_age_counts(users.loc[valid, column], valid_ages)
+            for name, column in AGE_SEGMENTS.items()
+        },
+    }
+
+
+def _merge_counts(left, right):
+    merged = Counter(left)
+    merged.update(right)
+    return dict(merged)
+
+
+def _merge_lag(left, right):
+    merged = dict(left)
+    for day, (total, n) in right.items():
+        merged_total, merged_n = merged.get(day, (0, 0))
+        merged[day] = [merged_total + total, merged_n + n]
+    return merged
+
+
+def merge_users_state(left, right):
+    return {
+        'rows': left['rows'] + right['rows'],
+        'months': {k: _merge_counts(left['months'][k], right['months'][k]) for k in left['months']},
+        'days': {k: _merge_counts(left['days'][k], right['days'][k]) for k in left['days']},
+        'lag': _merge_lag(left['lag'], right['lag']),
+        'categories': {k: _merge_counts(left['categories'][k], right['categories'][k]) for k in left['categories']},
+        'age': _merge_counts(left['age'], right['age']),
+        'age_by': {
+            name: {
+                segment: _merge_counts(left['age_by'][name].get(segment, {}), right['age_by'][name].get(segment, {}))
+                for segment in left['age_by'][name].keys() | right['age_by'][name].keys()
+            }
+            for name in left['age_by']
+        },
+    }
+
+
+def _counts(counts, limit=None):
+    # Ties are broken by label so the order does not depend on merge order
+    ordered = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+    return {'index': [k for k, _ in ordered], 'values': [v for _, v in ordered]}
+
+
+def _month_name_counts(year_month_counts):
+    by_month = dict.fromkeys(month_order, 0)
+    for year_month, count in year_month_counts.items():
+        by_month[month_order[int(year_month[5:7]) - 1]] += count
+    return {'index': month_order, 'values': list(by_month.values())}
+
+
+def _daily_series(day_counts):
+    days = sorted(day_counts)
+    return {'days': days, 'counts': [day_counts[day] for day in days]}
+
+
+def _daily_lag(lag):
+    days = sorted(lag)
+    return {'days': days, 'total': [lag[day][0] for day in days], 'bookings': [lag[day][1] for day in days]}
+
+
+def _age_arrays(age_counts):
+    ages = np.array([int(a) for a in age_counts], dtype=float)
+    weights = np.array(list(age_counts.values()), dtype=float)
+    return ages, weights
+
+
+def _age_curves(age_counts):
+    if not age_counts:
+        return {'edges': [], 'density': []}, {'x': [], 'y': []}
+    ages, weights = _age_arrays(age_counts)
+
+    edges, density = integer_histogram(ages, weights, max_bins=AGE_BINS)
+    if len(ages) < 2:
+        # A single distinct age (e.g. a narrow filtered slice) has no KDE
+        return {'edges': edges.tolist(), 'density': rounded(density).tolist()}, {'x': [], 'y': []}
+    x_range_age = np.linspace(ages.min(), ages.max(), KDE_POINTS)
+    x_range_age, kde_values_age = adaptive_line(
+        x_range_age, binned_kde(ages, x_range_age, bw_method=KDE_BW, weights=weights))
+    return (
+        {'edges': edges.tolist(), 'density': rounded(density).tolist()},
+        {'x': rounded(x_range_age).tolist(), 'y': rounded(kde_values_age).tolist()},
+    )
+
+
+def _segment_curves(age_counts_by_segment):
+    parts = [(segment, *_age_arrays(counts)) for segment, counts in age_counts_by_segment.items() if counts]
+    if not parts:
+        return {}
+    segments = np.concatenate([np.full(len(ages), segment, dtype=object) for segment, ages, _ in parts])
+    ages = np.concatenate([ages for _, ages, _ in parts])
+    weights = np.concatenate([weights for _, _, weights in parts])
+
+    x = np.linspace(ages.min(), ages.max(), KDE_POINTS)
+    curves = segment_kdes(ages, segments, x, bw_method=KDE_BW, weights=weights)
+    # Largest segments first, so legends follow the count plots
+    order = sorted(curves, key=lambda segment: -sum(age_counts_by_segment[segment].values()))
+    thinned = {}
+    for segment in order:
+        segment_x, segment_y = adaptive_line(x, curves[segment])
+        thinned[segment] = {'x': rounded(segment_x).tolist(), 'y': rounded(segment_y).tolist()}
+    return thinned
+
+
+def summarize(state):
+    categories = state['categories']
+    age_hist, age_kde = _age_curves(state['age'])
+    return {
+        'rows': state['rows'],
+        'counts': {
+            'account': _month_name_counts(state['months']['account']),
+            'booking': _month_name_counts(state['months']['booking']),
+            'signup': _counts(categories['signup']),
+            'device': _counts(categories['device']),
+            'gender': _counts(categories['gender']),
+            'country': _counts(categories['country']),
+            'app': _counts(categories['app']),
+            'affiliate': _counts(categories['affiliate'], TOP_AFFILIATES),
+        },
+        'age_hist': age_hist,
+        'age_kde': age_kde,
+        'age_kde_by': {name: _segment_curves(counts) for name, counts in state['age_by'].items()},
+        'daily': {
+            'account': _daily_series(state['days']['account']),
+            'booking': _daily_series(state['days']['booking']),
+            'lag': _daily_lag(state['lag']),
+        },
+    }
+
+
+def compute_summary(users):
+    return summarize(users_state(users))
+
+
+def write_summary(summary, path):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, separators=(',', ':'))
+    atomic_write(path, write)
+
+
+def publish_summary(summary, source, output=SUMMARY_PATH):
+    summary['version'] = SUMMARY_VERSION
+    summary['source'] = source
+    write_summary(summary, output)
+    return summary
+
+
+def read_users_state(source=USERS_CSV, workers=1):
+    if workers > 1:
+        from pipeline.parallel import users_state_parallel
+        return users_state_parallel(source, workers)
+    return users_state(pd.read_csv(source))
+
+
+def build_summary(source=USERS_CSV, output=SUMMARY_PATH, workers=1):
+    return publish_summary(summarize(read_users_state(source, workers)), source_fingerprint(source), output)
+
+
+def is_fresh(summary, source):
+    if summary.get('version') != SUMMARY_VERSION:
+        return False
+    if not os.path.exists(source):
+        # Deployments may ship only the artifact; nothing to compare against.
+        return True
+    recorded = summary.get('source') or {}
+    stat = os.stat(source)
+    if recorded.get('size') == stat.st_size and recorded.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    return recorded.get('sha256') == file_sha256(source)
+
+
+def read_summary(path=SUMMARY_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_users_summary(source=USERS_CSV, path=SUMMARY_PATH):
+    summary = read_summary(path)
+    if summary is not None and is_fresh(summary, source):
+        return summary
+    return compute_summary(load_table(source, columns=STATE_COLUMNS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-aggregate the users CSV for the Account & Booking page.')
+    parser.add_argument('--source', default=USERS_CSV)
+    parser.add_argument('--output', default=SUMMARY_PATH)
+    parser.add_argument('--force', action='store_true', help='rebuild even if the summary is up to date')
+    parser.add_argument('--workers', type=int, default=1, help='aggregate byte ranges of the CSV in a process pool')
+    args = parser.parse_args(argv)
+
+    existing = read_summary(args.output)
+    if not args.force and existing is not None and os.path.exists(args.source) and is_fresh(existing, args.source):
+        print(f'{args.output} is up to date')
+        return
+
+    summary = build_summary(args.source, args.output, args.workers)
+    print(f"Wrote {args.output} ({summary['rows']:,} users, {os.path.getsize(args.output):,} bytes)")
+
+
+if __name__ == '__main__':
+    main()